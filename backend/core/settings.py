@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
+import os
+
+import django
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -85,12 +88,62 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DATABASE_ENGINE=sqlite (default) | postgresql (needs psycopg)
+#
+# PostgreSQL: DATABASE_NAME/USER/PASSWORD/HOST/PORT. Connections persist for
+# DATABASE_CONN_MAX_AGE seconds and are health-checked before reuse; with
+# DATABASE_POOL_SIZE set (Django 5.1+, psycopg 3) a connection pool is used
+# instead, which needs CONN_MAX_AGE = 0.
+#
+# SQLite: SQLITE_PRAGMAS are applied to every new connection
+# (userapp/database.py). WAL lets readers run while one request writes,
+# busy_timeout makes writers wait for the lock instead of failing with
+# "database is locked", synchronous=NORMAL syncs at checkpoints only (safe
+# in WAL mode). SQLITE_TUNING=0 keeps SQLite's defaults.
+
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', 'core'),
+            'USER': os.environ.get('DATABASE_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', 'localhost'),
+            'PORT': os.environ.get('DATABASE_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('DATABASE_POOL_SIZE'):
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': 2,
+            'max_size': int(os.environ['DATABASE_POOL_SIZE']),
+            'timeout': 10,
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {},
+        }
     }
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
 }
+if os.environ.get('SQLITE_TUNING') == '0':
+    SQLITE_PRAGMAS = {}
+elif DATABASE_ENGINE != 'postgresql' and django.VERSION >= (5, 1):
+    # take the write lock when a transaction starts: a deferred transaction
+    # that reads, then writes, can't wait on busy_timeout and fails at once
+    DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
 
 
 # Password validation
@@ -159,7 +212,7 @@ SIMPLE_JWT = {
 
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
-    'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    'TOKEN_USER_CLASS': 'userapp.authentication.ClaimsUser',
 
     'JTI_CLAIM': 'jti',
 
@@ -168,6 +221,29 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Seconds a process trusts its cached is_active/is_staff/password state of a
+# token's user (userapp/authentication.py)
+JWT_USER_STATE_TTL = 30
+
+# Refresh token blacklist (userapp/blacklist.py). With BLOOM_FILTER on, a token
+# blacklisted by another process may be accepted for up to BLOOM_SYNC_INTERVAL
+# seconds. Expired rows are removed by `manage.py sweep_token_blacklist` (cron)
+# or, with SWEEP_INTERVAL set, by a background thread.
+TOKEN_BLACKLIST = {
+    'BLOOM_FILTER': False,
+    'BLOOM_CAPACITY': 1_000_000,
+    'BLOOM_ERROR_RATE': 0.001,
+    'BLOOM_SYNC_INTERVAL': 5,
+    'SWEEP_BATCH_SIZE': 1000,
+    'SWEEP_INTERVAL': None,
+}
+
+# Bulk user import (userapp/bulk_import.py): rows validated and inserted per
+# chunk; manage.py import_users hashes passwords across this many processes
+# (None: one per CPU). The admin endpoint always hashes inline.
+USER_IMPORT_CHUNK_SIZE = 1000
+USER_IMPORT_HASH_WORKERS = None
+
 CORS_ALLOW_ALL_ORIGINS = True
 
 # CORS_ALLOWED_ORIGINS = [
@@ -186,7 +262,8 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 REST_FRAMEWORK = {
 'DEFAULT_AUTHENTICATION_CLASSES': [
-    'rest_framework_simplejwt.authentication.JWTAuthentication',
+    # 'rest_framework_simplejwt.authentication.JWTAuthentication',
+    'userapp.authentication.StatelessJWTAuthentication',
 ],
 # 'DEFAULT_PERMISSION_CLASSES': [
 #     'rest_framework.permissions.IsAuthenticated',
@@ -9,6 +9,7 @@ class ProfileAdmin(admin.ModelAdmin):
     # To be able to edit the 'verified' checkbox from dashboard only, w/o entering the individual profile
     list_editable = ['verified']
     list_display = ['user', 'full_name' ,'verified']
+    list_select_related = ['user']
 
 admin.site.register(User, UserAdmin)
 admin.site.register( Profile,ProfileAdmin)
\ No newline at end of file
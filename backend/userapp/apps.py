@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class UserappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'userapp'
+
+    def ready(self):
+        from .database import configure_sqlite
+        connection_created.connect(configure_sqlite, dispatch_uid='userapp.configure_sqlite')
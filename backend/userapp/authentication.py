@@ -0,0 +1,175 @@
+import threading
+import time
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from userapp.models import User
+
+# ----------------------------------------------------------------
+# STATELESS JWT AUTHENTICATION
+# ----------------------------------------------------------------
+# JWTAuthentication loads the User row on every request. The access token
+# already carries username, email, full_name, bio, image and verified
+# (MyTokenObtainPairSerializer.get_token), so StatelessJWTAuthentication
+# builds a ClaimsUser from the verified claims instead, and only checks
+# is_active / is_staff / password revocation against a small per-process
+# cache that expires after JWT_USER_STATE_TTL seconds (and is dropped for a
+# user when that user is saved or deleted in this process).
+#
+# ClaimsUser loads the full model lazily, on the first attribute that isn't a
+# claim (request.user.profile, request.user.last_login, ...). ORM lookups
+# need a real model instance: filter(user=request.user.instance) or user_id=request.user.pk.
+
+_states = {}
+_states_lock = threading.Lock()
+MAX_CACHED_STATES = 10000
+
+
+def get_state_ttl():
+    return getattr(settings, 'JWT_USER_STATE_TTL', 30)
+
+
+def get_user_state(user_id):
+    # -> {'is_active', 'is_staff', 'is_superuser', 'password_hash'} or None if the user doesn't exist
+    # user ids are strings in token claims
+    user_id = str(user_id)
+    now = time.monotonic()
+    cached = _states.get(user_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    row = (
+        User.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+        .values('is_active', 'is_staff', 'is_superuser', 'password')
+        .first()
+    )
+    state = None
+    if row is not None:
+        state = {
+            'is_active': row['is_active'],
+            'is_staff': row['is_staff'],
+            'is_superuser': row['is_superuser'],
+            'password_hash': get_md5_hash_password(row['password']) if api_settings.CHECK_REVOKE_TOKEN else None,
+        }
+    with _states_lock:
+        if len(_states) >= MAX_CACHED_STATES:
+            _states.clear()
+        _states[user_id] = (now + get_state_ttl(), state)
+    return state
+
+
+def forget_user_state(user_id):
+    with _states_lock:
+        _states.pop(str(user_id), None)
+
+
+def clear_user_states():
+    with _states_lock:
+        _states.clear()
+
+
+class ClaimsUser(TokenUser):
+    def __init__(self, token, state=None):
+        super().__init__(token)
+        self.state = state or {}
+
+    def __str__(self):
+        # same as User.__str__ (USERNAME_FIELD is email)
+        return self.token.get('email') or str(self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return str(self.pk) == str(other.pk)
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def is_active(self):
+        return self.state.get('is_active', True)
+
+    @cached_property
+    def is_staff(self):
+        return self.state.get('is_staff', False)
+
+    @cached_property
+    def is_superuser(self):
+        return self.state.get('is_superuser', False)
+
+    @cached_property
+    def instance(self):
+        # The User row, loaded on first use
+        return User.objects.select_related('profile').get(**{api_settings.USER_ID_FIELD: self.id})
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        if attr in self.token:
+            return self.token[attr]
+        return getattr(self.instance, attr)
+
+    # ==================== MODEL METHODS ====================
+    # Writes and permission checks go to the real user
+    def save(self, *args, **kwargs):
+        return self.instance.save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self.instance.delete(*args, **kwargs)
+
+    def set_password(self, raw_password):
+        return self.instance.set_password(raw_password)
+
+    def check_password(self, raw_password):
+        return self.instance.check_password(raw_password)
+
+    @property
+    def groups(self):
+        return self.instance.groups
+
+    @property
+    def user_permissions(self):
+        return self.instance.user_permissions
+
+    def get_group_permissions(self, obj=None):
+        return self.instance.get_group_permissions(obj)
+
+    def get_all_permissions(self, obj=None):
+        return self.instance.get_all_permissions(obj)
+
+    def has_perm(self, perm, obj=None):
+        return self.instance.has_perm(perm, obj)
+
+    def has_perms(self, perm_list, obj=None):
+        return self.instance.has_perms(perm_list, obj)
+
+    def has_module_perms(self, module):
+        return self.instance.has_module_perms(module)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        state = get_user_state(user_id)
+        if state is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not state['is_active']:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != state['password_hash']:
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return api_settings.TOKEN_USER_CLASS(validated_token, state)
@@ -0,0 +1,230 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------------------
+# REFRESH TOKEN BLACKLIST
+# ----------------------------------------------------------------
+# With ROTATE_REFRESH_TOKENS + BLACKLIST_AFTER_ROTATION every refresh adds an
+# OutstandingToken and a BlacklistedToken row, and simplejwt never deletes
+# them. Here:
+#
+# - sweep() deletes expired rows in small batches (indexed on expires_at,
+#   migration 0002); `manage.py sweep_token_blacklist` or the background
+#   sweeper thread (TOKEN_BLACKLIST['SWEEP_INTERVAL']) run it.
+# - BlacklistRefreshToken can check an in-memory Bloom filter first: a
+#   negative answer skips the database. The filter learns tokens blacklisted
+#   by this process immediately and those of other processes on the next sync,
+#   so BLOOM_SYNC_INTERVAL is how long another process may still accept a
+#   token that was just blacklisted. A sync reads the rows blacklisted since
+#   the previous one by blacklisted_at (indexed, migration 0004), going back
+#   BLOOM_SYNC_MARGIN seconds further: the column is stamped before its
+#   transaction commits, so a row can become visible after a sync that
+#   covered its timestamp. Ids wouldn't do either, as they are allocated
+#   before commit too. Off by default.
+# - get_stats() reports table sizes and check latency.
+
+DEFAULTS = {
+    'BLOOM_FILTER': False,
+    'BLOOM_CAPACITY': 1_000_000,
+    'BLOOM_ERROR_RATE': 0.001,
+    'BLOOM_SYNC_INTERVAL': 5,
+    # longer than any transaction that blacklists a token (plus clock skew between servers)
+    'BLOOM_SYNC_MARGIN': 60,
+    # rebuilt from scratch from time to time: swept tokens can't be removed from a Bloom filter
+    'BLOOM_REBUILD_INTERVAL': 3600,
+    'SWEEP_BATCH_SIZE': 1000,
+    # seconds between background sweeps; None: only the management command sweeps
+    'SWEEP_INTERVAL': None,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'TOKEN_BLACKLIST', {}).get(name, DEFAULTS[name])
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        # double hashing: h1 + i * h2
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        # count: keys added, once each (syncs re-add the ones in their margin)
+        if key in self:
+            return
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+# ==================== STATS ====================
+_stats = {'checks': 0, 'check_ms_total': 0.0, 'check_ms_max': 0.0, 'bloom_negatives': 0, 'db_checks': 0,
+          'swept_outstanding': 0, 'swept_blacklisted': 0, 'last_sweep': None}
+_stats_lock = threading.Lock()
+
+
+def record_check(elapsed_ms, bloom_negative):
+    with _stats_lock:
+        _stats['checks'] += 1
+        _stats['check_ms_total'] += elapsed_ms
+        _stats['check_ms_max'] = max(_stats['check_ms_max'], elapsed_ms)
+        _stats['bloom_negatives' if bloom_negative else 'db_checks'] += 1
+
+
+def get_stats(table_sizes=True):
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['check_ms_avg'] = stats['check_ms_total'] / stats['checks'] if stats['checks'] else 0.0
+    bloom = _bloom.filter
+    stats['bloom'] = None if bloom is None else {'entries': bloom.count, 'bits': bloom.size, 'hashes': bloom.hashes}
+    if table_sizes:
+        now = timezone.now()
+        stats['outstanding_tokens'] = OutstandingToken.objects.count()
+        stats['blacklisted_tokens'] = BlacklistedToken.objects.count()
+        stats['expired_outstanding_tokens'] = OutstandingToken.objects.filter(expires_at__lte=now).count()
+    return stats
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.update({'checks': 0, 'check_ms_total': 0.0, 'check_ms_max': 0.0, 'bloom_negatives': 0, 'db_checks': 0,
+                       'swept_outstanding': 0, 'swept_blacklisted': 0, 'last_sweep': None})
+
+
+# ==================== BLOOM FRONT ====================
+class BlacklistBloom:
+    def __init__(self):
+        self.filter = None
+        # wall-clock start of the last sync, compared with blacklisted_at
+        self.since = None
+        self.synced_at = 0.0
+        self.built_at = 0.0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.filter = None
+
+    def sync(self):
+        now = time.monotonic()
+        if self.filter is not None and now - self.synced_at < get_setting('BLOOM_SYNC_INTERVAL'):
+            return
+        with self.lock:
+            if self.filter is None or now - self.built_at >= get_setting('BLOOM_REBUILD_INTERVAL'):
+                self.filter = BloomFilter(get_setting('BLOOM_CAPACITY'), get_setting('BLOOM_ERROR_RATE'))
+                self.since = None
+                self.built_at = now
+            started = timezone.now()
+            rows = BlacklistedToken.objects.filter(token__expires_at__gt=started)
+            if self.since is not None:
+                # only rows blacklisted since the last sync, give or take the margin
+                rows = rows.filter(blacklisted_at__gte=self.since - timedelta(seconds=get_setting('BLOOM_SYNC_MARGIN')))
+            for jti in rows.values_list('token__jti', flat=True).iterator():
+                self.filter.add(jti)
+            self.since = started
+            self.synced_at = now
+
+    def might_contain(self, jti):
+        self.sync()
+        return jti in self.filter
+
+    def add(self, jti):
+        if self.filter is not None:
+            with self.lock:
+                self.filter.add(jti)
+
+
+_bloom = BlacklistBloom()
+
+
+def is_blacklisted(jti):
+    started = time.perf_counter()
+    bloom_negative = get_setting('BLOOM_FILTER') and not _bloom.might_contain(jti)
+    blacklisted = not bloom_negative and BlacklistedToken.objects.filter(token__jti=jti).exists()
+    record_check((time.perf_counter() - started) * 1000, bloom_negative)
+    return blacklisted
+
+
+class BlacklistRefreshToken(RefreshToken):
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        result = super().blacklist()
+        _bloom.add(self.payload[api_settings.JTI_CLAIM])
+        return result
+
+
+# ==================== SWEEPER ====================
+def sweep(batch_size=None, now=None):
+    # Deletes expired outstanding tokens (and their blacklist rows) in batches
+    # of batch_size so no statement holds locks or memory for long.
+    # -> (outstanding, blacklisted) rows deleted
+    batch_size = batch_size or get_setting('SWEEP_BATCH_SIZE')
+    now = now or timezone.now()
+    outstanding = blacklisted = 0
+    while True:
+        ids = list(OutstandingToken.objects.filter(expires_at__lte=now).order_by('expires_at').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+            outstanding += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+    with _stats_lock:
+        _stats['swept_outstanding'] += outstanding
+        _stats['swept_blacklisted'] += blacklisted
+        _stats['last_sweep'] = now.isoformat()
+    return outstanding, blacklisted
+
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def run_sweeper(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            sweep()
+        except Exception:
+            logger.exception('Token blacklist sweep failed')
+        finally:
+            connection.close()
+
+
+def ensure_sweeper():
+    # Started on first use by the refresh view when SWEEP_INTERVAL is set
+    global _sweeper
+    interval = get_setting('SWEEP_INTERVAL')
+    if not interval or _sweeper is not None:
+        return
+    with _sweeper_lock:
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=run_sweeper, args=(interval,), name='token-blacklist-sweeper', daemon=True)
+            _sweeper.start()
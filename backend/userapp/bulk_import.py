@@ -0,0 +1,171 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from userapp.models import User
+from userapp.serializers import BulkUserSerializer
+
+# ----------------------------------------------------------------
+# BULK USER IMPORT
+# ----------------------------------------------------------------
+# Creates accounts from a CSV (header: email,username,password[,full_name,bio])
+# or JSONL stream without holding it in memory. Each chunk of
+# USER_IMPORT_CHUNK_SIZE rows is
+#
+#   validated      one serializer per row, one email lookup per chunk
+#   hashed         across a process pool (the password hash is the bulk of the cost)
+#   inserted       User.objects.create_users: bulk INSERTs of users and profiles
+#
+# The process pool is for manage.py import_users. The admin endpoint hashes
+# in its own thread (workers=0): a pool per request would fork a copy of the
+# web worker per CPU, for every upload, next to the requests it is serving.
+#
+# Invalid rows are reported with their line number and skipped; the rest of
+# the chunk and of the file is still imported. A blank password creates the
+# account with an unusable password (the user sets one through a reset).
+
+FORMATS = ('csv', 'jsonl')
+MAX_REPORTED_ERRORS = 1000
+
+
+def get_chunk_size():
+    return getattr(settings, 'USER_IMPORT_CHUNK_SIZE', 1000)
+
+def get_hash_workers():
+    # 0 or 1: hash in this process
+    workers = getattr(settings, 'USER_IMPORT_HASH_WORKERS', None)
+    return (os.cpu_count() or 1) if workers is None else workers
+
+
+def guess_format(name, content_type=''):
+    if name.endswith(('.jsonl', '.ndjson')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_lines(stream):
+    # str lines from a binary or text stream, read as they come
+    for line in iter(stream.readline, b''):
+        if not line:
+            break
+        yield line.decode('utf-8-sig') if isinstance(line, bytes) else line
+
+
+def read_rows(stream, fmt):
+    # -> (line number, row dict or None, error)
+    lines = iter_lines(stream)
+    if fmt == 'jsonl':
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield number, None, {'non_field_errors': [f'Invalid JSON: {error}']}
+                continue
+            if isinstance(row, dict):
+                yield number, row, None
+            else:
+                yield number, None, {'non_field_errors': ['Expected a JSON object']}
+    else:
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row, None
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {'rows': self.rows, 'created': self.created, 'failed': self.failed, 'errors': self.errors}
+
+
+def validate_chunk(rows, seen, report):
+    # -> [(line, validated_data)] of the rows that can be created
+    valid = []
+    for line, row, error in rows:
+        if error:
+            report.error(line, error)
+            continue
+        serializer = BulkUserSerializer(data=row)
+        if not serializer.is_valid():
+            report.error(line, serializer.errors)
+        elif serializer.validated_data['email'] in seen:
+            report.error(line, {'email': ['Duplicate email in this import.']})
+        else:
+            seen.add(serializer.validated_data['email'])
+            valid.append((line, serializer.validated_data))
+
+    existing = set(User.objects.filter(email__in=[data['email'] for _, data in valid]).values_list('email', flat=True))
+    for line, data in valid:
+        if data['email'] in existing:
+            report.error(line, {'email': ['A user with this email already exists.']})
+    return [(line, data) for line, data in valid if data['email'] not in existing]
+
+
+def hash_passwords(passwords, pool, workers):
+    # None (blank password) -> unusable password, cheap, so not sent to the pool
+    if pool is None:
+        return [make_password(password) for password in passwords]
+    to_hash = [password for password in passwords if password is not None]
+    hashed = iter(pool.map(make_password, to_hash, chunksize=max(1, len(to_hash) // (workers * 4))))
+    return [make_password(None) if password is None else next(hashed) for password in passwords]
+
+
+def insert_chunk(valid, passwords, report):
+    users, profiles = [], []
+    for (line, data), password in zip(valid, passwords):
+        users.append(User(username=data['username'], email=data['email'], password=password))
+        profiles.append({'full_name': data.get('full_name', ''), 'bio': data.get('bio', '')})
+    try:
+        User.objects.create_users(users, profiles)
+        report.created += len(users)
+    except IntegrityError:
+        # someone registered one of these emails since validate_chunk: retry row by row
+        for (line, _), user, fields in zip(valid, users, profiles):
+            user.pk = None
+            try:
+                with transaction.atomic():
+                    User.objects.create_users([user], [fields])
+                report.created += 1
+            except IntegrityError:
+                report.error(line, {'email': ['A user with this email already exists.']})
+
+
+def import_users(stream, fmt='csv', chunk_size=None, workers=None):
+    # -> ImportReport
+    chunk_size = chunk_size or get_chunk_size()
+    workers = get_hash_workers() if workers is None else workers
+    report = ImportReport()
+    seen = set()
+    rows = read_rows(stream, fmt)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            report.rows += len(chunk)
+            valid = validate_chunk(chunk, seen, report)
+            if valid:
+                passwords = hash_passwords([data.get('password') or None for _, data in valid], pool, workers)
+                insert_chunk(valid, passwords, report)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return report
@@ -0,0 +1,30 @@
+from django.conf import settings
+
+# ----------------------------------------------------------------
+# SQLITE TUNING
+# ----------------------------------------------------------------
+# Connected to connection_created in UserappConfig.ready(): runs
+# PRAGMA <name> = <value> for every SQLITE_PRAGMAS entry on each new SQLite
+# connection (busy_timeout and synchronous are per connection; journal_mode=WAL
+# is stored in the database file, setting it again is a no-op).
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def get_sqlite_pragmas(connection, names=('journal_mode', 'busy_timeout', 'synchronous')):
+    # current values, for the load test report
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
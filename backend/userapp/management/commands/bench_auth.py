@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from userapp import views
+from userapp.authentication import StatelessJWTAuthentication, clear_user_states
+from userapp.models import User
+from userapp.serializers import MyTokenObtainPairSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark authenticated request throughput on /api/test/ with JWTAuthentication '
+        'and StatelessJWTAuthentication. The benchmark user is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        view = views.testEndPoint.cls
+        original = view.authentication_classes
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench', email='bench-auth@bench.local', password='!')
+            token = MyTokenObtainPairSerializer.get_token(user).access_token
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+            try:
+                for auth_class in (JWTAuthentication, StatelessJWTAuthentication):
+                    view.authentication_classes = [auth_class]
+                    clear_user_states()
+                    self.run(client, auth_class.__name__, options['requests'])
+            finally:
+                view.authentication_classes = original
+            transaction.set_rollback(True)
+
+    def run(self, client, label, count):
+        for _ in range(50):
+            client.get('/api/test/')
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(count):
+                response = client.get('/api/test/')
+            elapsed = time.perf_counter() - started
+        assert response.status_code == 200, response.content
+        self.stdout.write(
+            f'{label:<28} {count / elapsed:8.0f} req/s   {elapsed / count * 1e6:7.0f} us/req   '
+            f'{len(queries) / count:.2f} queries/req'
+        )
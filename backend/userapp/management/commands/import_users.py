@@ -0,0 +1,29 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from userapp.bulk_import import FORMATS, guess_format, import_users
+
+
+class Command(BaseCommand):
+    help = 'Create users from a CSV (email,username,password[,full_name,bio]) or JSONL file; "-" reads stdin.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--input-format', choices=FORMATS, default=None)
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--workers', type=int, default=None, help='Password hashing processes')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['input_format'] or guess_format(path)
+        try:
+            stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as error:
+            raise CommandError(error)
+        with stream:
+            report = import_users(stream, fmt, chunk_size=options['chunk_size'], workers=options['workers'])
+        for error in report.errors:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        self.stdout.write(f'{report.rows} rows: {report.created} users created, {report.failed} failed')
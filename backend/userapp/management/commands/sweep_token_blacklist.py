@@ -0,0 +1,19 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from userapp.blacklist import get_stats, sweep
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted refresh tokens in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--stats', action='store_true', help='Print table sizes after sweeping')
+
+    def handle(self, *args, **options):
+        outstanding, blacklisted = sweep(batch_size=options['batch_size'])
+        self.stdout.write(f'Deleted {outstanding} outstanding and {blacklisted} blacklisted tokens')
+        if options['stats']:
+            self.stdout.write(json.dumps(get_stats(), indent=2))
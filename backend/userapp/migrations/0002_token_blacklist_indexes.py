@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userapp', '0001_initial'),
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        # sweep_token_blacklist deletes by expires_at; token_blacklist has no index on it
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS userapp_outstanding_expires_idx ON token_blacklist_outstandingtoken (expires_at)',
+            'DROP INDEX IF EXISTS userapp_outstanding_expires_idx',
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:39
+
+import userapp.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userapp', '0002_token_blacklist_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', userapp.models.UserManager()),
+            ],
+        ),
+    ]
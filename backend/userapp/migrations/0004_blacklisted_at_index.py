@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userapp', '0003_user_manager'),
+        ('token_blacklist', '0013_alter_blacklistedtoken_options_and_more'),
+    ]
+
+    operations = [
+        # the blacklist Bloom filter syncs the rows blacklisted since its last sync
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS userapp_blacklisted_at_idx ON token_blacklist_blacklistedtoken (blacklisted_at)',
+            'DROP INDEX IF EXISTS userapp_blacklisted_at_idx',
+        ),
+    ]
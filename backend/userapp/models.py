@@ -1,19 +1,37 @@
-from django.db import models
-from django.db.models.signals import post_save
-from django.contrib.auth.models import AbstractUser
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.models import AbstractUser, UserManager as BaseUserManager
+
+
+class UserManager(BaseUserManager):
+    def get_by_natural_key(self, username):
+        # Login builds the token claims from the profile (MyTokenObtainPairSerializer.get_token)
+        return self.select_related('profile').get(**{self.model.USERNAME_FIELD: username})
+
+    def create_users(self, users, profiles=None, batch_size=500):
+        # Bulk path: inserts the users and their profiles in one transaction,
+        # batch_size rows per INSERT. bulk_create sends no post_save, so the
+        # profiles are made here (profiles: optional Profile field dicts, one
+        # per user). Passwords must already be hashed.
+        profiles = profiles or [{}] * len(users)
+        with transaction.atomic():
+            users = self.bulk_create(users, batch_size=batch_size)
+            Profile.objects.bulk_create(
+                [Profile(user=user, **fields) for user, fields in zip(users, profiles)], batch_size=batch_size,
+            )
+        return users
 
 
 class User(AbstractUser):
     username = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
 
+    objects = UserManager()
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
 
-    def profile(self):
-        profile = Profile.objects.get(user=self)
-
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     full_name = models.CharField(max_length=1000)
@@ -21,13 +39,53 @@ class Profile(models.Model):
     image = models.ImageField(upload_to="user_images", default="default.jpg")
     verified = models.BooleanField(default=False)
 
+    TRACKED_FIELDS = ('full_name', 'bio', 'image', 'verified')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_values = instance.tracked_values()
+        return instance
+
+    def tracked_values(self):
+        values = {name: getattr(self, name) for name in self.TRACKED_FIELDS}
+        values['image'] = values['image'].name
+        return values
+
+    def changed_fields(self):
+        # Fields edited since the profile was loaded or last saved
+        loaded = getattr(self, 'loaded_values', None)
+        if loaded is None:
+            return list(self.TRACKED_FIELDS)
+        return [name for name, value in self.tracked_values().items() if value != loaded[name]]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.loaded_values = self.tracked_values()
+
 
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
+        # also caches instance.profile
         Profile.objects.create(user=instance)
 
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+def save_user_profile(sender, instance, created, **kwargs):
+    # Saves a profile edited through user.profile along with the user: only if
+    # it was loaded on this instance, and only the fields that changed
+    if created or not User.profile.is_cached(instance):
+        return
+    changed = instance.profile.changed_fields()
+    if changed:
+        instance.profile.save(update_fields=changed)
 
 post_save.connect(create_user_profile, sender=User)
-post_save.connect(save_user_profile, sender=User)
\ No newline at end of file
+post_save.connect(save_user_profile, sender=User)
+
+
+# Cached per-user auth state (userapp.authentication): drop it when the user changes
+def forget_auth_state(sender, instance, **kwargs):
+    from userapp.authentication import forget_user_state
+    forget_user_state(instance.pk)
+
+post_save.connect(forget_auth_state, sender=User)
+post_delete.connect(forget_auth_state, sender=User)
@@ -1,9 +1,12 @@
 from userapp.models import User
+from django.db import transaction
 from django.contrib.auth.password_validation import validate_password
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+
+from userapp.blacklist import BlacklistRefreshToken
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -30,6 +33,11 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         return token
 
 
+# Blacklist checks go through userapp.blacklist (optional Bloom filter front)
+class MyTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = BlacklistRefreshToken
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True, required=True, min_length=5, validators=[validate_password])
@@ -47,18 +55,38 @@ class RegisterSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        user = User.objects.create(
+        user = User(
             username=validated_data['username'],
             email=validated_data['email']
             # Didn't put pwd field here since it's not a field in the User model, hence would have gave error
         )
         # To store pwd in a hashable format
         user.set_password(validated_data['password'])
-        user.save()
+        # One INSERT for the user, one for its profile (post_save), or neither
+        with transaction.atomic():
+            user.save()
 
         return user
 
 
+# One row of a bulk import (userapp/bulk_import.py). Email uniqueness is
+# checked per chunk there, not per row here.
+class BulkUserSerializer(serializers.Serializer):
+    email = serializers.EmailField(max_length=254)
+    username = serializers.CharField(max_length=100)
+    password = serializers.CharField(required=False, allow_blank=True, allow_null=True, min_length=5)
+    full_name = serializers.CharField(required=False, allow_blank=True, max_length=1000)
+    bio = serializers.CharField(required=False, allow_blank=True, max_length=100)
+
+    def validate_email(self, value):
+        return User.objects.normalize_email(value)
+
+    def validate(self, data):
+        if data.get('password'):
+            validate_password(data['password'], User(username=data['username'], email=data['email']))
+        return data
+
+
 class SearchUserSerializer(serializers.ModelSerializer):
     posts_count = serializers.SerializerMethodField()
     class Meta:
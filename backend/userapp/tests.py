@@ -1,3 +1,265 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock, skipUnless
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from userapp import blacklist
+from userapp.bulk_import import import_users
+from userapp.database import configure_sqlite, get_sqlite_pragmas
+from userapp.authentication import ClaimsUser, clear_user_states
+from userapp.models import Profile, User
 
 # Create your tests here.
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        clear_user_states()
+        self.user = User.objects.create_user(username='ann', email='ann@example.com', password='password')
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post('/api/token/', {'email': 'ann@example.com', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return AccessToken(response.data['access'])
+
+    def test_requests_are_authenticated_from_claims(self):
+        self.login()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/test/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ann@example.com', response.data['response'])
+
+        # state is cached: no query at all
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/test/').status_code, 200)
+
+    def test_inactive_user_is_rejected_once_saved(self):
+        self.login()
+        self.client.get('/api/test/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/test/').status_code, 401)
+
+    def test_claims_user_loads_the_model_lazily(self):
+        token = self.login()
+        user = ClaimsUser(token, {'is_active': True})
+        with self.assertNumQueries(0):
+            self.assertEqual((user.username, user.email, user.full_name, user.verified), ('ann', 'ann@example.com', '', False))
+            self.assertEqual(str(user), 'ann@example.com')
+        with self.assertNumQueries(1):
+            self.assertEqual(user.date_joined, self.user.date_joined)
+            self.assertEqual(user.profile.user_id, self.user.pk)
+        self.assertEqual(user, self.user)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        blacklist._bloom.reset()
+        blacklist.reset_stats()
+        self.user = User.objects.create_user(username='ann', email='ann@example.com', password='password', is_staff=True)
+        self.client = APIClient()
+
+    def obtain(self):
+        return self.client.post('/api/token/', {'email': 'ann@example.com', 'password': 'password'}).data
+
+    def refresh(self, token):
+        return self.client.post('/api/token/refresh/', {'refresh': token})
+
+    def test_rotated_token_is_rejected(self):
+        for bloom in (False, True):
+            with self.subTest(bloom=bloom), self.settings(TOKEN_BLACKLIST={'BLOOM_FILTER': bloom}):
+                first = self.obtain()['refresh']
+                response = self.refresh(first)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.refresh(response.data['refresh']).status_code, 200)
+                self.assertEqual(self.refresh(first).status_code, 401)
+
+    @override_settings(TOKEN_BLACKLIST={'BLOOM_FILTER': True})
+    def test_bloom_negative_skips_the_database(self):
+        token = blacklist.BlacklistRefreshToken.for_user(self.user)
+        blacklist._bloom.sync()
+        with self.assertNumQueries(0):
+            self.assertFalse(blacklist.is_blacklisted(token['jti']))
+        # blacklisted by another process: seen after the next sync
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token['jti']))
+        blacklist._bloom.synced_at = 0
+        self.assertTrue(blacklist.is_blacklisted(token['jti']))
+        stats = blacklist.get_stats(table_sizes=False)
+        self.assertEqual((stats['bloom_negatives'], stats['db_checks']), (1, 1))
+
+    @override_settings(TOKEN_BLACKLIST={'BLOOM_FILTER': True})
+    def test_bloom_sync_sees_rows_committed_out_of_id_order(self):
+        expires_at = timezone.now() + timedelta(days=1)
+        early, late = (
+            OutstandingToken.objects.create(user=self.user, jti=jti, token='x', expires_at=expires_at)
+            for jti in ('early', 'late')
+        )
+        BlacklistedToken.objects.create(id=1000, token=late)
+        blacklist._bloom.sync()
+        # a lower id, from a transaction that committed after that sync
+        BlacklistedToken.objects.create(id=1, token=early)
+        blacklist._bloom.synced_at = 0
+        self.assertTrue(blacklist.is_blacklisted('early'))
+        self.assertEqual(blacklist._bloom.filter.count, 2)
+
+    def test_sweep_deletes_expired_tokens_in_batches(self):
+        now = timezone.now()
+        for i in range(5):
+            expired = OutstandingToken.objects.create(
+                user=self.user, jti=f'expired-{i}', token='x', expires_at=now - timedelta(days=1),
+            )
+            if i % 2:
+                BlacklistedToken.objects.create(token=expired)
+        live = OutstandingToken.objects.create(user=self.user, jti='live', token='x', expires_at=now + timedelta(days=1))
+        BlacklistedToken.objects.create(token=live)
+
+        self.assertEqual(blacklist.sweep(batch_size=2, now=now), (5, 2))
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), ['live'])
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.obtain()['access']}")
+        clear_user_states()
+        response = self.client.get('/api/token/blacklist-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['outstanding_tokens'], 1)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=False)
+        clear_user_states()
+        self.assertEqual(self.client.get('/api/token/blacklist-stats/').status_code, 403)
+
+
+def data_queries(context):
+    # leaves out the SAVEPOINTs of atomic blocks inside the test transaction
+    return [query['sql'] for query in context.captured_queries if query['sql'].split()[0] in ('SELECT', 'INSERT', 'UPDATE', 'DELETE')]
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProfileTests(TestCase):
+    def test_register_inserts_user_and_profile_only(self):
+        payload = {'email': 'ann@example.com', 'username': 'ann', 'password': 'Str0ng-pass!', 'password2': 'Str0ng-pass!'}
+        with CaptureQueriesContext(connection) as context:
+            response = APIClient().post('/api/register/', payload)
+        self.assertEqual(response.status_code, 201)
+        writes = [sql for sql in data_queries(context) if not sql.startswith('SELECT')]
+        self.assertEqual([sql.split()[2] for sql in writes], ['"userapp_user"', '"userapp_profile"'])
+        self.assertTrue(Profile.objects.filter(user__email='ann@example.com').exists())
+
+    def test_user_save_only_writes_a_changed_profile(self):
+        user = User.objects.create_user(username='ann', email='ann@example.com', password='password')
+        user = User.objects.get(pk=user.pk)
+        with self.assertNumQueries(1):
+            user.save()
+
+        user = User.objects.select_related('profile').get(pk=user.pk)
+        with self.assertNumQueries(1):
+            user.save()
+        user.profile.bio = 'Hello'
+        with CaptureQueriesContext(connection) as context:
+            user.save()
+        self.assertEqual(len(context.captured_queries), 2)
+        self.assertIn('"bio"', context.captured_queries[1]['sql'])
+        self.assertNotIn('"full_name"', context.captured_queries[1]['sql'])
+        self.assertEqual(Profile.objects.get(user=user).bio, 'Hello')
+
+    def test_create_users_creates_profiles(self):
+        password = make_password('password')
+        users = User.objects.create_users(
+            [User(username=f'user{i}', email=f'user{i}@example.com', password=password) for i in range(5)], batch_size=2,
+        )
+        self.assertEqual(Profile.objects.filter(user__in=users).count(), 5)
+
+    def test_login_loads_the_profile_with_the_user(self):
+        User.objects.create_user(username='ann', email='ann@example.com', password='password')
+        with CaptureQueriesContext(connection) as context:
+            response = APIClient().post('/api/token/', {'email': 'ann@example.com', 'password': 'password'})
+        self.assertEqual(response.status_code, 200)
+        selects = [sql for sql in data_queries(context) if sql.startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+        self.assertIn('"userapp_profile"', selects[0])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], USER_IMPORT_HASH_WORKERS=0)
+class BulkImportTests(TestCase):
+    CSV = (
+        'email,username,password,full_name\n'
+        'ann@example.com,ann,Str0ng-pass!,Ann A\n'
+        'not-an-email,bob,Str0ng-pass!,Bob\n'
+        'cat@example.com,cat,,Cat\n'
+        'ann@example.com,ann2,Str0ng-pass!,Ann again\n'
+        'taken@example.com,taken,Str0ng-pass!,\n'
+    )
+
+    def setUp(self):
+        User.objects.create_user(username='taken', email='taken@example.com', password='password')
+
+    def test_import_reports_bad_rows_and_creates_the_rest(self):
+        report = import_users(BytesIO(self.CSV.encode()), 'csv', chunk_size=2)
+        self.assertEqual((report.rows, report.created, report.failed), (5, 2, 3))
+        self.assertEqual([error['line'] for error in report.errors], [3, 5, 6])
+        ann = User.objects.select_related('profile').get(email='ann@example.com')
+        self.assertTrue(ann.check_password('Str0ng-pass!'))
+        self.assertEqual(ann.profile.full_name, 'Ann A')
+        self.assertFalse(User.objects.get(email='cat@example.com').has_usable_password())
+
+    def test_import_inserts_in_bulk(self):
+        rows = ''.join(f'{{"email": "user{i}@example.com", "username": "user{i}"}}\n' for i in range(50))
+        with CaptureQueriesContext(connection) as context:
+            report = import_users(BytesIO(rows.encode()), 'jsonl', chunk_size=25)
+        self.assertEqual(report.created, 50)
+        # per chunk: email lookup, users INSERT, profiles INSERT
+        self.assertEqual(len(data_queries(context)), 6)
+
+    def test_passwords_are_hashed_across_processes(self):
+        report = import_users(BytesIO(self.CSV.encode()), 'csv', chunk_size=2, workers=2)
+        self.assertEqual((report.rows, report.created, report.failed), (5, 2, 3))
+        self.assertTrue(User.objects.get(email='ann@example.com').check_password('Str0ng-pass!'))
+        self.assertFalse(User.objects.get(email='cat@example.com').has_usable_password())
+
+    @override_settings(USER_IMPORT_HASH_WORKERS=4)
+    def test_import_endpoint_hashes_inline(self):
+        User.objects.filter(email='taken@example.com').update(is_staff=True)
+        client = APIClient()
+        client.force_authenticate(User.objects.get(email='taken@example.com'))
+        with mock.patch('userapp.bulk_import.ProcessPoolExecutor') as pool:
+            response = client.post('/api/users/import/', self.CSV, content_type='text/csv')
+        self.assertEqual(response.data['created'], 2)
+        pool.assert_not_called()
+
+    def test_import_endpoint_is_admin_only(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(email='taken@example.com'))
+        response = client.post('/api/users/import/', self.CSV, content_type='text/csv')
+        self.assertEqual(response.status_code, 403)
+
+        User.objects.filter(email='taken@example.com').update(is_staff=True)
+        client.force_authenticate(User.objects.get(email='taken@example.com'))
+        response = client.post('/api/users/import/', self.CSV, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 3))
+
+        upload = BytesIO(b'{"email": "dan@example.com", "username": "dan"}\n')
+        upload.name = 'users.jsonl'
+        response = client.post('/api/users/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.data['created'], 1)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite pragmas')
+class SQLiteTuningTests(TestCase):
+    def test_pragmas_are_applied_to_new_connections(self):
+        # (synchronous can't change inside the test transaction)
+        with override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234}):
+            configure_sqlite(sender=None, connection=connection)
+        self.assertEqual(get_sqlite_pragmas(connection, ('busy_timeout',)), {'busy_timeout': 1234})
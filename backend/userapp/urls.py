@@ -12,9 +12,11 @@ urlpatterns = [
     # path('user-logged/', UserLoggedDataView.as_view(), name='users-logged'),
     # ????
     path('token/', views.MyTokenObtainPairView.as_view(), name='token_obtain_pair'), 
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', views.MyTokenRefreshView.as_view(), name='token_refresh'),
+    path('token/blacklist-stats/', views.TokenBlacklistStatsView.as_view(), name='token_blacklist_stats'),
     
     path('register/', views.RegisterView.as_view(), name='auth_register'),
+    path('users/import/', views.UserImportView.as_view(), name='user_import'),
     path('test/', views.testEndPoint, name='test'),
     # path('', views.getRoutes),
 ]
\ No newline at end of file
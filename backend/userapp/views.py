@@ -2,8 +2,11 @@ from django.shortcuts import render
 from django.http import JsonResponse
 
 from userapp.models import User
+from userapp.blacklist import ensure_sweeper, get_stats
+from userapp.bulk_import import FORMATS, guess_format, import_users
 from userapp.serializers import (
     MyTokenObtainPairSerializer, 
+    MyTokenRefreshSerializer,
     RegisterSerializer,
     SearchUserSerializer,
     UserLoggedSerializer
@@ -11,21 +14,58 @@ from userapp.serializers import (
 
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework import generics
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework import status
 from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
 
 
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
 
+class MyTokenRefreshView(TokenRefreshView):
+    serializer_class = MyTokenRefreshSerializer
+
+    def post(self, request, *args, **kwargs):
+        ensure_sweeper()
+        return super().post(request, *args, **kwargs)
+
+class TokenBlacklistStatsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(get_stats(), status=status.HTTP_200_OK)
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
     serializer_class = RegisterSerializer
 
+# POST a CSV/JSONL body, or a multipart form with a `file`, to create users in
+# bulk (userapp/bulk_import.py). ?input_format=csv|jsonl, else guessed from the
+# file name / content type. Passwords are hashed in the request's thread; very
+# large files: manage.py import_users, which hashes across processes.
+class UserImportView(APIView):
+    permission_classes = (IsAdminUser,)
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request):
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+            stream, name = upload, upload.name
+        else:
+            # read as it arrives, never loaded as a whole
+            stream, name = request.stream, ''
+        fmt = request.query_params.get('input_format') or guess_format(name, request.content_type)
+        if fmt not in FORMATS or stream is None:
+            return Response({'input_format': [f'Expected one of {", ".join(FORMATS)}.']}, status=status.HTTP_400_BAD_REQUEST)
+        report = import_users(stream, fmt, workers=0)
+        return Response(report.as_dict(), status=status.HTTP_201_CREATED if report.created else status.HTTP_200_OK)
+
 
 # Get All Routes
 
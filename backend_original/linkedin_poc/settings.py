@@ -13,6 +13,9 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
+import tempfile
+
+import django
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -52,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'userapp.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -60,6 +64,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'userapp.middleware.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'linkedin_poc.urls'
@@ -86,13 +91,111 @@ WSGI_APPLICATION = 'linkedin_poc.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
+# DATABASE_ENGINE=sqlite (default) | postgresql (needs psycopg)
+#
+# PostgreSQL: DATABASE_NAME/USER/PASSWORD/HOST/PORT. Connections persist for
+# DATABASE_CONN_MAX_AGE seconds and are health-checked before reuse; with
+# DATABASE_POOL_SIZE set (Django 5.1+, psycopg 3) a connection pool is used
+# instead, which needs CONN_MAX_AGE = 0.
+#
+# SQLite: SQLITE_PRAGMAS are applied to every new connection
+# (userapp/database.py). WAL lets readers run while one request writes,
+# busy_timeout makes writers wait for the lock instead of failing with
+# "database is locked", synchronous=NORMAL syncs at checkpoints only (safe
+# in WAL mode). SQLITE_TUNING=0 keeps SQLite's defaults.
+
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', 'linkedin_poc'),
+            'USER': os.environ.get('DATABASE_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', 'localhost'),
+            'PORT': os.environ.get('DATABASE_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('DATABASE_POOL_SIZE'):
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': 2,
+            'max_size': int(os.environ['DATABASE_POOL_SIZE']),
+            'timeout': 10,
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {},
+        }
+    }
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+}
+if os.environ.get('SQLITE_TUNING') == '0':
+    SQLITE_PRAGMAS = {}
+elif DATABASE_ENGINE != 'postgresql' and django.VERSION >= (5, 1):
+    # take the write lock when a transaction starts: a deferred transaction
+    # that reads, then writes, can't wait on busy_timeout and fails at once
+    DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+# Read replicas (userapp/dbrouters.py): DATABASE_REPLICAS=host1,host2 on
+# PostgreSQL, or SQLite files kept in sync with the primary (opened read-only).
+# GET requests to the user/post/comment/search views read from a healthy
+# replica unless the user wrote in the last REPLICA_PIN_SECONDS; a replica that
+# can't be reached is skipped for REPLICA_RETRY_INTERVAL seconds.
+
+REPLICA_DATABASES = []
+for number, location in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    replica = {**DATABASES['default'], 'OPTIONS': dict(DATABASES['default']['OPTIONS']), 'TEST': {'MIRROR': 'default'}}
+    if DATABASE_ENGINE == 'postgresql':
+        replica['HOST'] = location
+    else:
+        replica['NAME'] = f'file:{location}?mode=ro'
+        replica['OPTIONS'].pop('transaction_mode', None)
+    DATABASES[f'replica{number}'] = replica
+    REPLICA_DATABASES.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['userapp.dbrouters.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
+REPLICA_RETRY_INTERVAL = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# CACHE_BACKEND=locmem (per process, default) | file | redis (needs the redis package)
+# The response cache below needs a backend every worker shares (file, redis).
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'linkedin-poc'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379'),
+}
+CACHE_BACKEND, CACHE_LOCATION = CACHE_BACKENDS[os.environ.get('CACHE_BACKEND', 'locmem')]
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', CACHE_LOCATION),
     }
 }
 
+# Serialized post/user representations (userapp/cache.py)
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 300
+# Allow it on locmem: only correct with a single process (runserver)
+RESPONSE_CACHE_ALLOW_LOCAL = DEBUG
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -112,6 +215,25 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# New and upgraded passwords use the first hasher; the others only verify
+# existing hashes, which Django re-encodes with the first one on the next
+# successful login. LOGIN_PASSWORD_HASHER=scrypt switches new hashes to
+# scrypt tuned by PASSWORD_SCRYPT (userapp/hashers.py).
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'userapp.hashers.TunedScryptPasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+if os.environ.get('LOGIN_PASSWORD_HASHER') == 'scrypt':
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(2))
+
+PASSWORD_SCRYPT = {
+    'work_factor': int(os.environ.get('PASSWORD_SCRYPT_N', 2**14)),
+    'block_size': 8,
+    'parallelism': 1,
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
@@ -172,4 +294,60 @@ REST_FRAMEWORK = {
 ]
 }
 
-AUTH_USER_MODEL = 'userapp.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'userapp.User'
+
+# User search (userapp/search.py)
+# Unset: SQLite FTS5 table when available, otherwise the token index table
+# USER_SEARCH_BACKEND = 'userapp.search.TokenSearchBackend'
+# Cursor pages cover this many matches (and say "truncated" past it); ?page=
+# pages reach all of them
+USER_SEARCH_MAX_RESULTS = 200
+
+# Home timeline (userapp/timeline.py)
+# Authors with at least this many followers are not fanned out on write;
+# their posts are merged into followers' feeds at read time instead.
+TIMELINE_FANOUT_THRESHOLD = 5000
+TIMELINE_MAX_LENGTH = 800
+# Recent posts copied into a timeline on follow
+TIMELINE_BACKFILL = 20
+
+# Image renditions (userapp/images.py)
+IMAGE_RENDITION_WIDTHS = (160, 320, 640, 1080)
+IMAGE_PROCESSING_WORKERS = 2
+# Process uploads inline instead of on the worker pool (tests)
+IMAGE_PROCESSING_EAGER = False
+
+# Comments embedded in each post (oldest first); the rest are paged through
+# /posts/{id}/comments/
+COMMENT_PREVIEW_LIMIT = 3
+
+# Bulk export (userapp/export.py): rows fetched per database round trip.
+# Incremental exports stop this many seconds in the past, so rows saved by
+# transactions still open at export time make the next one
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_SAFETY_LAG = 60
+
+# Request metrics (userapp/metrics.py): histograms served by GET /metrics,
+# Server-Timing response headers while DEBUG
+METRICS_ENABLED = True
+METRICS_SERVER_TIMING = DEBUG
+
+# Live updates (userapp/live.py): Server-Sent Events on GET /live/posts/?ids=,
+# served by the ASGI application. LocalBroker only reaches subscribers in the
+# same process.
+LIVE_UPDATES_BACKEND = 'userapp.live.LocalBroker'
+LIVE_UPDATES_MAX_IDS = 100
+# Seconds between keepalive comments on an idle stream
+LIVE_UPDATES_HEARTBEAT = 15
+# Distinct events a slow client may have queued before it's sent a reset
+LIVE_UPDATES_MAX_PENDING = 1000
+
+# Write-behind reaction counts (userapp/countbuffer.py): counter deltas are
+# summed in memory and flushed every REACTION_FLUSH_INTERVAL seconds, with a
+# per-process journal in REACTION_JOURNAL_DIR to recount from after a crash.
+# In a container, point REACTION_JOURNAL_DIR at a volume that outlives it.
+REACTION_COUNTS_WRITE_BEHIND = os.environ.get('REACTION_COUNTS_WRITE_BEHIND') == '1'
+REACTION_FLUSH_INTERVAL = 0.25
+REACTION_JOURNAL_DIR = os.environ.get('REACTION_JOURNAL_DIR') or os.path.join(tempfile.gettempdir(), 'reaction-journals')
+# fsync the journal on every click: survives power loss, not just a crash
+REACTION_JOURNAL_FSYNC = False
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.backends.signals import connection_created
 
 
 class UserappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'userapp'
+
+    def ready(self):
+        from .cache import check_response_cache
+        from .database import configure_sqlite
+        from .metrics import install_query_recorder, instrument_serializers
+        connection_created.connect(configure_sqlite, dispatch_uid='userapp.configure_sqlite')
+        connection_created.connect(install_query_recorder, dispatch_uid='userapp.install_query_recorder')
+        instrument_serializers()
+        checks.register(check_response_cache, checks.Tags.caches)
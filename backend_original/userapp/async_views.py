@@ -0,0 +1,226 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound, ValidationError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from . import dbrouters, live, reactions, timeline
+from .cache import post_cache
+from .pagination import PostCursorPagination, TimelinePagination, UserSearchCursorPagination
+from .search import search_matches
+from .serializers import ReactionSerializer, ReactionStateSerializer, SearchUserSerializer
+from .views import PostViewSet
+from .models import Post
+
+# ----------------------------------------------------------------
+# ASYNC VIEWS
+# ----------------------------------------------------------------
+# Native async variants of the hot read and reaction endpoints, under /async/.
+# Under an ASGI server (linkedin_poc/asgi.py) a request waiting on the database
+# here doesn't hold a worker thread for its whole duration:
+#
+#   authentication   JWT validated in the event loop, user loaded with aget()
+#   pages            keyset page queries on the async ORM (async for)
+#   cache lookups    on a worker thread: the cache is file or redis I/O
+#                    (cache.py, dbrouters.ais_pinned)
+#   rendering        cache misses go through the DRF serializers, which are
+#                    synchronous, via sync_to_async
+#   reactions        set_reaction() needs transaction.atomic and
+#                    select_for_update, both sync-only: run via sync_to_async
+#
+# Responses are the same as the DRF views' (the pages are always keyset
+# paginated: ?cursor=). Under WSGI these still work, one event loop per request.
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return await self.aget_user(self.get_validated_token(raw_token))
+
+    async def aget_user(self, validated_token):
+        # JWTAuthentication.get_user on the async ORM
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        try:
+            user = await self.user_model.objects.aget(**{jwt_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if jwt_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
+
+
+class EventSourceJWTAuthentication(AsyncJWTAuthentication):
+    # Browsers' EventSource can't send headers: the access token may come as
+    # ?token= instead (it ends up in access logs, as long as it lives)
+    async def aauthenticate(self, request):
+        raw_token = request.GET.get('token')
+        if raw_token is None:
+            return await super().aauthenticate(request)
+        return await self.aget_user(self.get_validated_token(raw_token.encode()))
+
+
+def error_response(error):
+    detail = error.detail if isinstance(error.detail, dict) else {'detail': error.detail}
+    return JsonResponse(detail, status=error.status_code)
+
+
+def async_api_view(methods, authentication_class=AsyncJWTAuthentication):
+    # api_view for async functions: JWT authentication (IsAuthenticated), DRF
+    # request parsing, replica reads for GET, and DRF-style error bodies
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            try:
+                user = await authentication_class().aauthenticate(request)
+                if user is None:
+                    raise NotAuthenticated()
+            except APIException as error:
+                return error_response(error)
+
+            api_request = Request(request, parsers=[JSONParser(), FormParser(), MultiPartParser()])
+            api_request.user = user
+            token = None
+            if request.method in SAFE_METHODS and not await dbrouters.ais_pinned(user):
+                token = await dbrouters.ause_replica()
+            try:
+                return await view(api_request, *args, **kwargs)
+            except Http404:
+                return error_response(NotFound())
+            except APIException as error:
+                return error_response(error)
+            finally:
+                if token is not None:
+                    dbrouters.end_replica(token)
+        return wrapped
+    return decorator
+
+
+# ==================== POSTS ====================
+def post_view(request, action):
+    # PostViewSet for its serializer choice, cache variant and rendering
+    return PostViewSet(request=request, format_kwarg=None, action=action, kwargs={})
+
+
+async def render_posts(view, ids):
+    if view.is_cacheable():
+        return await post_cache.aget_or_render(ids, view.get_cache_variant(), sync_to_async(view.render_posts))
+    rendered = await sync_to_async(view.render_posts)(ids)
+    return [rendered[pk] for pk in ids if pk in rendered]
+
+
+# GET /async/posts/
+@async_api_view(['GET'])
+async def post_list(request):
+    paginator = PostCursorPagination()
+    results = await paginator.apaginate_queryset(Post.objects.only('id', 'created_at'), request)
+    data = await render_posts(post_view(request, 'list'), [post.pk for post in results])
+    return JsonResponse(paginator.get_paginated_data(data))
+
+
+# GET /async/posts/feed/
+@async_api_view(['GET'])
+async def post_feed(request):
+    paginator = TimelinePagination()
+    results = await paginator.apaginate_queryset(await timeline.afeed_sources(request.user), request)
+    data = await render_posts(post_view(request, 'feed'), [item.post_id for item in results])
+    return JsonResponse(paginator.get_paginated_data(data))
+
+
+# GET /async/posts/{id}/
+@async_api_view(['GET'])
+async def post_detail(request, pk):
+    data = await render_posts(post_view(request, 'retrieve'), [pk])
+    if not data:
+        raise Http404
+    return JsonResponse(data[0])
+
+
+# ==================== REACTIONS ====================
+async def put_reaction(request, target, pk):
+    reaction_serializer = ReactionSerializer(data=request.data)
+    if not reaction_serializer.is_valid():
+        return JsonResponse(reaction_serializer.errors, status=400)
+    state = await sync_to_async(reactions.set_reaction)(
+        target, pk, request.user, reaction_serializer.validated_data['reaction'],
+    )
+    return JsonResponse(ReactionStateSerializer(state).data)
+
+
+# PUT /async/posts/{id}/reaction/  {"reaction": "like" | "dislike" | "none"}
+@async_api_view(['PUT'])
+async def post_reaction(request, pk):
+    return await put_reaction(request, reactions.POST, pk)
+
+
+# PUT /async/comments/{id}/reaction/
+@async_api_view(['PUT'])
+async def comment_reaction(request, pk):
+    return await put_reaction(request, reactions.COMMENT, pk)
+
+
+# POST /async/posts/{id}/like/
+@async_api_view(['POST'])
+async def post_like(request, pk):
+    await sync_to_async(reactions.set_reaction)(reactions.POST, pk, request.user, reactions.LIKE)
+    return JsonResponse({'message': 'Post liked successfully'})
+
+
+# POST /async/comments/{id}/like/
+@async_api_view(['POST'])
+async def comment_like(request, pk):
+    await sync_to_async(reactions.set_reaction)(reactions.COMMENT, pk, request.user, reactions.LIKE)
+    return JsonResponse({'message': 'Comment liked successfully'})
+
+
+# ==================== SEARCH ====================
+# GET /async/users-search/?search=
+@async_api_view(['GET'])
+async def user_search(request):
+    matches, truncated = await sync_to_async(search_matches)(request.query_params.get('search'))
+    paginator = UserSearchCursorPagination()
+    results = await paginator.apaginate_queryset(matches, request)
+    data = await sync_to_async(lambda: SearchUserSerializer(results, many=True).data)()
+    return JsonResponse({**paginator.get_paginated_data(data), 'truncated': truncated})
+
+
+# ==================== LIVE UPDATES ====================
+# GET /live/posts/?ids=1,2,3  -> text/event-stream (live.py)
+@async_api_view(['GET'], authentication_class=EventSourceJWTAuthentication)
+async def live_posts(request):
+    try:
+        ids = live.parse_ids(request.query_params.get('ids', ''))
+    except ValueError as error:
+        raise ValidationError({'ids': str(error)})
+    if not isinstance(request._request, ASGIRequest):
+        # under WSGI the stream would hold a worker thread for as long as it's open
+        return JsonResponse({'detail': 'Live updates are only served by the ASGI application.'}, status=501)
+    response = StreamingHttpResponse(live.stream(ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx: don't buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
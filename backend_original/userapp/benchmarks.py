@@ -0,0 +1,210 @@
+import json
+import statistics
+import time
+from collections import namedtuple
+
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import User, Post, Comment
+
+# ----------------------------------------------------------------
+# ENDPOINT BENCHMARKS
+# ----------------------------------------------------------------
+# Every route of userapp/urls.py and userapp/routers.py driven through the test
+# client (manage.py bench_endpoints, on a generate_data dataset): latency
+# percentiles and the number of SQL queries of each case, compared with a
+# stored baseline.
+#
+# Each round runs the cases in order, so writes undo each other (like, then
+# remove-like) and every round does the same work. The first round warms the
+# caches and is not measured. Query counts are the reliable signal; latency
+# depends on the machine, so only a median past a tolerance is flagged.
+
+Case = namedtuple('Case', ['name', 'route', 'method', 'path', 'data', 'admin'])
+
+
+def case(name, method, path, data=None, route=None, admin=False):
+    return Case(name, route or name, method, path, data, admin)
+
+
+CASES = [
+    # users
+    case('users-list', 'GET', '/users/'),
+    case('users-list-expand', 'GET', '/users/?pagination=cursor&expand=posts', route='users-list'),
+    case('users-create', 'POST', '/users/', {'username': 'bench{n}', 'email': 'bench{n}@bench.local',
+                                             'password': 'password'}, route='users-list'),
+    case('users-detail', 'GET', '/users/{other}/'),
+    case('users-follow', 'POST', '/users/{other}/follow/'),
+    case('users-unfollow', 'DELETE', '/users/{other}/follow/', route='users-follow'),
+    case('users-change-password', 'POST', '/users/{user}/change_password/',
+         {'password1': 'password', 'password2': 'password'}),
+    case('users-search', 'GET', '/users-search/?search={term}'),
+    case('users-logged', 'GET', '/user-logged/'),
+    # posts
+    case('posts-list', 'GET', '/posts/'),
+    case('posts-list-cursor', 'GET', '/posts/?pagination=cursor&page_size=10', route='posts-list'),
+    case('posts-list-counts', 'GET', '/posts/?pagination=cursor&reactions=counts', route='posts-list'),
+    case('posts-create', 'POST', '/posts/', {'description': 'bench post {n}', 'author': '{user}'}, route='posts-list'),
+    case('posts-feed', 'GET', '/posts/feed/'),
+    case('posts-detail', 'GET', '/posts/{post}/'),
+    case('posts-comments', 'GET', '/posts/{post}/comments/'),
+    case('posts-reaction', 'PUT', '/posts/{post}/reaction/', {'reaction': 'like'}),
+    case('posts-reaction-none', 'PUT', '/posts/{post}/reaction/', {'reaction': 'none'}, route='posts-reaction'),
+    case('post-like', 'POST', '/posts/{post}/like/'),
+    case('post-remove-like', 'DELETE', '/posts/{post}/remove-like/'),
+    case('post-dislike', 'POST', '/posts/{post}/dislike/'),
+    case('post-remove-dislike', 'DELETE', '/posts/{post}/remove-dislike/'),
+    # comments
+    case('comments-list', 'GET', '/comments/'),
+    case('comments-create', 'POST', '/comments/', {'post': '{post}', 'author': '{user}', 'text': 'bench {n}'},
+         route='comments-list'),
+    case('comments-detail', 'GET', '/comments/{comment}/'),
+    case('comments-reaction', 'PUT', '/comments/{comment}/reaction/', {'reaction': 'like'}),
+    case('comments-reaction-none', 'PUT', '/comments/{comment}/reaction/', {'reaction': 'none'},
+         route='comments-reaction'),
+    case('comment-like', 'POST', '/comments/{comment}/like/'),
+    case('comment-remove-like', 'DELETE', '/comments/{comment}/remove-like/'),
+    case('comment-dislike', 'POST', '/comments/{comment}/dislike/'),
+    case('comment-remove-dislike', 'DELETE', '/comments/{comment}/remove-dislike/'),
+    case('reaction-state', 'GET', '/reactions/?posts={post}&comments={comment}'),
+    # async twins (async_views.py)
+    case('async-post-list', 'GET', '/async/posts/'),
+    case('async-post-feed', 'GET', '/async/posts/feed/'),
+    case('async-post-detail', 'GET', '/async/posts/{post}/'),
+    case('async-post-reaction', 'PUT', '/async/posts/{post}/reaction/', {'reaction': 'like'}),
+    case('async-post-reaction-none', 'PUT', '/async/posts/{post}/reaction/', {'reaction': 'none'},
+         route='async-post-reaction'),
+    case('async-post-like', 'POST', '/async/posts/{post}/like/'),
+    case('async-comment-reaction', 'PUT', '/async/comments/{comment}/reaction/', {'reaction': 'none'}),
+    case('async-comment-like', 'POST', '/async/comments/{comment}/like/'),
+    case('async-users-search', 'GET', '/async/users-search/?search={term}'),
+    # admin
+    case('api-root', 'GET', '/'),
+    case('cache-stats', 'GET', '/cache-stats/', admin=True),
+    case('metrics', 'GET', '/metrics', admin=True),
+    case('export', 'GET', '/export/posts/', admin=True),
+]
+
+
+# routes the test client can't time: GET /live/posts/ streams until the client leaves
+UNBENCHMARKED = {'live-posts'}
+
+
+def route_names():
+    # every named route of userapp.urls and userapp.routers
+    from . import urls, routers
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns)
+            elif pattern.name:
+                yield pattern.name
+    return set(walk(urls.urlpatterns)) | set(walk(routers.urlpatterns))
+
+
+def uncovered_routes():
+    return sorted(route_names() - UNBENCHMARKED - {case.route for case in CASES})
+
+
+def get_context():
+    # the ids the cases are filled with, picked from the generated dataset:
+    # the user following the most accounts, the most followed one, the most
+    # liked post and its most liked comment
+    user = User.objects.annotate(following=Count('following_set')).order_by('-following', 'id').first()
+    other = User.objects.exclude(pk=user.pk).order_by('-followers_count', 'id').first()
+    post = Post.objects.filter(comments_count__gt=0).order_by('-likes_count', 'id').first() or Post.objects.order_by('id').first()
+    comment = Comment.objects.filter(post=post).order_by('-likes_count', 'id').first()
+    return {
+        'user': user.pk, 'other': other.pk, 'post': post.pk, 'comment': comment.pk if comment else 0,
+        'term': user.username[:3], 'user_object': user,
+    }
+
+
+def fill(value, context, n):
+    if isinstance(value, dict):
+        return {key: fill(item, context, n) for key, item in value.items()}
+    return value.format(n=n, **context)
+
+
+def get_clients(context):
+    user = context['user_object']
+    client = APIClient()
+    client.force_authenticate(user=user)
+    # JWT for the async views, which don't see force_authenticate
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    admin_client = APIClient()
+    admin = User.objects.filter(is_staff=True).first() or User.objects.create_user(
+        username='bench-admin', email='bench-admin@bench.local', password='!', is_staff=True,
+    )
+    admin_client.force_authenticate(user=admin)
+    return client, admin_client
+
+
+def request(client, case, context, n):
+    response = getattr(client, case.method.lower())(
+        fill(case.path, context, n), None if case.data is None else fill(case.data, context, n), format='json',
+    )
+    if getattr(response, 'streaming', False):
+        b''.join(response.streaming_content)
+    return response.status_code
+
+
+def run(cases=CASES, rounds=20, context=None):
+    # -> {case name: {'p50_ms', 'p95_ms', 'queries', 'status'}}
+    context = context or get_context()
+    client, admin_client = get_clients(context)
+    timings = {case.name: [] for case in cases}
+    results = {}
+    for n in range(rounds + 1):
+        for case in cases:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                status = request(admin_client if case.admin else client, case, context, n)
+                elapsed = time.perf_counter() - started
+            if n == 0:
+                continue
+            timings[case.name].append(elapsed)
+            result = results.setdefault(case.name, {'queries': 0, 'status': status})
+            result['queries'] = max(result['queries'], len(queries))
+            result['status'] = max(result['status'], status)
+    for name, values in timings.items():
+        values.sort()
+        results[name]['p50_ms'] = round(statistics.median(values) * 1000, 2)
+        results[name]['p95_ms'] = round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 2)
+    return results
+
+
+def compare(results, baseline, tolerance=0.5, slack_ms=5.0):
+    # -> regressions, as messages. A case regresses when it runs more queries,
+    # answers with a different status, or its median latency exceeds the
+    # baseline's by more than `tolerance` plus slack_ms (p95 of a few rounds
+    # is close to the maximum: too noisy to fail on).
+    regressions = []
+    for name, result in sorted(results.items()):
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['status'] != expected['status']:
+            regressions.append(f'{name}: status {expected["status"]} -> {result["status"]}')
+        if result['queries'] > expected['queries']:
+            regressions.append(f'{name}: {expected["queries"]} -> {result["queries"]} queries')
+        if tolerance is not None and result['p50_ms'] > expected['p50_ms'] * (1 + tolerance) + slack_ms:
+            regressions.append(f'{name}: p50 {expected["p50_ms"]} -> {result["p50_ms"]} ms')
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def save_baseline(path, results, meta):
+    with open(path, 'w') as baseline_file:
+        json.dump({'meta': meta, 'cases': results}, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
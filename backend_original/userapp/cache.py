@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .dbrouters import primary
+
+# ----------------------------------------------------------------
+# REPRESENTATION CACHE
+# ----------------------------------------------------------------
+# Serialized posts/users are cached per object, keyed by id and version:
+#
+#   repr:post:PostSerializer:42:v<version>  ->  PostSerializer(post).data
+#   ver:post:42                              ->  <version>
+#
+# Signals (models.py) bump the version after the writing transaction commits.
+# A reader that rendered from pre-write data stores its payload under the old
+# version, so it can never be served again; plain key deletion would race.
+# The cache itself is CACHES[RESPONSE_CACHE_ALIAS] (file or redis). It has to
+# be shared by every worker: a version bumped in one worker's locmem cache is
+# invisible to the others, which would serve stale representations until the
+# timeout. On locmem the cache stays off unless RESPONSE_CACHE_ALLOW_LOCAL
+# (DEBUG: a single runserver process).
+
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'invalidations': 0})
+_stats_lock = threading.Lock()
+
+
+def _count(kind, **amounts):
+    with _stats_lock:
+        for name, amount in amounts.items():
+            _stats[kind][name] += amount
+
+
+def get_stats():
+    with _stats_lock:
+        return {kind: dict(values) for kind, values in _stats.items()}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def is_shared(cache):
+    return not isinstance(cache, LocMemCache)
+
+
+def allow_local():
+    return getattr(settings, 'RESPONSE_CACHE_ALLOW_LOCAL', settings.DEBUG)
+
+
+def check_response_cache(app_configs, **kwargs):
+    # registered in UserappConfig.ready
+    alias = getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')
+    if getattr(settings, 'RESPONSE_CACHE_ENABLED', True) and not is_shared(caches[alias]) and not allow_local():
+        return [checks.Warning(
+            f'The response cache is disabled: CACHES[{alias!r}] is per process (locmem), so '
+            f'invalidations would not reach the other workers.',
+            hint='Use CACHE_BACKEND=file or redis, or RESPONSE_CACHE_ALLOW_LOCAL = True for a single process.',
+            id='userapp.W001',
+        )]
+    return []
+
+
+def _new_version():
+    # Never reuses an old version even if the version key was evicted
+    return time.time_ns()
+
+
+class RepresentationCache:
+    def __init__(self, kind):
+        self.kind = kind
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'RESPONSE_CACHE_ENABLED', True) and (is_shared(self.cache) or allow_local())
+
+    def version_key(self, pk):
+        return f'ver:{self.kind}:{pk}'
+
+    def key(self, pk, version, variant):
+        return f'repr:{self.kind}:{variant}:{pk}:v{version}'
+
+    def get_versions(self, ids):
+        keys = {self.version_key(pk): pk for pk in ids}
+        found = self.cache.get_many(keys)
+        versions = {keys[key]: version for key, version in found.items()}
+        missing = {self.version_key(pk): _new_version() for pk in ids if pk not in versions}
+        if missing:
+            self.cache.set_many(missing, self.timeout)
+            versions.update({keys[key]: version for key, version in missing.items()})
+        return versions
+
+    def get_many(self, ids, variant):
+        # -> ({pk: payload} for hits, {pk: version} to store misses under)
+        versions = self.get_versions(ids)
+        keys = {self.key(pk, versions[pk], variant): pk for pk in ids}
+        found = self.cache.get_many(keys)
+        hits = {keys[key]: payload for key, payload in found.items()}
+        _count(self.kind, hits=len(hits), misses=len(ids) - len(hits))
+        return hits, versions
+
+    def set_many(self, payloads, versions, variant):
+        self.cache.set_many(
+            {self.key(pk, versions[pk], variant): payload for pk, payload in payloads.items()},
+            self.timeout,
+        )
+
+    def get_or_render(self, ids, variant, render):
+        # render(missing_ids) -> {pk: payload}; result keeps the order of `ids`
+        if not self.enabled:
+            rendered = render(list(ids))
+            return [rendered[pk] for pk in ids if pk in rendered]
+        payloads, versions = self.get_many(ids, variant)
+        missing = [pk for pk in ids if pk not in payloads]
+        if missing:
+            # not from a replica: stale rows would be cached under the new version
+            with primary():
+                rendered = render(missing)
+            self.set_many(rendered, versions, variant)
+            payloads.update(rendered)
+        return [payloads[pk] for pk in ids if pk in payloads]
+
+    async def aget_or_render(self, ids, variant, render):
+        # get_or_render for async views, render being a coroutine function.
+        # The cache is file or redis I/O (locmem is refused outside DEBUG), so
+        # the lookups and the store run on a worker thread, one hop each.
+        if not self.enabled:
+            rendered = await render(list(ids))
+            return [rendered[pk] for pk in ids if pk in rendered]
+        payloads, versions = await sync_to_async(self.get_many)(ids, variant)
+        missing = [pk for pk in ids if pk not in payloads]
+        if missing:
+            with primary():
+                rendered = await render(missing)
+            await sync_to_async(self.set_many)(rendered, versions, variant)
+            payloads.update(rendered)
+        return [payloads[pk] for pk in ids if pk in payloads]
+
+    def invalidate(self, ids):
+        ids = {pk for pk in ids if pk is not None}
+        if not ids:
+            return
+        for pk in ids:
+            try:
+                self.cache.incr(self.version_key(pk))
+            except ValueError:
+                self.cache.set(self.version_key(pk), _new_version(), self.timeout)
+        _count(self.kind, invalidations=len(ids))
+
+    def invalidate_on_commit(self, ids):
+        ids = list(ids)
+        transaction.on_commit(lambda: self.invalidate(ids))
+
+
+post_cache = RepresentationCache('post')
+user_cache = RepresentationCache('user')
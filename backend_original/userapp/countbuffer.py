@@ -0,0 +1,368 @@
+import atexit
+import fcntl
+import glob
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+
+from .counters import m2m_count
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------------------
+# WRITE-BEHIND REACTION COUNTS
+# ----------------------------------------------------------------
+# With REACTION_COUNTS_WRITE_BEHIND, set_reaction() still inserts or deletes
+# the through-table row in its transaction, so membership is durable at once.
+# The counter UPDATE is what it leaves out: on a viral post every click would
+# queue behind that one row (and on SQLite add a statement to the single
+# writer's critical section). The deltas are summed here instead, per process,
+# and a daemon thread flushes them every REACTION_FLUSH_INTERVAL seconds: one
+# UPDATE ... SET likes_count = likes_count + CASE id WHEN ... per model and
+# batch, so a hot post costs a few counter writes a second however many
+# clicks it gets. Deltas are applied as they are, signed: an unlike flushed
+# by one process before the matching like by another takes the count to -1
+# until the like's flush brings it back to 0 (the counter columns are signed
+# for this). Clamping at 0 instead would leave the count 1 too high for good.
+#
+# Crash safety: each click appends "<post|comment> <pk>" to this buffer's
+# journal (REACTION_JOURNAL_DIR/reactions-<id>.journal) before its transaction
+# commits. <id> is the pid plus a random suffix, as a restarted container
+# hands out the same pids again. A flush starts a new journal file and deletes
+# the old one once its UPDATEs commit. The buffer holds an flock on
+# reactions-<id>.lock for as long as it lives: on start-up, every other lock
+# that can be taken belongs to a buffer that is gone, and its journals are
+# recovered by recounting the rows they name from the through tables, which
+# is exact whether or not their last deltas were flushed.
+#
+# Counts in reaction responses and live updates are the stored counts plus
+# this process's pending deltas. Serialized posts show stored counts, at most
+# one interval behind (a flush invalidates the cached posts it touched).
+
+
+def is_enabled():
+    return getattr(settings, 'REACTION_COUNTS_WRITE_BEHIND', False)
+
+
+def get_interval():
+    return getattr(settings, 'REACTION_FLUSH_INTERVAL', 0.25)
+
+
+def get_journal_dir():
+    return str(getattr(settings, 'REACTION_JOURNAL_DIR', os.path.join(tempfile.gettempdir(), 'reaction-journals')))
+
+
+def get_targets():
+    from .reactions import POST, COMMENT
+    return {target.name: target for target in (POST, COMMENT)}
+
+
+class CountBuffer:
+    batch_size = 500
+
+    def __init__(self, journal_dir):
+        self.journal_dir = journal_dir
+        self.id = f'{os.getpid()}-{uuid.uuid4().hex[:12]}'
+        self.owner_lock = None
+        self.lock = threading.Lock()
+        # (target name, pk) -> {'post_id': ..., counter: delta}
+        self.pending = {}
+        self.sequence = 0
+        self.journal = None
+        self.flushed_journals = []
+        self.thread = None
+        self.stopped = threading.Event()
+
+    # ==================== JOURNAL ====================
+    def journal_path(self, instance_id=None):
+        return os.path.join(self.journal_dir, f'reactions-{instance_id or self.id}.journal')
+
+    def lock_path(self, instance_id=None):
+        return os.path.join(self.journal_dir, f'reactions-{instance_id or self.id}.lock')
+
+    def claim(self):
+        # Takes this buffer's lock before its first journal line. The file is
+        # locked under a temporary name and then renamed, so no other process
+        # can see it unlocked and take it for a dead buffer's.
+        os.makedirs(self.journal_dir, exist_ok=True)
+        path = os.path.join(self.journal_dir, f'.reactions-{self.id}.lock')
+        self.owner_lock = open(path, 'w')
+        fcntl.flock(self.owner_lock, fcntl.LOCK_EX)
+        os.replace(path, self.lock_path())
+
+    def log(self, name, pk):
+        # -> the journal's sequence number, for add()
+        with self.lock:
+            self.write_line(name, pk)
+            return self.sequence
+
+    def write_line(self, name, pk):
+        # Called with the lock held. The file is only flushed to the OS: it
+        # survives the process, not the machine (REACTION_JOURNAL_FSYNC for
+        # that, at a cost per click).
+        if self.journal is None:
+            if self.owner_lock is None:
+                self.claim()
+            self.journal = open(self.journal_path(), 'a')
+        self.journal.write(f'{name} {pk}\n')
+        self.journal.flush()
+        if getattr(settings, 'REACTION_JOURNAL_FSYNC', False):
+            os.fsync(self.journal.fileno())
+
+    def rotate(self):
+        # -> the journal covering the pending deltas; new clicks go to a new one.
+        # Called with the lock held.
+        if self.journal is None:
+            return None
+        self.journal.close()
+        self.journal = None
+        self.sequence += 1
+        path = f'{self.journal_path()}.{self.sequence}'
+        os.replace(self.journal_path(), path)
+        return path
+
+    def recover(self):
+        # Recount the rows named in journals of buffers that are gone -> rows recounted
+        locks, paths = [], []
+        try:
+            for instance_id in self.orphans():
+                owner_lock = take_lock(self.lock_path(instance_id))
+                if owner_lock is False:
+                    # alive, or being recovered by another process
+                    continue
+                if owner_lock is not None:
+                    locks.append((self.lock_path(instance_id), owner_lock))
+                paths.extend(glob.glob(f'{glob.escape(self.journal_path(instance_id))}*'))
+            recounted = self.recount(paths)
+            for path in paths:
+                remove(path)
+            for path, owner_lock in locks:
+                remove(path)
+        finally:
+            for path, owner_lock in locks:
+                owner_lock.close()
+        if recounted:
+            logger.warning('Recounted reactions of %s rows from %s journals', recounted, len(paths))
+        return recounted
+
+    def orphans(self):
+        # ids of the other buffers with a lock or a journal in the directory
+        names = glob.glob(os.path.join(glob.escape(self.journal_dir), 'reactions-*'))
+        instance_ids = {os.path.basename(name)[len('reactions-'):].split('.')[0] for name in names}
+        instance_ids.discard(self.id)
+        return sorted(instance_ids)
+
+    def recount(self, paths):
+        # -> rows recounted
+        rows = defaultdict(set)
+        for path in paths:
+            try:
+                journal = open(path)
+            except FileNotFoundError:
+                # recovered by another process meanwhile
+                continue
+            with journal:
+                for line in journal:
+                    name, _, pk = line.strip().partition(' ')
+                    if pk.isdigit():
+                        rows[name].add(int(pk))
+        targets = get_targets()
+        recounted = 0
+        with transaction.atomic():
+            for name, pks in rows.items():
+                target = targets[name]
+                recounted += target.model.objects.filter(pk__in=pks).update(**{
+                    counter: m2m_count(target.model, target.relations[reaction])
+                    for reaction, counter in target.counters.items()
+                })
+        return recounted
+
+    # ==================== DELTAS ====================
+    def add(self, name, pk, post_id, deltas, sequence=None):
+        with self.lock:
+            if sequence is not None and sequence != self.sequence:
+                # logged in a journal a flush has rotated out since: the delta
+                # wasn't in that flush, so it needs a line in the current one
+                self.write_line(name, pk)
+            entry = self.pending.setdefault((name, pk), {'post_id': post_id})
+            for counter, delta in deltas.items():
+                entry[counter] = entry.get(counter, 0) + delta
+        self.start()
+
+    def get_pending(self, name, pk):
+        with self.lock:
+            entry = self.pending.get((name, pk))
+            return {counter: delta for counter, delta in entry.items() if counter != 'post_id'} if entry else {}
+
+    def flush(self):
+        # -> rows updated
+        from .models import invalidate_posts
+
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            journal = self.rotate()
+        if journal:
+            self.flushed_journals.append(journal)
+        if not pending:
+            self.remove_journals()
+            return 0
+
+        targets = get_targets()
+        updated = 0
+        try:
+            with transaction.atomic():
+                for name, target in targets.items():
+                    entries = [(pk, entry) for (entry_name, pk), entry in pending.items() if entry_name == name]
+                    for start in range(0, len(entries), self.batch_size):
+                        updated += self.write(target, entries[start:start + self.batch_size])
+        except Exception:
+            logger.exception('Flushing %s reaction counts failed, retrying', len(pending))
+            with self.lock:
+                for key, entry in pending.items():
+                    merged = self.pending.setdefault(key, {'post_id': entry['post_id']})
+                    for counter, delta in entry.items():
+                        if counter != 'post_id':
+                            merged[counter] = merged.get(counter, 0) + delta
+            return 0
+
+        invalidate_posts({entry['post_id'] for entry in pending.values()})
+        self.remove_journals()
+        return updated
+
+    def remove_journals(self):
+        # everything they cover is in the database
+        for path in self.flushed_journals:
+            remove(path)
+        self.flushed_journals = []
+
+    def write(self, target, entries):
+        counters = {}
+        for counter in target.counters.values():
+            cases = [When(pk=pk, then=Value(entry[counter])) for pk, entry in entries if entry.get(counter)]
+            if cases:
+                counters[counter] = F(counter) + Case(*cases, default=Value(0))
+        if not counters:
+            return 0
+        return target.model.objects.filter(pk__in=[pk for pk, _ in entries]).update(**counters)
+
+    # ==================== FLUSH THREAD ====================
+    def start(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name='reaction-counts', daemon=True)
+                    self.thread.start()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(get_interval()):
+                self.flush()
+        finally:
+            connection.close()
+
+    def stop(self):
+        # stops the thread and writes what's left
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+        self.stopped.clear()
+
+    def close(self):
+        # at exit: stops, and gives up the lock once everything is written.
+        # A journal left behind (the last flush failed) keeps its lock file,
+        # for the next process to recover once this one is gone.
+        self.stop()
+        with self.lock:
+            if self.owner_lock is None:
+                return
+            if self.journal is None and not self.flushed_journals and not self.pending:
+                remove(self.lock_path())
+            self.owner_lock.close()
+            self.owner_lock = None
+
+
+def take_lock(path):
+    # -> the locked file, False if another process holds it, None if it's gone
+    try:
+        owner_lock = open(path)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(owner_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        owner_lock.close()
+        return False
+    return owner_lock
+
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        # recovered by another process meanwhile
+        pass
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = CountBuffer(get_journal_dir())
+            _buffer.recover()
+            atexit.register(_buffer.close)
+        return _buffer
+
+
+def reset_buffer(*, setting, **kwargs):
+    global _buffer
+    if setting == 'REACTION_JOURNAL_DIR' and _buffer is not None:
+        with _buffer_lock:
+            _buffer.close()
+            atexit.unregister(_buffer.close)
+            _buffer = None
+
+setting_changed.connect(reset_buffer)
+
+
+def forget_buffer():
+    # in a forked child: the parent's buffer, its pending deltas and its
+    # journal stay the parent's; the child starts its own on its first click
+    global _buffer
+    if _buffer is not None:
+        atexit.unregister(_buffer.close)
+        _buffer = None
+
+os.register_at_fork(after_in_child=forget_buffer)
+
+
+# ==================== REACTIONS ====================
+def buffer_deltas(target, pk, post_id, deltas):
+    # set_reaction(), inside its transaction: journal now, buffer on commit
+    counter_buffer = get_buffer()
+    sequence = counter_buffer.log(target.name, pk)
+    transaction.on_commit(lambda: counter_buffer.add(target.name, pk, post_id, deltas, sequence))
+
+
+def with_pending(target, pk, counts, deltas=None):
+    # stored counts + this process's pending deltas (+ `deltas`, not buffered yet)
+    if not is_enabled() or _buffer is None:
+        return counts
+    pending = _buffer.get_pending(target.name, pk)
+    return {
+        counter: value + pending.get(counter, 0) + (deltas or {}).get(counter, 0)
+        for counter, value in counts.items()
+    }
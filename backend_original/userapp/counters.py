@@ -0,0 +1,51 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# ----------------------------------------------------------------
+# DENORMALIZED COUNTERS
+# ----------------------------------------------------------------
+# Post.likes_count / dislikes_count / comments_count and
+# Comment.likes_count / dislikes_count.
+# Models are passed in so the migration can use its historical models.
+
+POST_COUNTERS = {
+    'likes_count': 'likes',
+    'dislikes_count': 'dislikes',
+}
+COMMENT_COUNTERS = {
+    'likes_count': 'comment_likes',
+    'dislikes_count': 'comment_dislikes',
+}
+
+
+def m2m_count(model, relation):
+    # Correlated COUNT(*) over the auto-created through table of `relation`
+    field = model._meta.get_field(relation)
+    through = field.remote_field.through
+    source = field.m2m_field_name()
+    rows = (
+        through.objects.filter(**{source: OuterRef('pk')})
+        .order_by()
+        .values(source)
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def rebuild_counters(Post, Comment):
+    comments = (
+        Comment.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    posts = Post.objects.update(
+        comments_count=Coalesce(Subquery(comments), 0),
+        **{counter: m2m_count(Post, relation) for counter, relation in POST_COUNTERS.items()}
+    )
+    comments = Comment.objects.update(
+        **{counter: m2m_count(Comment, relation) for counter, relation in COMMENT_COUNTERS.items()}
+    )
+    return posts, comments
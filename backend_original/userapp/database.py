@@ -0,0 +1,55 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+# ----------------------------------------------------------------
+# SQLITE TUNING
+# ----------------------------------------------------------------
+# Connected to connection_created in UserappConfig.ready(): runs
+# PRAGMA <name> = <value> for every SQLITE_PRAGMAS entry on each new SQLite
+# connection (busy_timeout and synchronous are per connection; journal_mode=WAL
+# is stored in the database file, setting it again is a no-op).
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def get_sqlite_pragmas(connection, names=('journal_mode', 'busy_timeout', 'synchronous')):
+    # current values, for the load test report
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            values[name] = cursor.fetchone()[0]
+    return values
+
+
+@contextmanager
+def scratch_database():
+    # A throwaway copy of the configured database for the load tests (a
+    # temporary SQLite file, or test_<name> on PostgreSQL), dropped afterwards
+    directory = None
+    if connection.vendor == 'sqlite':
+        # a file, so every thread sees the same database (and WAL applies)
+        directory = tempfile.mkdtemp(prefix='bench-')
+        connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if directory:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
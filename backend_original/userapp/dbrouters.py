@@ -0,0 +1,138 @@
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.connection import ConnectionDoesNotExist
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------------------
+# READ REPLICAS
+# ----------------------------------------------------------------
+# Writes always go to the primary (`default`). Reads go to a replica only
+# inside use_replica() / end_replica(), which ReplicaReadMixin (views.py) and
+# async_api_view (async_views.py) wrap around GET requests of users who haven't
+# written recently:
+#
+#   - one replica is picked per request, so all of its queries see the same
+#     snapshot; replicas that fail to connect are skipped for
+#     REPLICA_RETRY_INTERVAL seconds, and with none left the primary is used
+#   - reads inside a transaction stay on the primary (a GET that writes, e.g.
+#     a timeline backfill, reads its own rows back)
+#   - ReplicaPinMiddleware pins a user to the primary for REPLICA_PIN_SECONDS
+#     after any successful write, so they see their own posts and reactions.
+#     Pins live in the default cache: use a shared backend with several
+#     processes.
+#
+# Representation cache fills (cache.py) render from the primary: a payload
+# rendered from a lagging replica would be stored under the current version
+# and served until the next write.
+
+_read_alias = ContextVar('replica_read_alias', default=None)
+_down = {}
+
+
+def get_replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def get_pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+
+
+def replica_available(alias):
+    retry_at = _down.get(alias)
+    if retry_at is not None and time.monotonic() < retry_at:
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except (DatabaseError, ConnectionDoesNotExist):
+        logger.warning('Replica %s unavailable, reading from the primary', alias, exc_info=True)
+        _down[alias] = time.monotonic() + getattr(settings, 'REPLICA_RETRY_INTERVAL', 30)
+        return False
+    _down.pop(alias, None)
+    return True
+
+
+def choose_replica():
+    # -> alias of a reachable replica, or None
+    replicas = list(get_replicas())
+    random.shuffle(replicas)
+    for alias in replicas:
+        if replica_available(alias):
+            return alias
+    return None
+
+
+def use_replica():
+    # -> token for end_replica()
+    return _read_alias.set(choose_replica())
+
+
+async def ause_replica():
+    # the health check connects, which the event loop can't do
+    if not get_replicas():
+        return _read_alias.set(None)
+    return _read_alias.set(await sync_to_async(choose_replica)())
+
+
+def end_replica(token):
+    _read_alias.reset(token)
+
+
+@contextmanager
+def primary():
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+# ==================== READ-YOUR-WRITES ====================
+def pin_key(user):
+    return f'dbrouter:pin:{user.pk}'
+
+
+def pin_to_primary(user):
+    cache.set(pin_key(user), True, get_pin_seconds())
+
+
+def is_pinned(user):
+    return user.is_authenticated and bool(cache.get(pin_key(user)))
+
+
+async def ais_pinned(user):
+    # a cache round trip: not in the event loop
+    return user.is_authenticated and bool(await cache.aget(pin_key(user)))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # also for instances that were read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the primary's rows
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get the schema from the primary
+        if db in get_replicas():
+            return False
+        return None
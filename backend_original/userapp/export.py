@@ -0,0 +1,93 @@
+import csv
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import User, Post, Comment
+
+# ----------------------------------------------------------------
+# BULK EXPORT
+# ----------------------------------------------------------------
+# Streams a whole table as NDJSON or CSV: plain values() rows read with
+# iterator(chunk_size=EXPORT_CHUNK_SIZE), one line at a time, so memory stays
+# flat whatever the table size.
+#
+# Incremental exports: every export covers since <= updated_at < until, where
+# until is EXPORT_SAFETY_LAG seconds before the export started (returned to the
+# caller). Passing that back as the next `since` gets what changed in between.
+# The lag is there because updated_at is stamped at save(), not at commit: a
+# row saved just before `until` by a transaction still open when the export
+# reads would be invisible to it and below the next one's `since`. It has to
+# be longer than the longest transaction that writes these tables. Denormalized
+# counters are updated with update() and don't move updated_at, and deleted
+# rows are not reported.
+
+EXPORTS = {
+    'users': (User, (
+        'id', 'username', 'email', 'first_name', 'last_name', 'bio', 'image',
+        'followers_count', 'is_active', 'date_joined', 'updated_at',
+    )),
+    'posts': (Post, (
+        'id', 'author_id', 'description', 'image', 'likes_count', 'dislikes_count', 'comments_count',
+        'created_at', 'updated_at',
+    )),
+    'comments': (Comment, (
+        'id', 'post_id', 'author_id', 'text', 'likes_count', 'dislikes_count', 'updated_at',
+    )),
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def get_chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def get_safety_lag():
+    return timedelta(seconds=getattr(settings, 'EXPORT_SAFETY_LAG', 60))
+
+
+def export_rows(resource, since=None, until=None):
+    # -> generator of dicts, oldest change first
+    model, fields = EXPORTS[resource]
+    queryset = model.objects.order_by('updated_at', 'id')
+    if since is not None:
+        queryset = queryset.filter(updated_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(updated_at__lt=until)
+    return queryset.values(*fields).iterator(chunk_size=get_chunk_size())
+
+
+def ndjson_lines(rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(row) + '\n'
+
+
+class Echo:
+    # csv.writer target that hands each line back instead of buffering it
+    def write(self, value):
+        return value
+
+
+def csv_lines(fields, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in (row[field] for field in fields)
+        ])
+
+
+def export(resource, fmt='ndjson', since=None):
+    # -> (lines, until)
+    until = timezone.now() - get_safety_lag()
+    rows = export_rows(resource, since, until)
+    if fmt == 'csv':
+        return csv_lines(EXPORTS[resource][1], rows), until
+    return ndjson_lines(rows), until
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.contrib.auth.hashers import ScryptPasswordHasher
+
+
+# scrypt with the cost parameters from settings.PASSWORD_SCRYPT. Django's own
+# scrypt runs parallelism=5 lanes one after the other, i.e. 5x the verify
+# time for the same memory hardness; the default here is a single lane.
+# Hashes keep the standard "scrypt$n$salt$r$p$hash" format, and a stored hash
+# with other parameters is re-encoded on the user's next successful login.
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    @property
+    def params(self):
+        return {'work_factor': 2**14, 'block_size': 8, 'parallelism': 1, **getattr(settings, 'PASSWORD_SCRYPT', {})}
+
+    @property
+    def work_factor(self):
+        return self.params['work_factor']
+
+    @property
+    def block_size(self):
+        return self.params['block_size']
+
+    @property
+    def parallelism(self):
+        return self.params['parallelism']
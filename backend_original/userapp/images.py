@@ -0,0 +1,215 @@
+import base64
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageFilter, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------------------
+# IMAGE RENDITIONS
+# ----------------------------------------------------------------
+# Post.image and User.image are stored as uploaded. After an upload commits,
+# a worker thread writes resized WebP and JPEG copies next to the original
+#
+#   post/7/photo.jpg  ->  post/7/renditions/photo_320.webp, photo_320.jpg, ...
+#
+# and a tiny blurred JPEG placeholder (data URI) into image_placeholder.
+# image_renditions records them as {"source": name, "320": {"webp": ..., "jpeg": ...}}.
+# Serializers pick one with ?image_size=<px>&image_format=webp|jpeg and fall
+# back to the original until the renditions exist.
+
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DEFAULT_FORMAT = 'webp'
+PLACEHOLDER_WIDTH = 16
+
+
+def get_widths():
+    return tuple(sorted(getattr(settings, 'IMAGE_RENDITION_WIDTHS', (160, 320, 640, 1080))))
+
+
+def rendition_name(name, width, ext):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'renditions', f'{stem}_{width}.{ext}')
+
+
+def encode(image, fmt):
+    pil_format, _, options = FORMATS[fmt]
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def make_placeholder(image):
+    small = image.copy()
+    small.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH), Image.LANCZOS)
+    small = small.filter(ImageFilter.GaussianBlur(1))
+    buffer = BytesIO()
+    small.save(buffer, 'JPEG', quality=40)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+def render(field_file):
+    # -> (renditions, placeholder) for the stored file
+    storage, name = field_file.storage, field_file.name
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+
+    renditions = {'source': name}
+    # never upscale: widths above the original collapse into one rendition at its own width
+    widths = sorted({min(width, image.width) for width in get_widths()})
+    for width in widths:
+        resized = image if width == image.width else image.resize(
+            (width, max(1, round(image.height * width / image.width))), Image.LANCZOS,
+        )
+        renditions[str(width)] = {}
+        for fmt, (_, ext, _) in FORMATS.items():
+            target = rendition_name(name, width, ext)
+            if storage.exists(target):
+                storage.delete(target)
+            renditions[str(width)][fmt] = storage.save(target, ContentFile(encode(resized, fmt)))
+    return renditions, make_placeholder(image)
+
+
+def delete_renditions(storage, renditions):
+    for width, names in renditions.items():
+        if width == 'source':
+            continue
+        for name in names.values():
+            storage.delete(name)
+
+
+def process(model, pk, field='image'):
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+    field_file = getattr(instance, field)
+    old = getattr(instance, f'{field}_renditions') or {}
+    if not field_file or old.get('source') == field_file.name:
+        return
+    if not field_file.storage.exists(field_file.name):
+        logger.info('No file for %s %s: %s', model.__name__, pk, field_file.name)
+        return
+
+    renditions, placeholder = render(field_file)
+    # update() rather than save(): no post_save, and only if the image wasn't replaced meanwhile
+    updated = model.objects.filter(pk=pk, **{field: field_file.name}).update(**{
+        f'{field}_renditions': renditions,
+        f'{field}_placeholder': placeholder,
+    })
+    if not updated:
+        delete_renditions(field_file.storage, renditions)
+        return
+    if old.get('source'):
+        delete_renditions(field_file.storage, old)
+    invalidate(model, instance)
+
+
+def invalidate(model, instance):
+    from .models import User, Post, invalidate_posts, invalidate_user_cache
+    if model is Post:
+        invalidate_posts([instance.pk])
+    elif model is User:
+        # posts and comments show the author image too
+        invalidate_user_cache(sender=User, instance=instance)
+
+
+# ==================== JOB QUEUE ====================
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_PROCESSING_WORKERS', 2),
+                thread_name_prefix='image-renditions',
+            )
+        return _executor
+
+
+def run_job(model, pk, field):
+    try:
+        process(model, pk, field)
+    except Exception:
+        logger.exception('Image processing failed for %s %s', model.__name__, pk)
+    finally:
+        # worker threads get their own connection; don't leak it
+        connection.close()
+
+
+def enqueue(model, pk, field='image'):
+    # Queued once the upload commits; IMAGE_PROCESSING_EAGER runs it inline (tests)
+    if getattr(settings, 'IMAGE_PROCESSING_EAGER', False):
+        process(model, pk, field)
+        return
+    transaction.on_commit(lambda: get_executor().submit(run_job, model, pk, field))
+
+
+def needs_processing(instance, field='image'):
+    field_file = getattr(instance, field)
+    renditions = getattr(instance, f'{field}_renditions') or {}
+    return bool(field_file) and renditions.get('source') != field_file.name
+
+
+# ==================== SERIALIZING ====================
+def pick(renditions, size, fmt):
+    # smallest rendition at least `size` wide, else the largest one
+    widths = sorted(int(width) for width in renditions if width != 'source')
+    if not widths:
+        return None
+    width = next((width for width in widths if width >= size), widths[-1])
+    return renditions[str(width)].get(fmt)
+
+
+def image_url(field_file, renditions, context):
+    if not field_file:
+        return None
+    size = context.get('image_size')
+    if size and renditions and renditions.get('source') == field_file.name:
+        name = pick(renditions, size, context.get('image_format', DEFAULT_FORMAT))
+        if name:
+            return field_file.storage.url(name)
+    return field_file.url
+
+
+def rendition_urls(field_file, renditions):
+    # {"320": {"webp": url, "jpeg": url}, ...} for srcset
+    if not field_file or not renditions or renditions.get('source') != field_file.name:
+        return {}
+    storage = field_file.storage
+    return {
+        width: {fmt: storage.url(name) for fmt, name in names.items()}
+        for width, names in renditions.items() if width != 'source'
+    }
+
+
+def get_image_options(request):
+    # ?image_size=320&image_format=jpeg -> serializer context
+    if request is None:
+        return {}
+    try:
+        size = int(request.query_params.get('image_size', 0))
+    except ValueError:
+        size = 0
+    if size <= 0:
+        return {}
+    # snap to a configured width so cached representations stay few
+    widths = get_widths()
+    size = next((width for width in widths if width >= size), widths[-1])
+    fmt = request.query_params.get('image_format', DEFAULT_FORMAT)
+    return {'image_size': size, 'image_format': fmt if fmt in FORMATS else DEFAULT_FORMAT}
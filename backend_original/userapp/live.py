@@ -0,0 +1,180 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# ----------------------------------------------------------------
+# LIVE UPDATES
+# ----------------------------------------------------------------
+# Push channel for reaction counts and new comments, so open pages don't have
+# to re-poll /posts/ to see them. A client subscribes to a set of posts with a
+# Server-Sent Events stream, GET /live/posts/?ids=1,2,3 (async_views.py), and
+# receives compact events:
+#
+#   subscribed    {"posts": [1, 2, 3]}  fetch the current state after this one
+#   post          {"post": 1, "likes_count": 4, "dislikes_count": 0}
+#   comment       {"post": 1, "comment": 7, "likes_count": 2, "dislikes_count": 1}
+#   new-comment   {"post": 1, "comment": 31}
+#   reset         {}  the client fell too far behind: refetch and reconnect
+#
+# set_reaction() (every reaction view, sync or async) and CommentViewSet.create
+# publish on commit. Count events carry the new counts rather than +1/-1, so a
+# subscriber only keeps the latest one per post or comment: a viral post costs
+# a slow client one pending event, not one per click.
+#
+# The broker is pluggable (LIVE_UPDATES_BACKEND). LocalBroker delivers within
+# the process, which is all a single ASGI worker needs. With several workers a
+# broker that relays publishes between them (Redis pub/sub, PostgreSQL
+# LISTEN/NOTIFY) implements the same subscribe / unsubscribe / publish.
+
+Event = namedtuple('Event', ['name', 'id', 'data'])
+
+
+def get_max_ids():
+    return getattr(settings, 'LIVE_UPDATES_MAX_IDS', 100)
+
+
+def get_heartbeat():
+    return getattr(settings, 'LIVE_UPDATES_HEARTBEAT', 15)
+
+
+def get_max_pending():
+    return getattr(settings, 'LIVE_UPDATES_MAX_PENDING', 1000)
+
+
+class Subscription:
+    # One stream's pending events: filled from any thread, drained in the
+    # event loop that created it. Events with the same (name, id) replace
+    # each other.
+    def __init__(self, post_ids, max_pending=None):
+        self.post_ids = frozenset(post_ids)
+        self.max_pending = max_pending or get_max_pending()
+        self.loop = asyncio.get_running_loop()
+        self.ready = asyncio.Event()
+        self.pending = {}
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self.push, event)
+        except RuntimeError:
+            # the stream's loop is gone: it will unsubscribe on its way out
+            pass
+
+    def push(self, event):
+        key = (event.name, event.id)
+        if key not in self.pending and len(self.pending) >= self.max_pending:
+            self.overflowed = True
+        else:
+            self.pending[key] = event
+        self.ready.set()
+
+    async def get(self, timeout):
+        # -> events, [] after `timeout` seconds without any
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self.ready.clear()
+        events, self.pending = list(self.pending.values()), {}
+        return events
+
+
+class LocalBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = defaultdict(set)
+
+    def subscribe(self, subscription):
+        with self.lock:
+            for post_id in subscription.post_ids:
+                self.subscriptions[post_id].add(subscription)
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for post_id in subscription.post_ids:
+                subscribers = self.subscriptions.get(post_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscriptions[post_id]
+
+    def publish(self, post_id, event):
+        with self.lock:
+            subscribers = list(self.subscriptions.get(post_id, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+
+_broker = None
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, 'LIVE_UPDATES_BACKEND', 'userapp.live.LocalBroker'))()
+    return _broker
+
+def reset_broker(*, setting, **kwargs):
+    global _broker
+    if setting == 'LIVE_UPDATES_BACKEND':
+        _broker = None
+
+setting_changed.connect(reset_broker)
+
+
+# ==================== PUBLISHING ====================
+def publish(post_id, event):
+    # once the current transaction commits (right away outside of one)
+    transaction.on_commit(lambda: get_broker().publish(post_id, event))
+
+
+def publish_counts(name, pk, post_id, likes_count, dislikes_count):
+    # name: 'post' or 'comment'
+    data = {'post': post_id, name: pk} if name == 'comment' else {'post': post_id}
+    data.update(likes_count=likes_count, dislikes_count=dislikes_count)
+    publish(post_id, Event(name, pk, data))
+
+
+def publish_comment(comment):
+    publish(comment.post_id, Event('new-comment', comment.pk, {'post': comment.post_id, 'comment': comment.pk}))
+
+
+# ==================== STREAM ====================
+def parse_ids(value):
+    # '1,2,3' -> {1, 2, 3}; ValueError if malformed or more than LIVE_UPDATES_MAX_IDS
+    ids = {int(pk) for pk in value.split(',') if pk.strip()}
+    if not ids or len(ids) > get_max_ids():
+        raise ValueError(f'Expected 1 to {get_max_ids()} comma-separated post ids')
+    return ids
+
+
+def format_event(name, data):
+    return f'event: {name}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+async def stream(post_ids, heartbeat=None):
+    # text/event-stream chunks until the client disconnects (the ASGI handler
+    # cancels the response) or falls too far behind
+    heartbeat = heartbeat or get_heartbeat()
+    broker = get_broker()
+    subscription = Subscription(post_ids)
+    broker.subscribe(subscription)
+    try:
+        yield format_event('subscribed', {'posts': sorted(subscription.post_ids)})
+        while True:
+            events = await subscription.get(heartbeat)
+            if not events:
+                # a comment line: keeps proxies from closing an idle stream
+                yield ': keepalive\n\n'
+                continue
+            yield ''.join(format_event(event.name, event.data) for event in events)
+            if subscription.overflowed:
+                yield format_event('reset', {})
+                return
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import AccessToken
+
+from userapp import timeline
+from userapp.database import scratch_database
+from userapp.models import User, Post
+
+# sync view (through Django's sync_to_async adapter) vs its async_views.py twin
+SCENARIOS = {
+    'feed': ('GET', '/posts/feed/', '/async/posts/feed/'),
+    'list': ('GET', '/posts/?pagination=cursor', '/async/posts/'),
+    'reaction': ('PUT', '/posts/{pk}/reaction/', '/async/posts/{pk}/reaction/'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Concurrency load test of the sync views against their async twins (/async/...): N clients '
+        'with a request in flight each, driving the ASGI application (linkedin_poc/asgi.py) '
+        'in-process, the callable an ASGI server such as uvicorn would run. Reports requests/s, '
+        'latency and the peak number of threads. Runs on a throwaway copy of the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, nargs='+', default=[10, 50, 200])
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--scenario', choices=sorted(SCENARIOS), nargs='+', default=['feed', 'reaction'])
+        parser.add_argument('--posts', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            tokens, post_ids = self.seed(max(options['connections']), options['posts'])
+            application = get_asgi_application()
+            for scenario in options['scenario']:
+                method, sync_path, async_path = SCENARIOS[scenario]
+                for connections in options['connections']:
+                    for label, path in (('sync', sync_path), ('async', async_path)):
+                        result = asyncio.run(self.run(
+                            application, method, path, tokens[:connections], post_ids, options['seconds'],
+                        ))
+                        self.report(f'{scenario:<8} {label:<5} {connections:>4} conn', result, options['seconds'])
+
+    def seed(self, clients, posts):
+        authors = [
+            User.objects.create_user(username=f'bench-author-{i}', email=f'bench-author-{i}@bench.local', password='!')
+            for i in range(5)
+        ]
+        users = [
+            User.objects.create_user(username=f'bench-{i}', email=f'bench-{i}@bench.local', password='!')
+            for i in range(clients)
+        ]
+        for user in users:
+            for author in authors:
+                timeline.follow(user, author)
+        # created after the follows: fanned out into every bench user's timeline
+        post_ids = [
+            Post.objects.create(description=f'post {i}', author=authors[i % len(authors)]).pk for i in range(posts)
+        ]
+        return [str(AccessToken.for_user(user)) for user in users], post_ids
+
+    async def run(self, application, method, path, tokens, post_ids, seconds):
+        deadline = time.perf_counter() + seconds
+        timings, errors, peak_threads = [], [], [threading.active_count()]
+
+        async def client(token):
+            reaction = 'like'
+            while time.perf_counter() < deadline:
+                body = json.dumps({'reaction': reaction}).encode() if method == 'PUT' else b''
+                started = time.perf_counter()
+                status = await request(application, method, path.format(pk=random.choice(post_ids)), token, body)
+                timings.append(time.perf_counter() - started)
+                if status != 200:
+                    errors.append(status)
+                reaction = 'none' if reaction == 'like' else 'like'
+
+        async def sample_threads():
+            while time.perf_counter() < deadline:
+                peak_threads[0] = max(peak_threads[0], threading.active_count())
+                await asyncio.sleep(0.05)
+
+        await asyncio.gather(sample_threads(), *(client(token) for token in tokens))
+        return timings, errors, peak_threads[0]
+
+    def report(self, label, result, seconds):
+        timings, errors, threads = result
+        timings.sort()
+        if not timings:
+            self.stdout.write(f'{label}: no requests completed')
+            return
+        self.stdout.write(
+            f'{label}: {len(timings) / seconds:7.0f} req/s'
+            f'  p50 {statistics.median(timings) * 1000:7.1f} ms'
+            f'  p95 {timings[int(len(timings) * 0.95)] * 1000:7.1f} ms'
+            f'  threads {threads:>4}  errors {len(errors)}'
+        )
+
+
+async def request(application, method, url, token, body=b''):
+    # one HTTP request through the ASGI callable -> status code
+    url = urlsplit(url)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': url.path,
+        'raw_path': url.path.encode(),
+        'query_string': url.query.encode(),
+        'root_path': '',
+        'headers': [
+            (b'host', b'localhost'),
+            (b'authorization', f'Bearer {token}'.encode()),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    received = False
+    status = None
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        # the client never disconnects; Django cancels this wait when it's done
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from userapp import benchmarks
+from userapp.database import scratch_database
+from userapp.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every userapp route through the test client on a generated dataset (in a throwaway '
+        'database) and compare latency and query counts with the stored baseline. Exits non-zero on '
+        'a regression or a route without a benchmark case.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=300)
+        parser.add_argument('--posts-per-user', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'benchmarks' / 'baseline.json'))
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Allowed median latency increase over the baseline (0.5: +50%%)')
+        parser.add_argument('--queries-only', action='store_true', help='Ignore latency, compare query counts')
+
+    def handle(self, *args, **options):
+        uncovered = benchmarks.uncovered_routes()
+        if uncovered:
+            raise CommandError(f'Routes without a benchmark case (userapp/benchmarks.py): {", ".join(uncovered)}')
+        dataset = {'users': options['users'], 'posts_per_user': options['posts_per_user'], 'seed': options['seed']}
+        baseline = None
+        if not options['save_baseline']:
+            baseline = benchmarks.load_baseline(options['baseline'])
+            if baseline['meta']['dataset'] != dataset:
+                raise CommandError(f'The baseline was recorded on {baseline["meta"]["dataset"]}, not {dataset}')
+
+        setup_test_environment()
+        try:
+            with scratch_database():
+                generate(options['users'], options['posts_per_user'], options['seed'])
+                results = benchmarks.run(rounds=options['rounds'])
+        finally:
+            teardown_test_environment()
+
+        expected = baseline['cases'] if baseline else {}
+        self.stdout.write(f'{"case":<26} {"status":>6} {"queries":>8} {"p50 ms":>9} {"p95 ms":>9}   baseline p50 / queries')
+        for name, result in results.items():
+            before = expected.get(name)
+            self.stdout.write(
+                f'{name:<26} {result["status"]:>6} {result["queries"]:>8} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f}'
+                + (f'   {before["p50_ms"]:>9.2f} / {before["queries"]}' if before else '')
+            )
+
+        if options['save_baseline']:
+            benchmarks.save_baseline(options['baseline'], results, {'dataset': dataset, 'rounds': options['rounds']})
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {options["baseline"]}'))
+            return
+        regressions = benchmarks.compare(results, expected, None if options['queries_only'] else options['tolerance'])
+        if regressions:
+            raise CommandError('Regressions:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions'))
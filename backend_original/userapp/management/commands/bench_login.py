@@ -0,0 +1,65 @@
+import statistics
+import time
+
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from userapp.models import User
+from userapp.serializers import UserSerializer
+from userapp.views import LoginView
+
+HASHERS = {
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'userapp.hashers.TunedScryptPasswordHasher',
+}
+
+
+# LoginView as it was: authenticate(), then the token serializer authenticates again
+class TwoHashLoginView(LoginView):
+    def post(self, request, *args, **kwargs):
+        user = authenticate(username=request.data.get('username', ''), password=request.data.get('password', ''))
+        if user:
+            login_serializer = self.get_serializer(data=request.data)
+            if login_serializer.is_valid():
+                return Response({
+                    'access': login_serializer.validated_data['access'],
+                    'refresh': login_serializer.validated_data['refresh'],
+                    'user': UserSerializer(user).data,
+                }, status=status.HTTP_200_OK)
+        return Response({'message': 'Invalid username or password'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark /login/ throughput: the old two-hash flow against LoginView, for each password hasher. '
+        'The benchmark user is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=10)
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        data = {'username': 'bench-login', 'password': 'bench-password'}
+        views = {'two hashes (old)': TwoHashLoginView.as_view(), 'one hash': LoginView.as_view()}
+
+        for hasher_name, hasher in HASHERS.items():
+            with override_settings(PASSWORD_HASHERS=[hasher]), transaction.atomic():
+                User.objects.create_user(username=data['username'], email='bench-login@bench.local', password=data['password'])
+                for label, view in views.items():
+                    timings = []
+                    for _ in range(options['logins']):
+                        started = time.perf_counter()
+                        response = view(factory.post('/login/', data, format='json'))
+                        timings.append((time.perf_counter() - started) * 1000)
+                        assert response.status_code == 200, response.data
+                    self.stdout.write(
+                        f'{hasher_name:<7} {label:<17} p50 {statistics.median(timings):8.1f} ms   '
+                        f'{1000 / statistics.mean(timings):6.1f} logins/s per core'
+                    )
+                transaction.set_rollback(True)
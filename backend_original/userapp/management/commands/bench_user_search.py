@@ -0,0 +1,84 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from userapp.models import User
+from userapp.search import get_search_backend, search_users
+from userapp.synthetic import make_name
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark SearchUserView queries: the old icontains scan against the search index. '
+        'Synthetic users are created inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100_000, 1_000_000])
+        parser.add_argument('--queries', type=int, default=30)
+        parser.add_argument('--backend', default=None, help='Dotted path of the search backend (default: configured one)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.backend = backend = import_string(options['backend'])() if options['backend'] else get_search_backend()
+        rnd = random.Random(options['seed'])
+        # what a user typing in the search box sends: 3-6 leading characters of a name
+        terms = [make_name(rnd, 3)[:rnd.randint(3, 6)] for _ in range(options['queries'])]
+
+        self.stdout.write(f'backend: {type(backend).__name__}')
+        for size in options['sizes']:
+            with transaction.atomic():
+                started = time.perf_counter()
+                self.populate(size, rnd)
+                backend.rebuild()
+                self.stdout.write(f'\n{size} users generated and indexed in {time.perf_counter() - started:.1f}s')
+
+                self.report('icontains', [self.time(self.legacy_page, term) for term in terms])
+                self.report('index', [self.time(self.indexed_page, term) for term in terms])
+                transaction.set_rollback(True)
+
+    def populate(self, size, rnd, batch_size=5000):
+        start = User.objects.count()
+        for offset in range(0, size, batch_size):
+            User.objects.bulk_create(
+                User(
+                    username=f'{make_name(rnd, 3)}{i}',
+                    email=f'bench{i}@bench.local',
+                    first_name=make_name(rnd, 2).title(),
+                    last_name=make_name(rnd, 3).title(),
+                    password='!',
+                )
+                for i in range(start + offset, start + min(offset + batch_size, size))
+            )
+
+    # Both do what a first ?page= request of SearchUserView does: COUNT + first page
+    def legacy_page(self, term):
+        matches = User.objects.filter(
+            Q(username__icontains=term) |
+            Q(first_name__icontains=term) |
+            Q(last_name__icontains=term)
+        ).distinct()
+        matches.count()
+        list(matches.order_by('id')[:5])
+
+    def indexed_page(self, term):
+        matches = search_users(term, self.backend).order_by('search_rank', 'id')
+        matches.count()
+        list(matches[:5])
+
+    def time(self, fn, term):
+        started = time.perf_counter()
+        fn(term)
+        return (time.perf_counter() - started) * 1000
+
+    def report(self, label, timings):
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'  {label:<10} p50 {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms   max {timings[-1]:8.2f} ms'
+        )
@@ -0,0 +1,123 @@
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+from userapp import countbuffer, reactions
+from userapp.counters import rebuild_counters
+from userapp.database import get_sqlite_pragmas, scratch_database
+from userapp.models import User, Post, Comment
+
+
+class Command(BaseCommand):
+    help = (
+        'Write load test: threads toggling likes (plus optional readers) against a stand-in copy of the '
+        'configured database (a temporary SQLite file, or test_<name> on PostgreSQL), which is dropped '
+        'afterwards. Compare modes by running it with SQLITE_TUNING=0, the default settings and '
+        'DATABASE_ENGINE=postgresql; --posts 1 is a single viral post, --write-behind buffers its '
+        'counters (countbuffer.py).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=0)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--posts', type=int, default=20)
+        parser.add_argument('--write-behind', action='store_true',
+                            help='Buffer the reaction counters (REACTION_COUNTS_WRITE_BEHIND)')
+
+    def handle(self, *args, **options):
+        journal_dir = tempfile.mkdtemp(prefix='bench-journal-')
+        try:
+            with scratch_database(), override_settings(
+                REACTION_COUNTS_WRITE_BEHIND=options['write_behind'], REACTION_JOURNAL_DIR=journal_dir,
+            ):
+                self.run(options)
+                self.check_counters()
+        finally:
+            shutil.rmtree(journal_dir)
+
+    def check_counters(self):
+        # after the last flush the counters must match the through tables
+        if countbuffer.is_enabled():
+            countbuffer.get_buffer().stop()
+        before = list(Post.objects.order_by('pk').values_list('likes_count', 'dislikes_count'))
+        rebuild_counters(Post, Comment)
+        after = list(Post.objects.order_by('pk').values_list('likes_count', 'dislikes_count'))
+        self.stdout.write(f'counters: {"consistent" if before == after else "DRIFTED"}')
+
+    def run(self, options):
+        author = User.objects.create_user(username='bench-author', email='bench-author@bench.local', password='!')
+        post_ids = [Post.objects.create(description=f'post {i}', author=author).pk for i in range(options['posts'])]
+        users = [
+            User.objects.create_user(username=f'bench-{i}', email=f'bench-{i}@bench.local', password='!')
+            for i in range(options['writers'])
+        ]
+        mode = connection.vendor
+        if mode == 'sqlite':
+            mode += ' ' + ', '.join(f'{name}={value}' for name, value in get_sqlite_pragmas(connection).items())
+            mode += f", transaction_mode={connection.settings_dict['OPTIONS'].get('transaction_mode', 'DEFERRED')}"
+        if countbuffer.is_enabled():
+            mode += f', write-behind every {countbuffer.get_interval()}s'
+        self.stdout.write(mode)
+
+        deadline = time.perf_counter() + options['seconds']
+        results = {'writes': [], 'reads': [], 'errors': [], 'messages': set()}
+        lock = threading.Lock()
+
+        def writer(user):
+            timings, errors, messages = [], 0, set()
+            reaction = reactions.LIKE
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        reactions.set_reaction(reactions.POST, random.choice(post_ids), user, reaction)
+                        timings.append(time.perf_counter() - started)
+                    except OperationalError as error:
+                        # "database is locked"
+                        errors += 1
+                        messages.add(str(error))
+                    reaction = reactions.NONE if reaction == reactions.LIKE else reactions.LIKE
+            finally:
+                connection.close()
+                with lock:
+                    results['writes'].extend(timings)
+                    results['errors'].append(errors)
+                    results['messages'].update(messages)
+
+        def reader():
+            timings = []
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    list(Post.objects.filter(pk__in=random.sample(post_ids, min(5, len(post_ids)))).values())
+                    timings.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+                with lock:
+                    results['reads'].extend(timings)
+
+        threads = [threading.Thread(target=writer, args=(user,)) for user in users]
+        threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for label in ('writes', 'reads'):
+            timings = sorted(results[label])
+            if not timings:
+                continue
+            self.stdout.write(
+                f'{label:>6}: {len(timings) / options["seconds"]:8.0f}/s'
+                f'  p50 {statistics.median(timings) * 1000:6.1f} ms'
+                f'  p95 {timings[int(len(timings) * 0.95)] * 1000:6.1f} ms'
+            )
+        self.stdout.write(f'errors: {sum(results["errors"])} failed writes {sorted(results["messages"])}')
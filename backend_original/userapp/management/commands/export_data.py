@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from userapp import export
+
+
+class Command(BaseCommand):
+    help = 'Stream users, posts or comments as NDJSON or CSV; --since exports only rows changed since then'
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=sorted(export.EXPORTS))
+        parser.add_argument('--export-format', choices=sorted(export.FORMATS), default='ndjson')
+        parser.add_argument('--since', help='ISO 8601 datetime, e.g. the "until" of the previous export')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError('--since expects an ISO 8601 datetime')
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        lines, until = export.export(options['resource'], options['export_format'], since)
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
+        # the --since of the next incremental export
+        self.stderr.write(f'until {until.isoformat()}')
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from userapp.synthetic import PASSWORD, generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Add a deterministic synthetic dataset to the database: users with power-law follows, posts, '
+        'likes/dislikes and comments, with counters, timelines and the search index filled in. '
+        f'Every generated account has the password "{PASSWORD}".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts-per-user', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = generate(options['users'], options['posts_per_user'], options['seed'], options['batch_size'])
+        for table, rows in created.items():
+            self.stdout.write(f'{rows:>10} {table}')
+        self.stdout.write(self.style.SUCCESS(f'Generated in {time.perf_counter() - started:.1f}s'))
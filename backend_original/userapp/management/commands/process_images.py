@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from userapp.images import needs_processing, process
+from userapp.models import User, Post
+
+
+class Command(BaseCommand):
+    help = 'Generate missing image renditions and placeholders for posts and users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate existing renditions too')
+
+    def handle(self, *args, **options):
+        for model in (Post, User):
+            queryset = model.objects.exclude(image='').exclude(image=None)
+            if options['force']:
+                queryset.update(image_renditions={})
+            done = 0
+            for instance in queryset.only('id', 'image', 'image_renditions').iterator():
+                if needs_processing(instance):
+                    process(model, instance.pk)
+                    done += 1
+            self.stdout.write(self.style.SUCCESS(f'Processed {done} {model._meta.verbose_name_plural.lower()}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from userapp.counters import rebuild_counters
+from userapp.models import Post, Comment
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized like/dislike/comment counters on Post and Comment'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            posts, comments = rebuild_counters(Post, Comment)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {posts} posts and {comments} comments'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from userapp.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the user search index of the configured search backend'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt user search index ({type(backend).__name__})'))
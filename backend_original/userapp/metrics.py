@@ -0,0 +1,204 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+
+# ----------------------------------------------------------------
+# REQUEST METRICS
+# ----------------------------------------------------------------
+# MetricsMiddleware times every request and records, per (view, method),
+#
+#   userapp_request_duration_seconds      total latency
+#   userapp_request_db_queries            SQL statements
+#   userapp_request_db_seconds            time spent in them
+#   userapp_request_serializer_seconds    time in serializer.data
+#   userapp_response_size_bytes           body size (not for streamed responses)
+#
+# into in-process histograms, served in Prometheus text format by
+# GET /metrics (admins only). Each process keeps its own: scrape every worker.
+#
+# Queries are counted by an execute wrapper installed on every new connection
+# (UserappConfig.ready), which adds to the RequestStats of the current context,
+# so queries run through sync_to_async by the async views count too. With
+# METRICS_SERVER_TIMING (DEBUG) responses carry the numbers in a Server-Timing
+# header, visible in the browser's network panel.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def is_enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # [count per bucket..., +Inf], sum
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self.series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            label_text = ','.join(f'{name}="{escape(value)}"' for name, value in labels)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+DURATION = Histogram('userapp_request_duration_seconds', 'Request latency.', DURATION_BUCKETS)
+DB_QUERIES = Histogram('userapp_request_db_queries', 'SQL statements per request.', QUERY_BUCKETS)
+DB_TIME = Histogram('userapp_request_db_seconds', 'Time in SQL statements per request.', DURATION_BUCKETS)
+SERIALIZER_TIME = Histogram('userapp_request_serializer_seconds', 'Time in serializer.data per request.', DURATION_BUCKETS)
+RESPONSE_SIZE = Histogram('userapp_response_size_bytes', 'Response body size.', SIZE_BUCKETS)
+HISTOGRAMS = (DURATION, DB_QUERIES, DB_TIME, SERIALIZER_TIME, RESPONSE_SIZE)
+
+
+def render_metrics():
+    return '\n'.join(line for histogram in HISTOGRAMS for line in histogram.collect()) + '\n'
+
+
+def reset_metrics():
+    for histogram in HISTOGRAMS:
+        histogram.reset()
+
+
+# ==================== PER REQUEST ====================
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+
+_current = ContextVar('request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    # connection.execute_wrapper, see UserappConfig.ready
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed_data(data):
+    # serializer.data, timed once per outermost call
+    def wrapped(serializer):
+        stats = _current.get()
+        if stats is None or stats.serializing:
+            return data(serializer)
+        stats.serializing = True
+        started = time.perf_counter()
+        try:
+            return data(serializer)
+        finally:
+            stats.serializer_time += time.perf_counter() - started
+            stats.serializing = False
+    return wrapped
+
+
+def instrument_serializers():
+    for cls in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(cls.data.fget, 'timed', False):
+            fget = timed_data(cls.data.fget)
+            fget.timed = True
+            cls.data = property(fget)
+
+
+class MetricsMiddleware:
+    # First in MIDDLEWARE, so the latency covers the whole stack
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not is_enabled():
+            return self.get_response(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, stats)
+
+    async def __acall__(self, request):
+        if not is_enabled():
+            return await self.get_response(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.record(request, response, stats)
+
+    def record(self, request, response, stats):
+        duration = time.perf_counter() - stats.started
+        match = getattr(request, 'resolver_match', None)
+        # unmatched URLs share one series, so scanners can't blow up the label set
+        labels = (('view', match.view_name if match else 'unmatched'), ('method', request.method))
+        DURATION.observe(labels, duration)
+        DB_QUERIES.observe(labels, stats.queries)
+        DB_TIME.observe(labels, stats.db_time)
+        SERIALIZER_TIME.observe(labels, stats.serializer_time)
+        if not isinstance(response, StreamingHttpResponse):
+            RESPONSE_SIZE.observe(labels, len(response.content))
+
+        if getattr(settings, 'METRICS_SERVER_TIMING', settings.DEBUG):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+                f'serializer;dur={stats.serializer_time * 1000:.1f}',
+                f'total;dur={duration * 1000:.1f}',
+            ])
+        return response
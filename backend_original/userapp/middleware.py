@@ -0,0 +1,44 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+from rest_framework.permissions import SAFE_METHODS
+
+from .dbrouters import pin_to_primary
+
+
+class ReplicaPinMiddleware:
+    # After a successful write, the user's reads go to the primary for
+    # REPLICA_PIN_SECONDS (dbrouters.py). request.user is the one DRF
+    # authenticated (JWT) by the time the response comes back.
+    # Sync and async, so it doesn't push async views onto a thread.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.wrote(request, response):
+            self.pin(getattr(request, 'user', None))
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.wrote(request, response):
+            user = getattr(request, 'user', None)
+            if isinstance(user, SimpleLazyObject):
+                # session user no view looked at: resolving it queries
+                user = await request.auser()
+            self.pin(user)
+        return response
+
+    def wrote(self, request, response):
+        return request.method not in SAFE_METHODS and response.status_code < 400
+
+    def pin(self, user):
+        if user is not None and user.is_authenticated:
+            pin_to_primary(user)
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:11
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+# Inlined rather than imported from userapp.counters: a migration has to keep
+# working on the historical models whatever happens to the app code later.
+def m2m_count(model, relation):
+    field = model._meta.get_field(relation)
+    through = field.remote_field.through
+    source = field.m2m_field_name()
+    rows = (
+        through.objects.filter(**{source: OuterRef('pk')})
+        .order_by()
+        .values(source)
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('userapp', 'Post')
+    Comment = apps.get_model('userapp', 'Comment')
+    comments = (
+        Comment.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    Post.objects.update(
+        comments_count=Coalesce(Subquery(comments), 0),
+        likes_count=m2m_count(Post, 'likes'),
+        dislikes_count=m2m_count(Post, 'dislikes'),
+    )
+    Comment.objects.update(
+        likes_count=m2m_count(Comment, 'comment_likes'),
+        dislikes_count=m2m_count(Comment, 'comment_dislikes'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:14
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Inlined rather than imported from userapp.search: a migration has to keep
+# working on the historical models whatever happens to the app code later.
+FTS_TABLE = 'userapp_user_fts'
+TOKEN_WEIGHTS = {'username': 3, 'first_name': 1, 'last_name': 1}
+
+
+def get_tokens(user):
+    tokens = {}
+    for field, weight in TOKEN_WEIGHTS.items():
+        for token in re.findall(r'\w+', (getattr(user, field) or '').lower()):
+            tokens[token[:150]] = max(tokens.get(token[:150], 0), weight)
+    return tokens
+
+
+def build_search_index(apps, schema_editor):
+    User = apps.get_model('userapp', 'User')
+    UserSearchToken = apps.get_model('userapp', 'UserSearchToken')
+    UserSearchToken.objects.bulk_create(
+        UserSearchToken(user_id=user.pk, token=token, weight=weight)
+        for user in User.objects.iterator()
+        for token, weight in get_tokens(user).items()
+    )
+
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"username, first_name, last_name, tokenize='unicode61', prefix='2 3')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, username, first_name, last_name) "
+            f"SELECT id, username, first_name, last_name FROM userapp_user"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userapp', '0002_reaction_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=150)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User search token',
+                'verbose_name_plural': 'User search tokens',
+                'indexes': [models.Index(fields=['token', 'user'], name='userapp_search_token_idx')],
+            },
+        ),
+        migrations.RunPython(build_search_index, drop_search_index),
+    ]
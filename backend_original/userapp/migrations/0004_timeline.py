@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_own_posts(apps, schema_editor):
+    # No follows exist yet: every timeline starts with the user's own posts
+    Post = apps.get_model('userapp', 'Post')
+    TimelineEntry = apps.get_model('userapp', 'TimelineEntry')
+    limit = getattr(settings, 'TIMELINE_MAX_LENGTH', 800)
+    batch, kept = [], {}
+    for post in Post.objects.order_by('author_id', '-created_at', '-id').values('id', 'author_id', 'created_at').iterator():
+        kept[post['author_id']] = kept.get(post['author_id'], 0) + 1
+        if kept[post['author_id']] > limit:
+            continue
+        batch.append(TimelineEntry(user_id=post['author_id'], post_id=post['id'], created_at=post['created_at']))
+        if len(batch) >= 2000:
+            TimelineEntry.objects.bulk_create(batch)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userapp', '0003_user_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='Follow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('followee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follower_set', to=settings.AUTH_USER_MODEL)),
+                ('follower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following_set', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Follow',
+                'verbose_name_plural': 'Follows',
+                'indexes': [models.Index(fields=['followee', 'follower'], name='userapp_follow_followee_idx')],
+                'constraints': [models.UniqueConstraint(fields=('follower', 'followee'), name='userapp_follow_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='userapp.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Timeline entry',
+                'verbose_name_plural': 'Timeline entries',
+                'indexes': [models.Index(fields=['user', '-created_at', '-post'], name='userapp_timeline_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'post'), name='userapp_timeline_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_own_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_created_at(apps, schema_editor):
+    # best guess for existing comments
+    Comment = apps.get_model('userapp', 'Comment')
+    Comment.objects.update(created_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userapp', '0006_export_watermarks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created_at', 'id'], name='userapp_comment_thread_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+# Reverse-direction lookups on the auto-created m2m tables ("what did this user
+# like"): Django only indexes (post_id, user_id) and user_id alone.
+THROUGH_INDEXES = [
+    ('userapp_post_likes_user_post_idx', 'userapp_post_likes', 'user_id, post_id'),
+    ('userapp_post_dislikes_user_post_idx', 'userapp_post_dislikes', 'user_id, post_id'),
+    ('userapp_comment_likes_user_comment_idx', 'userapp_comment_comment_likes', 'user_id, comment_id'),
+    ('userapp_comment_dislikes_user_comment_idx', 'userapp_comment_comment_dislikes', 'user_id, comment_id'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('userapp', '0007_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['created_at', 'id'], name='userapp_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'created_at', 'id'], name='userapp_post_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['id'], name='userapp_user_active_idx'),
+        ),
+    ] + [
+        migrations.RunSQL(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})',
+            f'DROP INDEX IF EXISTS {name}',
+        )
+        for name, table, columns in THROUGH_INDEXES
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userapp', '0008_index_tuning'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='dislikes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='likes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='dislikes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='likes_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
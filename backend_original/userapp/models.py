@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.contrib.auth.models import AbstractUser
 
 def user_image(instance, filename):
@@ -8,10 +10,22 @@ class User(AbstractUser):
     email = models.EmailField(unique=True, blank=False, null=False)
     image = models.ImageField(upload_to=user_image, blank=True, null=True)
     bio = models.TextField(blank=True, null=True)
+    # Resized copies of `image`, written by userapp.images
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    image_placeholder = models.TextField(blank=True, default='', editable=False)
+    # Denormalized, kept in sync by userapp.timeline.follow/unfollow
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    # Watermark for incremental exports (userapp.export)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='userapp_user_updated_idx'),
+            # user lists only show active users, paged by id
+            models.Index(fields=['id'], condition=Q(is_active=True), name='userapp_user_active_idx'),
+        ]
 
     def __str__(self):
         return self.username
@@ -20,6 +34,27 @@ class User(AbstractUser):
     def posts(self):
         return self.post_set.all()
 
+# ----------------------------------------------------------------
+# USER-SEARCH
+# ----------------------------------------------------------------
+# Token index used by userapp.search.TokenSearchBackend: one row per
+# lowercased word of username/first_name/last_name, looked up by prefix range.
+
+class UserSearchToken(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=150)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        verbose_name = 'User search token'
+        verbose_name_plural = 'User search tokens'
+        indexes = [
+            models.Index(fields=['token', 'user'], name='userapp_search_token_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.token} -> {self.user_id}"
+
 # ----------------------------------------------------------------
 # USER-POST
 # ----------------------------------------------------------------
@@ -31,6 +66,8 @@ def post_image(instance, filename):
 class Post(models.Model):
     description = models.TextField(blank=False, null=False)
     image = models.ImageField(upload_to=post_image, blank=True, null=True)
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    image_placeholder = models.TextField(blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -38,6 +75,14 @@ class Post(models.Model):
 
     dislikes = models.ManyToManyField(User, related_name='dislikes_set', blank=True, verbose_name='Dislikes')
 
+    # Denormalized counters, kept in sync by the reaction views (F() updates)
+    # and the comment signals below. Rebuild with `manage.py rebuild_counters`.
+    # Reaction counters are signed: with write-behind counts (countbuffer.py)
+    # an unlike can be flushed by one process before the like by another, and
+    # the count must dip below zero for the like to bring it back to 0.
+    likes_count = models.IntegerField(default=0, editable=False)
+    dislikes_count = models.IntegerField(default=0, editable=False)
+    comments_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.author.username} - {self.id}"
@@ -45,7 +90,60 @@ class Post(models.Model):
     class Meta:
         verbose_name = 'Post'
         verbose_name_plural = 'Posts'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='userapp_post_updated_idx'),
+            # keyset pages (PostCursorPagination) and an author's latest posts
+            # (fan-out on read, follow backfill, ?expand=posts)
+            models.Index(fields=['created_at', 'id'], name='userapp_post_created_idx'),
+            models.Index(fields=['author', 'created_at', 'id'], name='userapp_post_author_idx'),
+        ]
+
+
+
+# ----------------------------------------------------------------
+# USER-FOLLOW
+# ----------------------------------------------------------------
+
+class Follow(models.Model):
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following_set')
+    followee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follower_set')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Follow'
+        verbose_name_plural = 'Follows'
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followee'], name='userapp_follow_unique'),
+        ]
+        indexes = [
+            # fan-out: all followers of an author
+            models.Index(fields=['followee', 'follower'], name='userapp_follow_followee_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.follower_id} -> {self.followee_id}"
 
+# Materialized home timeline (see userapp.timeline): one row per post per
+# reader, written when the post is created. created_at is copied from the post
+# so a page is a single range scan of (user, created_at, post).
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Timeline entry'
+        verbose_name_plural = 'Timeline entries'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='userapp_timeline_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='userapp_timeline_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.post_id}"
 
 
 # ----------------------------------------------------------------
@@ -58,14 +156,151 @@ class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     comment_likes = models.ManyToManyField(User, related_name='comment_likes', blank=True, verbose_name='Comment_Likes')
     comment_dislikes = models.ManyToManyField(User, related_name='comment_dislikes', blank=True, verbose_name='Comment_Dislikes')
 
+    # signed, as Post's
+    likes_count = models.IntegerField(default=0, editable=False)
+    dislikes_count = models.IntegerField(default=0, editable=False)
+
     class Meta:
         verbose_name = 'Comment'
         verbose_name_plural = 'Comments'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='userapp_comment_updated_idx'),
+            # a post's thread, oldest first: previews and /posts/{id}/comments/
+            models.Index(fields=['post', 'created_at', 'id'], name='userapp_comment_thread_idx'),
+        ]
     
     def __str__(self):
-        return f"Comment by {self.author.username} on {self.post.description} post"
\ No newline at end of file
+        return f"Comment by {self.author.username} on {self.post.description} post"
+
+
+def increment_comments_count(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(comments_count=F('comments_count') + 1)
+
+def decrement_comments_count(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, comments_count__gt=0).update(comments_count=F('comments_count') - 1)
+
+post_save.connect(increment_comments_count, sender=Comment)
+post_delete.connect(decrement_comments_count, sender=Comment)
+
+
+def index_user_for_search(sender, instance, **kwargs):
+    from .search import get_search_backend
+    get_search_backend().index(instance)
+
+def unindex_user_for_search(sender, instance, **kwargs):
+    from .search import get_search_backend
+    get_search_backend().remove(instance.pk)
+
+post_save.connect(index_user_for_search, sender=User)
+post_delete.connect(unindex_user_for_search, sender=User)
+
+
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        from .timeline import fan_out
+        fan_out(instance)
+
+post_save.connect(fan_out_post, sender=Post)
+
+
+def process_image(sender, instance, **kwargs):
+    from .images import enqueue, needs_processing
+    if needs_processing(instance):
+        enqueue(sender, instance.pk)
+
+post_save.connect(process_image, sender=Post)
+post_save.connect(process_image, sender=User)
+
+
+# Cached post/user representations (cache.py), invalidated once the write commits
+def post_author_ids(post_ids):
+    return list(Post.objects.filter(pk__in=post_ids).values_list('author_id', flat=True))
+
+def invalidate_posts(post_ids):
+    from .cache import post_cache, user_cache
+    post_ids = list(post_ids)
+    post_cache.invalidate_on_commit(post_ids)
+    # user representations embed their posts
+    user_cache.invalidate_on_commit(post_author_ids(post_ids))
+
+def invalidate_post_cache(sender, instance, **kwargs):
+    from .cache import post_cache, user_cache
+    post_cache.invalidate_on_commit([instance.pk])
+    user_cache.invalidate_on_commit([instance.author_id])
+
+def invalidate_comment_cache(sender, instance, **kwargs):
+    invalidate_posts([instance.post_id])
+
+def invalidate_post_reactions_cache(sender, instance, action, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, Post):
+        invalidate_posts([instance.pk])
+    elif pk_set:
+        invalidate_posts(pk_set)
+
+def invalidate_comment_reactions_cache(sender, instance, action, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, Comment):
+        invalidate_posts([instance.post_id])
+    elif pk_set:
+        invalidate_posts(Comment.objects.filter(pk__in=pk_set).values_list('post_id', flat=True))
+
+# What post representations show of a user (author, commenters, likers)
+USER_POST_FIELDS = ('username', 'image', 'image_renditions')
+
+def remember_user_post_changes(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Whether this save changes USER_POST_FIELDS, for invalidate_user_cache:
+    # one primary-key lookup instead of fanning out over every post the user
+    # touched on each password change or login
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None:
+        instance._post_fields_changed = not set(update_fields).isdisjoint(USER_POST_FIELDS)
+        return
+    old = User.objects.filter(pk=instance.pk).values(*USER_POST_FIELDS).first()
+    new = {
+        'username': instance.username,
+        'image': instance.image.name or None,
+        'image_renditions': instance.image_renditions,
+    }
+    instance._post_fields_changed = old is None or any(
+        (old[field] or None) != (new[field] or None) for field in USER_POST_FIELDS
+    )
+
+def invalidate_user_cache(sender, instance, created=False, **kwargs):
+    from .cache import user_cache
+    user_cache.invalidate_on_commit([instance.pk])
+    if created or kwargs.get('signal') is post_delete:
+        return
+    # not set when called directly (images.py): assume the worst
+    if not instance.__dict__.pop('_post_fields_changed', True):
+        return
+    # posts show the username/image of their author, commenters and likers
+    post_ids = set(instance.post_set.values_list('id', flat=True))
+    post_ids.update(instance.comment_set.values_list('post_id', flat=True))
+    post_ids.update(instance.likes_set.values_list('id', flat=True))
+    post_ids.update(instance.dislikes_set.values_list('id', flat=True))
+    post_ids.update(Comment.objects.filter(Q(comment_likes=instance) | Q(comment_dislikes=instance)).values_list('post_id', flat=True))
+    if post_ids:
+        invalidate_posts(post_ids)
+
+post_save.connect(invalidate_post_cache, sender=Post)
+post_delete.connect(invalidate_post_cache, sender=Post)
+post_save.connect(invalidate_comment_cache, sender=Comment)
+post_delete.connect(invalidate_comment_cache, sender=Comment)
+m2m_changed.connect(invalidate_post_reactions_cache, sender=Post.likes.through)
+m2m_changed.connect(invalidate_post_reactions_cache, sender=Post.dislikes.through)
+m2m_changed.connect(invalidate_comment_reactions_cache, sender=Comment.comment_likes.through)
+m2m_changed.connect(invalidate_comment_reactions_cache, sender=Comment.comment_dislikes.through)
+pre_save.connect(remember_user_post_changes, sender=User)
+post_save.connect(invalidate_user_cache, sender=User)
+post_delete.connect(invalidate_user_cache, sender=User)
@@ -1,4 +1,17 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import heapq
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .models import TimelineEntry
+from .timeline import FeedItem
 
 class CustomPagination(PageNumberPagination):
     page_size = 5
@@ -6,4 +19,198 @@ class CustomPagination(PageNumberPagination):
     page_query_param = 'page'
     page_size_query_param = 'page_size'
 
-    # ?page=3&page_size=6
\ No newline at end of file
+    # ?page=3&page_size=6
+
+
+# Keyset ("seek") pagination: pages are located with a WHERE on the ordering
+# key of the last row seen instead of COUNT(*) + OFFSET, so deep pages cost
+# the same as the first one and inserts don't shift pages.
+#
+#   ?cursor=<opaque>&page_size=6
+class KeysetPagination(BasePagination):
+    page_size = 5
+    max_page_size = 10
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    # Must end in a unique field so the key is total
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+    # Used to parse cursor values when the paginated object isn't a queryset
+    model = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        values, reverse = self.start(queryset, request)
+        return self.set_page(self.fetch(queryset, self.get_ordering(reverse), values), reverse)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # for async views: the page query runs on the async ORM
+        values, reverse = self.start(queryset, request)
+        return self.set_page(await self.afetch(queryset, self.get_ordering(reverse), values), reverse)
+
+    def start(self, queryset, request):
+        self.request = request
+        self.model = getattr(queryset, 'model', self.model)
+        self.page_size = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request)
+        self.has_cursor = values is not None
+        return values, reverse
+
+    def set_page(self, rows, reverse):
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = self.has_cursor, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.has_cursor
+        return self.page
+
+    def fetch(self, queryset, ordering, values):
+        return list(self.page_query(queryset, ordering, values))
+
+    async def afetch(self, queryset, ordering, values):
+        return [row async for row in self.page_query(queryset, ordering, values)]
+
+    def page_query(self, queryset, ordering, values):
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(ordering, values))
+        return queryset[:self.page_size + 1]
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, reverse):
+        if not reverse:
+            return list(self.ordering)
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def get_keyset_filter(self, ordering, values):
+        # (a, b) after (x, y)  ==  a > x OR (a = x AND b > y), per column direction
+        keyset = Q()
+        for i, name in enumerate(ordering):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            equal = {o.lstrip('-'): v for o, v in zip(ordering[:i], values[:i])}
+            keyset |= Q(**equal, **{f'{field}__{lookup}': values[i]})
+        return keyset
+
+    # ==================== CURSORS ====================
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, instance, reverse):
+        values = []
+        for name in self.ordering:
+            value = getattr(instance, name.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        payload = json.dumps({'v': values, 'r': int(reverse)}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values, reverse = payload['v'], bool(payload['r'])
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [self.to_python(name, value) for name, value in zip(self.ordering, values)], reverse
+        except (binascii.Error, ValueError, KeyError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def to_python(self, name, value):
+        try:
+            field = self.model._meta.get_field(name.lstrip('-'))
+        except FieldDoesNotExist:
+            # annotation (e.g. a search rank): JSON value as is
+            return value
+        return field.to_python(value)
+
+
+class PostCursorPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class CommentThreadPagination(KeysetPagination):
+    # (post, created_at, id) index: one range scan per page
+    ordering = ('created_at', 'id')
+    page_size = 20
+    max_page_size = 100
+
+
+class UserCursorPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class UserSearchCursorPagination(KeysetPagination):
+    # Not the search rank: it's a position in a result list recomputed per
+    # request, so cursors on it would shift whenever the index changes
+    ordering = ('username', 'id')
+
+
+class TimelinePagination(KeysetPagination):
+    # Pages a merge of several sources of {'created_at', 'post_id'} rows
+    # (userapp.timeline.feed_sources); every source is one keyset query.
+    ordering = ('-created_at', '-post_id')
+    model = TimelineEntry
+
+    def fetch(self, sources, ordering, values):
+        return self.merge([super(TimelinePagination, self).fetch(source, ordering, values) for source in sources], ordering)
+
+    async def afetch(self, sources, ordering, values):
+        return self.merge([await super(TimelinePagination, self).afetch(source, ordering, values) for source in sources], ordering)
+
+    def merge(self, pages, ordering):
+        rows = heapq.merge(
+            *pages,
+            key=lambda row: (row['created_at'], row['post_id']),
+            reverse=ordering[0].startswith('-'),
+        )
+        items = []
+        for row in rows:
+            # a post can be both fanned out and pulled: keep one
+            if items and items[-1].post_id == row['post_id']:
+                continue
+            items.append(FeedItem(row['created_at'], row['post_id']))
+            if len(items) > self.page_size:
+                break
+        return items
+
+
+def get_paginator(request, cursor_class, page_class=CustomPagination):
+    # Old clients keep the ?page= contract; ?cursor=... (or ?pagination=cursor
+    # for the first page) opts into keyset pagination.
+    params = request.query_params
+    if cursor_class is not None and (params.get('cursor') or params.get('pagination') == 'cursor'):
+        return cursor_class()
+    return page_class()
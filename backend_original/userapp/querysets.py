@@ -0,0 +1,114 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Exists, OuterRef, Prefetch, Value
+from rest_framework import serializers
+
+# ----------------------------------------------------------------
+# QUERY PLANNER
+# ----------------------------------------------------------------
+# Walks the fields of a serializer and works out the select_related /
+# prefetch_related calls it needs, so that serializing a whole page costs a
+# fixed number of queries instead of a few per row.
+#
+#   ReadOnlyField(source='author.username')  -> select_related('author')
+#   SerializerMethodField named after an m2m -> prefetch_related('likes')
+#   CommentSerializer(many=True)             -> Prefetch('comments', <planned comments>)
+#   PreviewListSerializer(child=...)         -> the same, sliced to its first few rows
+#
+# Serializers that need more than that (e.g. per-user annotations) can define
+# a `setup_queryset(queryset, request)` classmethod, which is applied last.
+
+
+def _get_relation(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation else None
+
+
+def _source_attrs(name, field):
+    if field.source == '*':
+        # SerializerMethodField: assume get_<name> reads the relation of the same name
+        return [name] if isinstance(field, serializers.SerializerMethodField) else []
+    return field.source.split('.')
+
+
+def _walk(model, attrs, select_related):
+    # Follows forward FKs with select_related and stops at the first
+    # many-valued relation, which is returned so the caller can prefetch it.
+    path = ''
+    for attr in attrs:
+        relation = _get_relation(model, attr)
+        if relation is None:
+            break
+        path = f'{path}__{attr}' if path else attr
+        if relation.many_to_many or relation.one_to_many:
+            return path, relation
+        select_related.add(path)
+        model = relation.related_model
+    return None, None
+
+
+def plan_queryset(queryset, serializer_class, request=None, skip=()):
+    model = queryset.model
+    select_related = set()
+    prefetch_related = []
+
+    for name, field in serializer_class().fields.items():
+        if field.write_only or name in skip:
+            continue
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        attrs = _source_attrs(name, field)
+        if attrs and attrs[0] in skip:
+            continue
+
+        path, relation = _walk(model, attrs, select_related)
+        if path is None:
+            continue
+
+        if isinstance(nested, serializers.ModelSerializer):
+            # Nested serializer over a reverse FK / m2m: plan its queryset too.
+            # The back reference to the parent is filled in by the prefetch itself.
+            related_model = relation.related_model
+            back_reference = relation.remote_field.name if relation.one_to_many else None
+            nested_queryset = plan_queryset(
+                related_model._default_manager.all(),
+                nested.__class__,
+                request=request,
+                skip=(back_reference,) if back_reference else (),
+            )
+            if hasattr(field, 'get_preview_limit'):
+                # first `limit` rows per parent, in one windowed query (a
+                # sliced prefetch needs its own attribute)
+                nested_queryset = nested_queryset.order_by(*field.preview_ordering)[:field.get_preview_limit()]
+                prefetch_related.append(Prefetch(path, queryset=nested_queryset, to_attr=field.preview_attr))
+            else:
+                prefetch_related.append(Prefetch(path, queryset=nested_queryset))
+        else:
+            prefetch_related.append(path)
+
+    if select_related:
+        queryset = queryset.select_related(*sorted(select_related))
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    if hasattr(serializer_class, 'setup_queryset'):
+        queryset = serializer_class.setup_queryset(queryset, request)
+    return queryset
+
+
+def annotate_reactions(queryset, user, **relations):
+    # annotate_reactions(qs, user, liked_by_me='likes') adds a boolean EXISTS
+    # over the through table instead of loading the whole m2m list.
+    annotations = {}
+    for name, relation in relations.items():
+        if user is None or not user.is_authenticated:
+            annotations[name] = Value(False)
+            continue
+        field = queryset.model._meta.get_field(relation)
+        through = field.remote_field.through
+        annotations[name] = Exists(through.objects.filter(**{
+            field.m2m_field_name(): OuterRef('pk'),
+            field.m2m_reverse_field_name(): user.pk,
+        }))
+    return queryset.annotate(**annotations)
@@ -0,0 +1,146 @@
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.http import Http404
+
+from .models import User, Post, Comment, invalidate_posts
+from .querysets import annotate_reactions
+from . import countbuffer, live
+
+# ----------------------------------------------------------------
+# REACTIONS
+# ----------------------------------------------------------------
+# One code path for like / dislike / none on posts and comments, used by
+# PUT /posts/{id}/reaction/, PUT /comments/{id}/reaction/ and the older
+# like/dislike/remove views.
+#
+# Membership is read with EXISTS over the through tables' (target, user)
+# unique index and changed with single-row INSERT/DELETEs, and the counters
+# move with F() by the number of rows actually inserted/deleted. The user's
+# own row is locked for the transaction, so two concurrent clicks by the same
+# user are serialized while clicks by different users on a hot post are not.
+# Count changes are pushed to live subscribers (live.py) on commit. With
+# REACTION_COUNTS_WRITE_BEHIND the counters are updated in batches instead
+# (countbuffer.py).
+
+LIKE = 'like'
+DISLIKE = 'dislike'
+NONE = 'none'
+REACTIONS = (LIKE, DISLIKE, NONE)
+
+ReactionTarget = namedtuple('ReactionTarget', ['name', 'model', 'relations', 'counters', 'post_id'])
+ReactionState = namedtuple('ReactionState', ['id', 'reaction', 'likes_count', 'dislikes_count', 'changed'])
+
+POST = ReactionTarget(
+    name='post',
+    model=Post,
+    relations={LIKE: 'likes', DISLIKE: 'dislikes'},
+    counters={LIKE: 'likes_count', DISLIKE: 'dislikes_count'},
+    post_id='id',
+)
+COMMENT = ReactionTarget(
+    name='comment',
+    model=Comment,
+    relations={LIKE: 'comment_likes', DISLIKE: 'comment_dislikes'},
+    counters={LIKE: 'likes_count', DISLIKE: 'dislikes_count'},
+    post_id='post_id',
+)
+
+
+def through_rows(target, reaction, pk, user_id):
+    field = target.model._meta.get_field(target.relations[reaction])
+    return field.remote_field.through.objects.filter(**{
+        f'{field.m2m_field_name()}_id': pk,
+        f'{field.m2m_reverse_field_name()}_id': user_id,
+    })
+
+
+def add_row(target, reaction, pk, user_id):
+    field = target.model._meta.get_field(target.relations[reaction])
+    through = field.remote_field.through
+    try:
+        with transaction.atomic():
+            through.objects.create(**{
+                f'{field.m2m_field_name()}_id': pk,
+                f'{field.m2m_reverse_field_name()}_id': user_id,
+            })
+        return 1
+    except IntegrityError:
+        # already there (unique (target, user)): nothing to count
+        return 0
+
+
+def get_state(target, pk, user):
+    row = (
+        annotate_reactions(
+            target.model.objects.filter(pk=pk), user,
+            liked=target.relations[LIKE], disliked=target.relations[DISLIKE],
+        )
+        .values('liked', 'disliked', 'likes_count', 'dislikes_count', target.post_id)
+        .first()
+    )
+    if row is None:
+        raise Http404
+    return row
+
+
+def get_states(target, ids, user):
+    # The user's reaction and the counts for many targets in one query:
+    # two EXISTS per row instead of the full likes/dislikes username lists.
+    rows = annotate_reactions(
+        target.model.objects.filter(pk__in=ids), user,
+        liked=target.relations[LIKE], disliked=target.relations[DISLIKE],
+    ).values('id', 'liked', 'disliked', 'likes_count', 'dislikes_count')
+    return [
+        ReactionState(
+            row['id'],
+            LIKE if row['liked'] else DISLIKE if row['disliked'] else NONE,
+            row['likes_count'], row['dislikes_count'], False,
+        )
+        for row in rows
+    ]
+
+
+def set_reaction(target, pk, user, reaction, only_if=None):
+    # Sets the user's reaction to `reaction`. With only_if, nothing changes
+    # unless the current reaction is `only_if` (used by the remove views).
+    if reaction not in REACTIONS:
+        raise ValueError(f'Unknown reaction {reaction!r}')
+
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(pk=user.pk).values_list('pk'))
+        row = get_state(target, pk, user)
+        current = LIKE if row['liked'] else DISLIKE if row['disliked'] else NONE
+        stored = {'likes_count': row['likes_count'], 'dislikes_count': row['dislikes_count']}
+
+        if current == reaction or (only_if is not None and current != only_if):
+            counts = countbuffer.with_pending(target, int(pk), stored)
+            return ReactionState(int(pk), current, counts['likes_count'], counts['dislikes_count'], False)
+
+        deltas = {}
+        if current != NONE:
+            deleted, _ = through_rows(target, current, pk, user.pk).delete()
+            deltas[target.counters[current]] = -deleted
+        if reaction != NONE:
+            deltas[target.counters[reaction]] = add_row(target, reaction, pk, user.pk)
+
+        deltas = {counter: delta for counter, delta in deltas.items() if delta}
+        if deltas and countbuffer.is_enabled():
+            # the counters move in the next flush (countbuffer.py)
+            countbuffer.buffer_deltas(target, int(pk), row[target.post_id], deltas)
+            counts = countbuffer.with_pending(target, int(pk), stored, deltas)
+        else:
+            if deltas:
+                # clamped: here the counter moves in the row's transaction, so going
+                # below 0 only means it had drifted (unlike write-behind deltas)
+                target.model.objects.filter(pk=pk).update(**{
+                    counter: Greatest(F(counter) + delta, 0) for counter, delta in deltas.items()
+                })
+            counts = target.model.objects.filter(pk=pk).values('likes_count', 'dislikes_count').get()
+        if deltas:
+            # through-table writes bypass m2m_changed, so invalidate here
+            invalidate_posts([row[target.post_id]])
+            live.publish_counts(target.name, int(pk), row[target.post_id], counts['likes_count'], counts['dislikes_count'])
+    return ReactionState(int(pk), reaction, counts['likes_count'], counts['dislikes_count'], bool(deltas))
@@ -0,0 +1,196 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Max, Q, Sum, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import User, UserSearchToken
+
+# ----------------------------------------------------------------
+# USER SEARCH
+# ----------------------------------------------------------------
+# SearchUserView used to OR three icontains lookups, i.e. a full scan of the
+# user table per keystroke. Users are now indexed on save (see the signals in
+# models.py) and looked up by word prefix, ranked, through a pluggable backend:
+#
+#   USER_SEARCH_BACKEND = 'userapp.search.TokenSearchBackend'   # any database
+#   USER_SEARCH_BACKEND = 'userapp.search.SQLiteFTSBackend'     # SQLite FTS5
+#
+# Left unset, FTS5 is used when the database is SQLite and the table exists.
+
+SEARCH_FIELDS = ('username', 'first_name', 'last_name')
+MAX_TERMS = 5
+
+
+def tokenize(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+class TokenSearchBackend:
+    # Matches in username count more than in first/last name
+    weights = {'username': 3, 'first_name': 1, 'last_name': 1}
+
+    def get_tokens(self, user):
+        tokens = {}
+        for field, weight in self.weights.items():
+            for token in tokenize(getattr(user, field)):
+                tokens[token[:150]] = max(tokens.get(token[:150], 0), weight)
+        return tokens
+
+    def index(self, user):
+        tokens = self.get_tokens(user)
+        current = dict(UserSearchToken.objects.filter(user=user).values_list('token', 'weight'))
+        if current == tokens:
+            return
+        with transaction.atomic():
+            UserSearchToken.objects.filter(user=user).delete()
+            UserSearchToken.objects.bulk_create(
+                UserSearchToken(user=user, token=token, weight=weight) for token, weight in tokens.items()
+            )
+
+    def remove(self, user_id):
+        UserSearchToken.objects.filter(user_id=user_id).delete()
+
+    def rebuild(self, batch_size=2000):
+        UserSearchToken.objects.all().delete()
+        batch = []
+        for user in User.objects.only(*SEARCH_FIELDS).iterator(chunk_size=batch_size):
+            batch.extend(
+                UserSearchToken(user_id=user.pk, token=token, weight=weight)
+                for token, weight in self.get_tokens(user).items()
+            )
+            if len(batch) >= batch_size:
+                UserSearchToken.objects.bulk_create(batch)
+                batch = []
+        UserSearchToken.objects.bulk_create(batch)
+
+    def prefix(self, term):
+        # Range instead of LIKE 'term%' so the (token, user) index is used on every backend
+        return Q(token__gte=term, token__lt=term + '\uffff')
+
+    def search(self, term, limit):
+        terms = tokenize(term)[:MAX_TERMS]
+        if not terms:
+            return []
+        # every term must prefix-match some token of the user
+        matched = {
+            f'matched_{i}': Max(Case(When(self.prefix(t), then=Value(1)), default=Value(0), output_field=IntegerField()))
+            for i, t in enumerate(terms)
+        }
+        # exact word matches rank above prefix matches
+        score = Sum(F('weight') * Case(When(token__in=terms, then=Value(2)), default=Value(1), output_field=IntegerField()))
+        rows = (
+            UserSearchToken.objects.filter(reduce(or_, [self.prefix(t) for t in terms]))
+            .values('user_id')
+            .annotate(score=score, **matched)
+            .filter(**{name: 1 for name in matched})
+            .order_by('-score', 'user__username')
+            .values_list('user_id', flat=True)
+        )
+        return list(rows[:limit])
+
+
+class SQLiteFTSBackend:
+    table = 'userapp_user_fts'
+    # bm25 column weights, in SEARCH_FIELDS order
+    weights = (3.0, 1.0, 1.0)
+
+    @classmethod
+    def is_available(cls):
+        return connection.vendor == 'sqlite' and cls.table in connection.introspection.table_names()
+
+    def index(self, user):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT OR REPLACE INTO {self.table} (rowid, {', '.join(SEARCH_FIELDS)}) VALUES (%s, %s, %s, %s)",
+                [user.pk] + [getattr(user, field) or '' for field in SEARCH_FIELDS],
+            )
+
+    def remove(self, user_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid = %s", [user_id])
+
+    def rebuild(self, batch_size=None):
+        fields = ', '.join(SEARCH_FIELDS)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(f"INSERT INTO {self.table} (rowid, {fields}) SELECT id, {fields} FROM {User._meta.db_table}")
+
+    def search(self, term, limit):
+        terms = tokenize(term)[:MAX_TERMS]
+        if not terms:
+            return []
+        # "ann"* "smi"*  ->  both prefixes, implicit AND
+        match = ' '.join(f'"{t}"*' for t in terms)
+        bm25 = f"bm25({self.table}, {', '.join(map(str, self.weights))})"
+        # bm25 doesn't favour exact words, so an exact username goes first
+        exact = ', '.join(['%s'] * len(terms))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY lower(username) IN ({exact}) DESC, {bm25}, username LIMIT %s",
+                # LIMIT -1: no limit
+                [match, *terms, -1 if limit is None else limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+_backend = None
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'USER_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif SQLiteFTSBackend.is_available():
+            _backend = SQLiteFTSBackend()
+        else:
+            _backend = TokenSearchBackend()
+    return _backend
+
+def reset_search_backend(*, setting, **kwargs):
+    global _backend
+    if setting == 'USER_SEARCH_BACKEND':
+        _backend = None
+
+setting_changed.connect(reset_search_backend)
+
+
+def search_ids(term, limit=None, backend=None):
+    # -> ids of the users matching `term`, best first (all of them with no limit)
+    return (backend or get_search_backend()).search(term, limit)
+
+
+def search_users(term, backend=None):
+    return search_matches(term, backend)[0]
+
+
+def search_matches(term, backend=None):
+    # -> (users, truncated). At most USER_SEARCH_MAX_RESULTS users matching
+    # `term`, annotated with their rank; truncated says there were more (the
+    # client should refine the term). For cursor pages, which are ordered by
+    # username and so need every match in one queryset; ?page= requests page
+    # through search_ids() instead and rank only the page.
+    limit = getattr(settings, 'USER_SEARCH_MAX_RESULTS', 200)
+    ids = search_ids(term, limit + 1, backend)
+    return rank_users(ids[:limit]), len(ids) > limit
+
+
+def rank_users(ids):
+    # -> the users with these ids, annotated with their position as search_rank (0 = best)
+    if not ids:
+        return User.objects.none().annotate(search_rank=Value(0))
+    # One raw simple CASE: compiling 200 When() objects costs more than the query itself
+    column = f'{connection.ops.quote_name(User._meta.db_table)}.{connection.ops.quote_name("id")}'
+    rank = RawSQL(
+        f"CASE {column} {' '.join(['WHEN %s THEN %s'] * len(ids))} END",
+        [value for position, pk in enumerate(ids) for value in (pk, position)],
+        output_field=IntegerField(),
+    )
+    return User.objects.filter(pk__in=ids).annotate(search_rank=rank)
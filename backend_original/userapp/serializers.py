@@ -1,7 +1,12 @@
+from django.conf import settings
+from django.db.models import Count
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 from .models import User, Post, Comment
+from .querysets import annotate_reactions
+from .reactions import REACTIONS
+from .images import image_url, rendition_urls
 
 # Mixin for handling post count
 class PostCountMixin:
@@ -11,19 +16,36 @@ class PostCountMixin:
         # posts is @property
         return obj.posts.count()
 
+# Used by the "counts" serializers: reads the EXISTS annotation added by
+# setup_queryset, falling back to a single lookup for unplanned instances
+def reacted_by_me(serializer, obj, annotation, relation):
+    if hasattr(obj, annotation):
+        return getattr(obj, annotation)
+    request = serializer.context.get('request')
+    if request is None or not request.user.is_authenticated:
+        return False
+    return getattr(obj, relation).filter(pk=request.user.pk).exists()
+
 # ----------------------------------------------------------------
 # USER-COMMENT
 # ----------------------------------------------------------------
 
+# ?image_size= picks a rendition (images.py); the original until it exists
+def author_image(serializer, obj):
+    return image_url(obj.author.image, obj.author.image_renditions, serializer.context)
+
 class CommentSerializer(serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')
-    author_image = serializers.ReadOnlyField(source='author.image.url')
+    author_image = serializers.SerializerMethodField()
     post = serializers.ReadOnlyField(source='post.description')
 
     # post = serializers.ReadOnlyField()
     comment_likes = serializers.SerializerMethodField()
     comment_dislikes = serializers.SerializerMethodField()
 
+    def get_author_image(self, obj):
+        return author_image(self, obj)
+
     def get_comment_likes(self, obj):
         return [user.username for user in obj.comment_likes.all()]
 
@@ -35,10 +57,55 @@ class CommentSerializer(serializers.ModelSerializer):
         model = Comment
         fields = '__all__'
 
+# Counts + liked_by_me instead of the full username lists (?reactions=counts)
+class CommentCountsSerializer(CommentSerializer):
+    comment_likes = None
+    comment_dislikes = None
+    liked_by_me = serializers.SerializerMethodField()
+    disliked_by_me = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Comment
+        exclude = ('comment_likes', 'comment_dislikes')
+
+    @classmethod
+    def setup_queryset(cls, queryset, request):
+        return annotate_reactions(
+            queryset, getattr(request, 'user', None),
+            liked_by_me='comment_likes', disliked_by_me='comment_dislikes',
+        )
+
+    def get_liked_by_me(self, obj):
+        return reacted_by_me(self, obj, 'liked_by_me', 'comment_likes')
+
+    def get_disliked_by_me(self, obj):
+        return reacted_by_me(self, obj, 'disliked_by_me', 'comment_dislikes')
+
+# The first few comments of a post, oldest first; the rest are paged through
+# /posts/{id}/comments/. plan_queryset prefetches exactly those; unplanned
+# posts are sliced here.
+class PreviewListSerializer(serializers.ListSerializer):
+    preview_ordering = ('created_at', 'id')
+
+    def get_preview_limit(self):
+        return getattr(settings, 'COMMENT_PREVIEW_LIMIT', 3)
+
+    @property
+    def preview_attr(self):
+        return f'{self.source}_preview'
+
+    def get_attribute(self, instance):
+        if hasattr(instance, self.preview_attr):
+            return getattr(instance, self.preview_attr)
+        related = super().get_attribute(instance)
+        return related.order_by(*self.preview_ordering)[:self.get_preview_limit()]
+
 class CommentCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = '__all__'
+        # reactions go through reactions.set_reaction, which keeps the counters
+        read_only_fields = ('comment_likes', 'comment_dislikes')
 
 
 
@@ -48,15 +115,17 @@ class CommentCreateSerializer(serializers.ModelSerializer):
 
 class PostSerializer(serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')
-    author_image = serializers.ReadOnlyField(source='author.image.url')
-    # author_image = serializers.SerializerMethodField()
+    # author_image = serializers.ReadOnlyField(source='author.image.url')
+    author_image = serializers.SerializerMethodField()
     author_id = serializers.ReadOnlyField(source='author.id')
     likes = serializers.SerializerMethodField()
 
     dislikes = serializers.SerializerMethodField()
 
-    comments = CommentSerializer(many=True, read_only=True)
+    # comments_count is the total
+    comments = PreviewListSerializer(child=CommentSerializer(), read_only=True)
     image = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
@@ -76,28 +145,106 @@ class PostSerializer(serializers.ModelSerializer):
         return [user.username for user in obj.dislikes.all()]
 
 
+    def get_author_image(self, obj):
+        return author_image(self, obj)
+
     # Env
     def get_image(self, obj):
-        return obj.image.url.replace('http://localhost:8000', '')
+        url = image_url(obj.image, obj.image_renditions, self.context)
+        return url.replace('http://localhost:8000', '') if url else None
         # return obj.image.url.replace('http://localhost:8000', '') if obj.image else None
 
+    def get_image_renditions(self, obj):
+        return rendition_urls(obj.image, obj.image_renditions)
+
+
+# Counts + liked_by_me instead of the full username lists (?reactions=counts)
+class PostCountsSerializer(PostSerializer):
+    likes = None
+    dislikes = None
+    comments = PreviewListSerializer(child=CommentCountsSerializer(), read_only=True)
+    liked_by_me = serializers.SerializerMethodField()
+    disliked_by_me = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Post
+        exclude = ('likes', 'dislikes')
+
+    @classmethod
+    def setup_queryset(cls, queryset, request):
+        return annotate_reactions(
+            queryset, getattr(request, 'user', None),
+            liked_by_me='likes', disliked_by_me='dislikes',
+        )
+
+    def get_liked_by_me(self, obj):
+        return reacted_by_me(self, obj, 'liked_by_me', 'likes')
+
+    def get_disliked_by_me(self, obj):
+        return reacted_by_me(self, obj, 'disliked_by_me', 'dislikes')
+
 
 class PostCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
         fields = '__all__'
+        # reactions go through reactions.set_reaction, which keeps the counters
+        read_only_fields = ('likes', 'dislikes')
+
+
+# ----------------------------------------------------------------
+# REACTIONS
+# ----------------------------------------------------------------
+
+class ReactionSerializer(serializers.Serializer):
+    reaction = serializers.ChoiceField(choices=REACTIONS)
+
+class ReactionStateSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    reaction = serializers.CharField()
+    likes_count = serializers.IntegerField()
+    dislikes_count = serializers.IntegerField()
 
 
 # ----------------------------------------------------------------
 # USER-AUTH
 # ----------------------------------------------------------------
 
-class UserSerializer(serializers.ModelSerializer):
-    posts = PostSerializer(many=True, read_only=True)
+# Posts are only embedded on request (?expand=posts): the view prefetches the
+# latest few into `expanded_posts` and sets context['expand_posts']
+class ExpandPostsMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.context.get('expand_posts'):
+            self.fields['posts'] = PostSerializer(many=True, read_only=True, source='expanded_posts')
+
+class UserSerializer(ExpandPostsMixin, serializers.ModelSerializer):
+    image_renditions = serializers.SerializerMethodField()
+
+    def get_image_renditions(self, obj):
+        return rendition_urls(obj.image, obj.image_renditions)
+
     class Meta:
         model = User
         exclude = ('password',)
         # extra_kwargs = {"password" : {"write_only":True}}
+
+# Default representation of UserViewSet.list
+class UserSummarySerializer(ExpandPostsMixin, serializers.ModelSerializer, PostCountMixin):
+    posts_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ('id', 'username', 'first_name', 'last_name', 'bio', 'image', 'posts_count',)
+
+    @classmethod
+    def setup_queryset(cls, queryset, request):
+        return queryset.annotate(posts_count=Count('post'))
+
+    def get_posts_count(self, obj):
+        if hasattr(obj, 'posts_count'):
+            return obj.posts_count
+        return super().get_posts_count(obj)
     
 class UserCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,208 @@
+import bisect
+import heapq
+import itertools
+import random
+from collections import defaultdict
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import User, Post, Comment, Follow, TimelineEntry
+from .search import get_search_backend
+from .timeline import get_fanout_threshold, get_max_length
+
+# ----------------------------------------------------------------
+# SYNTHETIC DATA
+# ----------------------------------------------------------------
+# Deterministic datasets for load tests and the endpoint benchmarks: the same
+# seed and sizes give the same users, follows, posts, reactions and comments.
+# Popularity is power-law, like a real network: a few accounts have most of
+# the followers, and a few posts most of the likes, dislikes and comments.
+#
+# Users, posts and comments are written with bulk_create, the much larger link
+# tables (follows, reactions, timelines) with plain multi-row INSERTs. What
+# signals would normally maintain is computed here instead: the denormalized
+# counters, the fanned-out timelines (trimmed to TIMELINE_MAX_LENGTH) and the
+# search index.
+# Every account's password is PASSWORD.
+
+PASSWORD = 'password'
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ten', 'jo', 'an', 'el', 'sa', 'vin', 'dor', 'li', 'ma', 'ro', 'nes',
+             'ber', 'ta', 'chi', 'on', 'is', 'gar', 'wen', 'fi', 'lu', 'po', 'der', 'sch', 'mid', 'kov', 'ez']
+WORDS = ['today', 'shipped', 'hiring', 'team', 'launch', 'lessons', 'learned', 'data', 'python', 'growth',
+         'career', 'product', 'design', 'remote', 'meetup', 'thanks', 'milestone', 'open', 'source', 'scale']
+
+
+def make_name(rnd, parts):
+    return ''.join(rnd.choice(SYLLABLES) for _ in range(parts))
+
+
+def make_text(rnd, words):
+    return ' '.join(rnd.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def power_law(rnd, alpha, limit):
+    # 0, 1, 2... with a long tail (Pareto), at most `limit`
+    return min(limit, int(rnd.paretovariate(alpha)) - 1)
+
+
+class Popularity:
+    # Picks indexes 0..n-1 with Zipf weights 1 / (rank + 1) ** exponent
+    def __init__(self, rnd, n, exponent=1.0):
+        self.rnd = rnd
+        self.weights = [1 / (rank + 1) ** exponent for rank in range(n)]
+        self.cumulative = list(itertools.accumulate(self.weights))
+
+    def pick(self):
+        return bisect.bisect(self.cumulative, self.rnd.random() * self.cumulative[-1])
+
+    def sample(self, k, exclude=None):
+        # k distinct indexes (fewer if there aren't enough), sorted
+        n = len(self.weights)
+        k = min(k, n - (exclude is not None))
+        if k > n // 10:
+            # drawing until k distinct would take forever to reach the tail:
+            # weighted sampling without replacement (key = u ** (1 / weight))
+            keys = ((self.rnd.random() ** (1 / weight), index) for index, weight in enumerate(self.weights))
+            return sorted(index for _, index in heapq.nlargest(k, (key for key in keys if key[1] != exclude)))
+        picked = set()
+        while len(picked) < k:
+            index = self.pick()
+            if index != exclude:
+                picked.add(index)
+        return sorted(picked)
+
+
+def generate(users=1000, posts_per_user=5, seed=42, batch_size=2000):
+    # -> {table: rows created}
+    rnd = random.Random(seed)
+    offset = User.objects.count()
+    password = make_password(PASSWORD)
+    popularity = Popularity(rnd, users)
+    created = {}
+
+    with transaction.atomic():
+        # ==================== USERS / FOLLOWS ====================
+        following = [popularity.sample(power_law(rnd, 1.2, 200), exclude=i) for i in range(users)]
+        followers = defaultdict(list)
+        for follower, followees in enumerate(following):
+            for followee in followees:
+                followers[followee].append(follower)
+        accounts = User.objects.bulk_create([
+            User(
+                username=f'{make_name(rnd, 2)}{offset + i}',
+                email=f'user{offset + i}@synthetic.local',
+                first_name=make_name(rnd, 2).title(),
+                last_name=make_name(rnd, 3).title(),
+                bio=make_text(rnd, 8),
+                password=password,
+                followers_count=len(followers[i]),
+            )
+            for i in range(users)
+        ], batch_size=batch_size)
+        user_ids = [account.pk for account in accounts]
+        created['users'] = users
+        now = Follow._meta.get_field('created_at').get_db_prep_save(timezone.now(), connection)
+        created['follows'] = insert_rows(Follow, ('follower_id', 'followee_id', 'created_at'), (
+            (user_ids[follower], user_ids[followee], now)
+            for follower, followees in enumerate(following) for followee in followees
+        ), batch_size)
+
+        # ==================== POSTS / REACTIONS ====================
+        authors = [popularity.pick() for _ in range(users * posts_per_user)]
+        reactions = []
+        for _ in authors:
+            likers, dislikers = reacting(rnd, popularity, users, 1.1, 1.6)
+            reactions.append((likers, dislikers, power_law(rnd, 1.4, 100)))
+        posts = Post.objects.bulk_create([
+            Post(
+                author_id=user_ids[author],
+                description=make_text(rnd, rnd.randint(5, 40)),
+                likes_count=len(likers),
+                dislikes_count=len(dislikers),
+                comments_count=comments,
+            )
+            for author, (likers, dislikers, comments) in zip(authors, reactions)
+        ], batch_size=batch_size)
+        created['posts'] = len(posts)
+        created['post reactions'] = bulk_reactions(Post, 'likes', 'dislikes', [
+            (post.pk, likers, dislikers) for post, (likers, dislikers, _) in zip(posts, reactions)
+        ], user_ids, batch_size)
+
+        # ==================== COMMENTS ====================
+        comment_rows = []
+        for post, (_, _, count) in zip(posts, reactions):
+            for _ in range(count):
+                comment_rows.append((post.pk, popularity.pick(), *reacting(rnd, popularity, users, 1.5, 2.0)))
+        comments = Comment.objects.bulk_create([
+            Comment(
+                post_id=post_id,
+                author_id=user_ids[author],
+                text=make_text(rnd, rnd.randint(3, 25)),
+                likes_count=len(likers),
+                dislikes_count=len(dislikers),
+            )
+            for post_id, author, likers, dislikers in comment_rows
+        ], batch_size=batch_size)
+        created['comments'] = len(comments)
+        created['comment reactions'] = bulk_reactions(Comment, 'comment_likes', 'comment_dislikes', [
+            (comment.pk, likers, dislikers) for comment, (_, _, likers, dislikers) in zip(comments, comment_rows)
+        ], user_ids, batch_size)
+
+        # ==================== TIMELINES ====================
+        # fan-out on write, newest first, up to TIMELINE_MAX_LENGTH per user
+        threshold, limit = get_fanout_threshold(), get_max_length()
+        timelines = defaultdict(list)
+        for post, author in zip(reversed(posts), reversed(authors)):
+            readers = [author] + (followers[author] if len(followers[author]) < threshold else [])
+            for reader in readers:
+                if len(timelines[reader]) < limit:
+                    timelines[reader].append(post)
+        created_at = {
+            post.pk: TimelineEntry._meta.get_field('created_at').get_db_prep_save(post.created_at, connection)
+            for post in posts
+        }
+        created['timeline entries'] = insert_rows(TimelineEntry, ('user_id', 'post_id', 'created_at'), (
+            (user_ids[reader], post.pk, created_at[post.pk]) for reader, entries in timelines.items() for post in entries
+        ), batch_size)
+
+        get_search_backend().rebuild()
+    return created
+
+
+def reacting(rnd, popularity, users, like_alpha, dislike_alpha):
+    # -> (likers, dislikers), disjoint
+    likers = popularity.sample(power_law(rnd, like_alpha, users))
+    liked = set(likers)
+    return likers, [i for i in popularity.sample(power_law(rnd, dislike_alpha, users)) if i not in liked]
+
+
+def bulk_reactions(model, like_relation, dislike_relation, rows, user_ids, batch_size):
+    # rows: (target pk, liker indexes, disliker indexes) -> through rows created
+    total = 0
+    for relation, position in ((like_relation, 1), (dislike_relation, 2)):
+        field = model._meta.get_field(relation)
+        through = field.remote_field.through
+        source, target = f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'
+        total += insert_rows(through, (source, target), (
+            (row[0], user_ids[index]) for row in rows for index in row[position]
+        ), batch_size)
+    return total
+
+
+def insert_rows(model, columns, rows, batch_size):
+    # -> rows inserted. bulk_create would build and compile a model instance
+    # per row, several times the cost of the INSERT itself.
+    quote = connection.ops.quote_name
+    sql = (
+        f'INSERT INTO {quote(model._meta.db_table)} ({", ".join(quote(column) for column in columns)}) '
+        f'VALUES ({", ".join(["%s"] * len(columns))})'
+    )
+    total = 0
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while batch := list(itertools.islice(rows, batch_size)):
+            cursor.executemany(sql, batch)
+            total += len(batch)
+    return total
@@ -1,3 +1,1313 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import threading
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .cache import check_response_cache, get_stats, reset_stats
+from .counters import rebuild_counters
+from .database import configure_sqlite, get_sqlite_pragmas
+from .dbrouters import ReplicaRouter
+from .serializers import PostSerializer
+from .models import User, Post, Comment, Follow, TimelineEntry
+from .synthetic import generate
+from . import benchmarks, countbuffer, dbrouters, live, metrics, timeline
+
+
+def make_user(username, **kwargs):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='password',
+        image=f'user/{username}.jpg',
+        **kwargs
+    )
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    IMAGE_PROCESSING_EAGER=True,
+)
+class BaseAPITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('reader')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def make_posts(self, count, comments=2):
+        fans = [make_user(f'fan{i}') for i in range(3)]
+        posts = []
+        for i in range(count):
+            post = Post.objects.create(description=f'post {i}', image='post/1/default.jpg', author=fans[i % 3])
+            post.likes.add(*fans[:2])
+            post.dislikes.add(fans[2])
+            for j in range(comments):
+                comment = Comment.objects.create(post=post, author=fans[j % 3], text=f'comment {j}')
+                comment.comment_likes.add(fans[0])
+                comment.comment_dislikes.add(fans[1])
+            posts.append(post)
+        return posts
+
+
+# ----------------------------------------------------------------
+# QUERY COUNTS
+# ----------------------------------------------------------------
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class PostQueryCountTests(BaseAPITestCase):
+    # count, posts + authors, likes, dislikes, comments + authors, comment likes, comment dislikes
+    FEED_QUERIES = 7
+
+    def test_feed_page_query_count_does_not_grow_with_page_size(self):
+        self.make_posts(10)
+        with self.assertNumQueries(self.FEED_QUERIES):
+            response = self.client.get('/posts/?page_size=2')
+        self.assertEqual(len(response.data['results']), 2)
+
+        with self.assertNumQueries(self.FEED_QUERIES):
+            response = self.client.get('/posts/?page_size=10')
+        self.assertEqual(len(response.data['results']), 10)
+
+        post = response.data['results'][0]
+        self.assertEqual(len(post['likes']), 2)
+        self.assertEqual(len(post['comments']), 2)
+        self.assertEqual(post['comments'][0]['comment_likes'], ['fan0'])
+
+    def test_retrieve_query_count(self):
+        post = self.make_posts(1, comments=5)[0]
+        with self.assertNumQueries(self.FEED_QUERIES - 1):
+            response = self.client.get(f'/posts/{post.id}/')
+        # the first COMMENT_PREVIEW_LIMIT comments; the rest are at /posts/{id}/comments/
+        self.assertEqual([comment['text'] for comment in response.data['comments']], ['comment 0', 'comment 1', 'comment 2'])
+        self.assertEqual(response.data['comments_count'], 5)
+
+    def test_delete_does_not_load_the_post_tree(self):
+        post = self.make_posts(1, comments=5)[0]
+        self.client.force_authenticate(user=post.author)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.delete(f'/posts/{post.id}/')
+        self.assertEqual(response.status_code, 200)
+        selects = [query['sql'] for query in context.captured_queries if query['sql'].startswith('SELECT')]
+        # a plain lookup: no author join, no likes/dislikes/comments prefetch
+        self.assertNotIn('JOIN', selects[0])
+        self.assertFalse([sql for sql in selects if '"userapp_post_likes"' in sql])
+
+    def test_comment_list_query_count(self):
+        self.make_posts(3, comments=3)
+        # comments + authors + posts, comment likes, comment dislikes
+        with self.assertNumQueries(3):
+            response = self.client.get('/comments/')
+        self.assertEqual(len(response.data), 9)
+
+
+# ----------------------------------------------------------------
+# COMMENT THREADS
+# ----------------------------------------------------------------
+
+@override_settings(RESPONSE_CACHE_ENABLED=False, COMMENT_PREVIEW_LIMIT=2)
+class CommentThreadTests(BaseAPITestCase):
+    def test_posts_embed_a_preview_of_each_thread(self):
+        self.make_posts(3, comments=4)
+        with self.assertNumQueries(7):
+            response = self.client.get('/posts/?page_size=3')
+        for post in response.data['results']:
+            self.assertEqual([comment['text'] for comment in post['comments']], ['comment 0', 'comment 1'])
+            self.assertEqual(post['comments_count'], 4)
+
+        # serialized without a planned queryset
+        post = Post.objects.get(description='post 0')
+        self.assertEqual(len(PostSerializer(post).data['comments']), 2)
+
+    def test_thread_is_keyset_paginated_oldest_first(self):
+        post = self.make_posts(1, comments=5)[0]
+        # comments + authors + post, comment likes, comment dislikes
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/posts/{post.id}/comments/?page_size=2')
+        texts = [comment['text'] for comment in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            texts += [comment['text'] for comment in response.data['results']]
+        self.assertEqual(texts, [f'comment {i}' for i in range(5)])
+
+        response = self.client.get(f'/posts/{post.id}/comments/?reactions=counts')
+        self.assertFalse(response.data['results'][0]['liked_by_me'])
+        self.assertEqual(self.client.get('/posts/999/comments/').status_code, 404)
+
+
+# ----------------------------------------------------------------
+# QUERY PLANS
+# ----------------------------------------------------------------
+# Runs EXPLAIN QUERY PLAN on every SELECT a hot endpoint issues and fails on
+# any table read without an index. Walking a table in primary key order is
+# fine when the query has a LIMIT (SQLite reports it as a bare "SCAN").
+
+def unindexed_reads(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        plan = [row[-1] for row in cursor.fetchall()]
+    bad = []
+    for line in plan:
+        words = line.split()
+        if words[0] != 'SCAN' or 'USING' in words:
+            continue
+        table = words[1]
+        # subqueries / window function co-routines read rows produced above
+        if table.startswith('(') or table == 'qualify':
+            continue
+        if ' LIMIT ' in sql and f'ORDER BY "{table}"."id"' in sql:
+            continue
+        bad.append(line)
+    return bad
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+@override_settings(RESPONSE_CACHE_ENABLED=False, TIMELINE_FANOUT_THRESHOLD=1)
+class QueryPlanTests(BaseAPITestCase):
+    def assertIndexed(self, queries):
+        for sql in queries:
+            if sql.startswith('SELECT'):
+                self.assertEqual(unindexed_reads(sql), [], sql)
+
+    def assertEndpointIndexed(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertIndexed(query['sql'] for query in context.captured_queries)
+        return response
+
+    def test_hot_endpoints_use_indexes(self):
+        posts = self.make_posts(4)
+        # followers_count >= TIMELINE_FANOUT_THRESHOLD: fan-out on read too
+        timeline.follow(self.user, posts[0].author)
+        post, comment = posts[0], posts[0].comments.first()
+
+        page = self.assertEndpointIndexed('/posts/?pagination=cursor&page_size=2')
+        for url in [
+            '/posts/',
+            '/posts/?reactions=counts',
+            page.data['next'],
+            f'/posts/{post.id}/',
+            f'/posts/{post.id}/comments/?page_size=1',
+            '/posts/feed/',
+            '/users/',
+            '/users/?pagination=cursor',
+            f'/users/{post.author_id}/?expand=posts',
+            f'/reactions/?posts={post.id}&comments={comment.id}',
+        ]:
+            with self.subTest(url=url):
+                self.assertEndpointIndexed(url)
+
+    def test_reverse_reaction_lookups_use_indexes(self):
+        # what a user liked/disliked (user cache invalidation, user deletes)
+        self.assertIndexed([str(queryset.query) for queryset in [
+            Post.objects.filter(likes=self.user).values('id'),
+            Post.objects.filter(dislikes=self.user).values('id'),
+            Comment.objects.filter(comment_likes=self.user).values('id'),
+            Comment.objects.filter(comment_dislikes=self.user).values('id'),
+        ]])
+
+
+# ----------------------------------------------------------------
+# DATABASE
+# ----------------------------------------------------------------
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite pragmas')
+class SQLiteTuningTests(TestCase):
+    def test_pragmas_are_applied_to_new_connections(self):
+        # (synchronous can't change inside the test transaction)
+        with override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234}):
+            configure_sqlite(sender=None, connection=connection)
+        self.assertEqual(get_sqlite_pragmas(connection, ('busy_timeout',)), {'busy_timeout': 1234})
+
+
+class ReplicaRoutingTests(BaseAPITestCase):
+    def tearDown(self):
+        dbrouters._down.clear()
+
+    @override_settings(REPLICA_DATABASES=['replica-missing'])
+    def test_unreachable_replica_falls_back_to_primary(self):
+        with self.assertLogs('userapp.dbrouters', 'WARNING'):
+            token = dbrouters.use_replica()
+        try:
+            with mock.patch.object(connection, 'in_atomic_block', False):
+                self.assertEqual(ReplicaRouter().db_for_read(Post), 'default')
+        finally:
+            dbrouters.end_replica(token)
+        self.assertIn('replica-missing', dbrouters._down)
+
+    def test_replica_reads_outside_transactions_only(self):
+        router = ReplicaRouter()
+        with mock.patch.object(dbrouters, 'choose_replica', return_value='replica1'):
+            token = dbrouters.use_replica()
+        try:
+            with mock.patch.object(connection, 'in_atomic_block', False):
+                self.assertEqual(router.db_for_read(Post), 'replica1')
+                with dbrouters.primary():
+                    self.assertEqual(router.db_for_read(Post), 'default')
+            # the test case's own transaction
+            self.assertEqual(router.db_for_read(Post), 'default')
+            self.assertEqual(router.db_for_write(Post), 'default')
+        finally:
+            dbrouters.end_replica(token)
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_writes_pin_the_user_to_the_primary(self):
+        post = self.make_posts(1, comments=0)[0]
+        with mock.patch.object(dbrouters, 'use_replica', wraps=dbrouters.use_replica) as use_replica:
+            self.client.get('/posts/')
+            self.assertEqual(use_replica.call_count, 1)
+            self.assertFalse(dbrouters.is_pinned(self.user))
+
+            response = self.client.put(f'/posts/{post.id}/reaction/', {'reaction': 'like'}, format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(dbrouters.is_pinned(self.user))
+            self.client.get('/posts/')
+            self.assertEqual(use_replica.call_count, 1)
+
+
+# ----------------------------------------------------------------
+# REACTION COUNTERS
+# ----------------------------------------------------------------
+
+class ReactionCounterTests(BaseAPITestCase):
+    def test_like_dislike_views_keep_counters_in_sync(self):
+        post = Post.objects.create(description='post', image='post/1/default.jpg', author=self.user)
+
+        self.client.post(f'/posts/{post.id}/like/')
+        self.client.post(f'/posts/{post.id}/like/')
+        post.refresh_from_db()
+        self.assertEqual((post.likes_count, post.dislikes_count), (1, 0))
+
+        self.client.post(f'/posts/{post.id}/dislike/')
+        post.refresh_from_db()
+        self.assertEqual((post.likes_count, post.dislikes_count), (0, 1))
+
+        self.assertEqual(self.client.delete(f'/posts/{post.id}/remove-dislike/').status_code, 200)
+        self.assertEqual(self.client.delete(f'/posts/{post.id}/remove-dislike/').status_code, 400)
+        post.refresh_from_db()
+        self.assertEqual((post.likes_count, post.dislikes_count), (0, 0))
+
+    def test_comment_counters(self):
+        post = Post.objects.create(description='post', image='post/1/default.jpg', author=self.user)
+        comment = Comment.objects.create(post=post, author=self.user, text='hi')
+        Comment.objects.create(post=post, author=self.user, text='hello')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+
+        self.client.post(f'/comments/{comment.id}/dislike/')
+        self.client.post(f'/comments/{comment.id}/like/')
+        comment.refresh_from_db()
+        self.assertEqual((comment.likes_count, comment.dislikes_count), (1, 0))
+
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_unlike_with_a_drifted_counter(self):
+        post = Post.objects.create(description='post', image='post/1/default.jpg', author=self.user)
+        # through-table write that bypassed the counters: likes_count is still 0
+        post.likes.add(self.user)
+        response = self.client.put(f'/posts/{post.id}/reaction/', {'reaction': 'dislike'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['likes_count'], response.data['dislikes_count']), (0, 1))
+        self.assertFalse(post.likes.filter(pk=self.user.pk).exists())
+
+    def test_reactions_cannot_be_written_on_create(self):
+        fan = make_user('fan')
+        response = self.client.post('/posts/', {
+            'description': 'post', 'author': self.user.id, 'likes': [fan.id, self.user.id], 'dislikes': [fan.id],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get(pk=response.data['id'])
+        self.assertEqual((post.likes.count(), post.dislikes.count()), (0, 0))
+
+        response = self.client.post('/comments/', {
+            'post': post.id, 'author': self.user.id, 'text': 'hi', 'comment_likes': [fan.id],
+        }, format='json')
+        self.assertEqual(Comment.objects.get(pk=response.data['id']).comment_likes.count(), 0)
+
+    def test_rebuild_counters_command(self):
+        posts = self.make_posts(2)
+        call_command('rebuild_counters', stdout=StringIO())
+        post = Post.objects.get(pk=posts[0].pk)
+        self.assertEqual((post.likes_count, post.dislikes_count, post.comments_count), (2, 1, 2))
+        comment = post.comments.first()
+        self.assertEqual((comment.likes_count, comment.dislikes_count), (1, 1))
+
+    def test_counts_mode_returns_counts_and_liked_by_me(self):
+        post = self.make_posts(1)[0]
+        post.likes.add(self.user)
+        call_command('rebuild_counters', stdout=StringIO())
+
+        response = self.client.get(f'/posts/{post.id}/?reactions=counts')
+        self.assertNotIn('likes', response.data)
+        self.assertEqual(response.data['likes_count'], 3)
+        self.assertTrue(response.data['liked_by_me'])
+        self.assertFalse(response.data['disliked_by_me'])
+        self.assertFalse(response.data['comments'][0]['liked_by_me'])
+        self.assertNotIn('comment_likes', response.data['comments'][0])
+
+
+# ----------------------------------------------------------------
+# REACTION ENDPOINT
+# ----------------------------------------------------------------
+
+class ReactionEndpointTests(BaseAPITestCase):
+    def test_put_post_reaction_is_idempotent_and_returns_counts(self):
+        post = self.make_posts(1)[0]
+        call_command('rebuild_counters', stdout=StringIO())
+
+        response = self.client.put(f'/posts/{post.id}/reaction/', {'reaction': 'like'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'id': post.id, 'reaction': 'like', 'likes_count': 3, 'dislikes_count': 1})
+
+        # same state again: only the lock and the state read, no writes
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(f'/posts/{post.id}/reaction/', {'reaction': 'like'}, format='json')
+        statements = [q['sql'] for q in queries if q['sql'].startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(len(statements), 2)
+        self.assertTrue(all(sql.startswith('SELECT') for sql in statements))
+        self.assertEqual(response.data['likes_count'], 3)
+
+        response = self.client.put(f'/posts/{post.id}/reaction/', {'reaction': 'dislike'}, format='json')
+        self.assertEqual((response.data['likes_count'], response.data['dislikes_count']), (2, 2))
+        self.assertFalse(post.likes.filter(pk=self.user.pk).exists())
+        self.assertTrue(post.dislikes.filter(pk=self.user.pk).exists())
+
+        response = self.client.put(f'/posts/{post.id}/reaction/', {'reaction': 'none'}, format='json')
+        self.assertEqual((response.data['reaction'], response.data['likes_count'], response.data['dislikes_count']), ('none', 2, 1))
+
+    def test_put_comment_reaction(self):
+        comment = self.make_posts(1, comments=1)[0].comments.get()
+        call_command('rebuild_counters', stdout=StringIO())
+
+        response = self.client.put(f'/comments/{comment.id}/reaction/', {'reaction': 'dislike'}, format='json')
+        self.assertEqual((response.data['likes_count'], response.data['dislikes_count']), (1, 2))
+        self.assertTrue(comment.comment_dislikes.filter(pk=self.user.pk).exists())
+
+    def test_invalid_reaction_and_missing_target(self):
+        post = Post.objects.create(description='post', image='post/1/default.jpg', author=self.user)
+        self.assertEqual(self.client.put(f'/posts/{post.id}/reaction/', {'reaction': 'love'}, format='json').status_code, 400)
+        self.assertEqual(self.client.put('/posts/999/reaction/', {'reaction': 'like'}, format='json').status_code, 404)
+        self.assertEqual(self.client.post('/posts/999/like/').status_code, 404)
+
+
+class ReactionStateTests(BaseAPITestCase):
+    def test_batch_state_uses_one_query_per_type(self):
+        posts = self.make_posts(3)
+        call_command('rebuild_counters', stdout=StringIO())
+        posts[0].likes.add(self.user)
+        posts[1].dislikes.add(self.user)
+        comment = posts[0].comments.first()
+        comment.comment_likes.add(self.user)
+
+        ids = ','.join(str(post.id) for post in posts)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/reactions/?posts={ids},999&comments={comment.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {pk: state['reaction'] for pk, state in response.data['posts'].items()},
+            {str(posts[0].id): 'like', str(posts[1].id): 'dislike', str(posts[2].id): 'none'},
+        )
+        self.assertEqual(response.data['posts'][str(posts[2].id)]['likes_count'], 2)
+        self.assertEqual(response.data['comments'][str(comment.id)]['reaction'], 'like')
+
+    def test_invalid_ids(self):
+        self.assertEqual(self.client.get('/reactions/?posts=1,x').status_code, 400)
+        ids = ','.join(map(str, range(1, 102)))
+        self.assertEqual(self.client.get(f'/reactions/?comments={ids}').status_code, 400)
+        self.assertEqual(self.client.get('/reactions/').data, {'posts': {}, 'comments': {}})
+
+
+# ----------------------------------------------------------------
+# HOME TIMELINE
+# ----------------------------------------------------------------
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class TimelineTests(BaseAPITestCase):
+    def make_post(self, author, i=0):
+        return Post.objects.create(description=f'post {i}', image='post/1/default.jpg', author=author)
+
+    def feed_ids(self, url='/posts/feed/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [post['id'] for post in response.data['results']], response.data['next']
+
+    def test_follow_fans_out_and_unfollow_removes(self):
+        alice, bob = make_user('alice'), make_user('bob')
+        old = self.make_post(alice)
+        self.assertEqual(self.client.post(f'/users/{alice.id}/follow/').status_code, 200)
+        self.assertEqual(self.client.post(f'/users/{alice.id}/follow/').status_code, 400)
+        self.assertEqual(self.client.post(f'/users/{self.user.id}/follow/').status_code, 400)
+        alice.refresh_from_db()
+        self.assertEqual(alice.followers_count, 1)
+
+        new = self.make_post(alice, 1)
+        self.make_post(bob)
+        mine = self.make_post(self.user)
+        # backfilled + fanned out + own, not bob's
+        self.assertEqual(self.feed_ids()[0], [mine.id, new.id, old.id])
+
+        self.assertEqual(self.client.delete(f'/users/{alice.id}/follow/').status_code, 200)
+        self.assertEqual(self.client.delete(f'/users/{alice.id}/follow/').status_code, 400)
+        self.assertEqual(self.feed_ids()[0], [mine.id])
+        alice.refresh_from_db()
+        self.assertEqual(alice.followers_count, 0)
+
+    def test_feed_pages_with_one_timeline_query(self):
+        alice = make_user('alice')
+        self.client.post(f'/users/{alice.id}/follow/')
+        posts = [self.make_post(alice, i) for i in range(7)]
+
+        # pulled-authors lookup, timeline page, posts + authors, likes, dislikes, comments
+        with self.assertNumQueries(6):
+            ids, next_url = self.feed_ids('/posts/feed/?page_size=4')
+        self.assertEqual(ids, [post.id for post in posts[:2:-1]])
+        ids, next_url = self.feed_ids(next_url)
+        self.assertEqual(ids, [post.id for post in posts[2::-1]])
+        self.assertIsNone(next_url)
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=2)
+    def test_popular_authors_are_merged_at_read_time(self):
+        star, fan, other = make_user('star'), make_user('fan'), make_user('other')
+        self.client.post(f'/users/{star.id}/follow/')
+        self.client.post(f'/users/{other.id}/follow/')
+        client = APIClient()
+        client.force_authenticate(fan)
+        client.post(f'/users/{star.id}/follow/')
+
+        pushed = self.make_post(other)
+        pulled = self.make_post(star, 1)
+        self.assertFalse(TimelineEntry.objects.filter(post=pulled).exclude(user=star).exists())
+        self.assertEqual(self.feed_ids()[0], [pulled.id, pushed.id])
+        ids, next_url = self.feed_ids('/posts/feed/?page_size=1')
+        self.assertEqual(ids, [pulled.id])
+        self.assertEqual(self.feed_ids(next_url)[0], [pushed.id])
+
+    @override_settings(TIMELINE_MAX_LENGTH=3)
+    def test_timelines_are_trimmed(self):
+        posts = [self.make_post(self.user, i) for i in range(5)]
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.user).order_by('-created_at', '-post').values_list('post_id', flat=True)),
+            [post.id for post in posts[:1:-1]],
+        )
+
+
+# ----------------------------------------------------------------
+# IMAGE RENDITIONS
+# ----------------------------------------------------------------
+
+@override_settings(IMAGE_RENDITION_WIDTHS=(160, 320, 640))
+class ImageRenditionTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
+
+    def upload(self, name, size=(800, 600)):
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 40, 40)).save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_post_upload_gets_renditions_and_placeholder(self):
+        post = Post.objects.create(description='photo', image=self.upload('photo.jpg'), author=self.user)
+        post.refresh_from_db()
+        self.assertEqual(post.image_renditions['source'], post.image.name)
+        self.assertEqual(sorted(post.image_renditions, key=str), ['160', '320', '640', 'source'])
+        self.assertTrue(post.image_renditions['320']['webp'].endswith('renditions/photo_320.webp'))
+        self.assertTrue(post.image_placeholder.startswith('data:image/jpeg;base64,'))
+        with post.image.storage.open(post.image_renditions['320']['jpeg']) as rendition:
+            self.assertEqual(Image.open(rendition).size, (320, 240))
+
+        response = self.client.get(f'/posts/{post.id}/?image_size=300')
+        self.assertTrue(response.data['image'].endswith('photo_320.webp'))
+        self.assertTrue(response.data['image_renditions']['640']['jpeg'].endswith('photo_640.jpg'))
+        response = self.client.get(f'/posts/{post.id}/?image_size=2000&image_format=jpeg')
+        self.assertTrue(response.data['image'].endswith('photo_640.jpg'))
+        # no size: the original, as before
+        self.assertTrue(self.client.get(f'/posts/{post.id}/').data['image'].endswith('photo.jpg'))
+
+    def test_process_images_command(self):
+        post = Post.objects.create(description='photo', image=self.upload('photo.jpg'), author=self.user)
+        Post.objects.filter(pk=post.pk).update(image_renditions={})
+        call_command('process_images', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertIn('640', post.image_renditions)
+
+    def test_small_originals_are_not_upscaled(self):
+        post = Post.objects.create(description='icon', image=self.upload('icon.jpg', (200, 100)), author=self.user)
+        post.refresh_from_db()
+        self.assertEqual(sorted(post.image_renditions, key=str), ['160', '200', 'source'])
+
+    def test_author_image_rendition_and_cache_invalidation(self):
+        post = Post.objects.create(description='text', image='post/1/default.jpg', author=self.user)
+        url = f'/posts/{post.id}/?image_size=160'
+        self.assertEqual(self.client.get(url).data['image_renditions'], {})
+
+        # the upload and the rendition job both invalidate the author's posts
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.image = self.upload('me.jpg')
+            self.user.save()
+        self.assertTrue(self.client.get(url).data['author_image'].endswith('me_160.webp'))
+
+
+# ----------------------------------------------------------------
+# LOGIN
+# ----------------------------------------------------------------
+
+class LoginTests(BaseAPITestCase):
+    SCRYPT = 'userapp.hashers.TunedScryptPasswordHasher'
+    MD5 = 'django.contrib.auth.hashers.MD5PasswordHasher'
+
+    def login(self, password='password'):
+        return APIClient().post('/login/', {'username': 'reader', 'password': password}, format='json')
+
+    def test_login_hashes_the_password_once(self):
+        from django.contrib.auth.hashers import MD5PasswordHasher
+        with mock.patch.object(MD5PasswordHasher, 'verify', autospec=True, side_effect=MD5PasswordHasher.verify) as verify:
+            response = self.login()
+        self.assertEqual(verify.call_count, 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['username'], 'reader')
+        self.assertEqual(
+            APIClient(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}").get('/user-logged/').data['username'], 'reader',
+        )
+        self.assertEqual(self.login('wrong').status_code, 400)
+
+    @override_settings(PASSWORD_SCRYPT={'work_factor': 2**10, 'block_size': 8, 'parallelism': 1})
+    def test_legacy_hashes_are_upgraded_to_the_tuned_hasher(self):
+        with override_settings(PASSWORD_HASHERS=[self.SCRYPT, self.MD5]):
+            self.assertEqual(self.login().status_code, 200)
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password.startswith('scrypt$1024$'))
+
+            with override_settings(PASSWORD_SCRYPT={'work_factor': 2**11, 'block_size': 8, 'parallelism': 1}):
+                self.assertEqual(self.login().status_code, 200)
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.password.startswith('scrypt$2048$'))
+            self.assertEqual(self.user.password.split('$')[3:5], ['8', '1'])
+
+
+# ----------------------------------------------------------------
+# KEYSET PAGINATION
+# ----------------------------------------------------------------
+
+class KeysetPaginationTests(BaseAPITestCase):
+    def test_cursor_pages_walk_the_feed_without_count_query(self):
+        posts = self.make_posts(7, comments=0)
+        response = self.client.get('/posts/?pagination=cursor&page_size=3')
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+        self.assertEqual([p['id'] for p in response.data['results']], [p.id for p in posts[:-4:-1]])
+
+        # a new post must not shift the following pages
+        Post.objects.create(description='new', image='post/1/default.jpg', author=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(response.data['next'])
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual([p['id'] for p in response.data['results']], [p.id for p in posts[3:0:-1]])
+
+        last = self.client.get(response.data['next'])
+        self.assertEqual([p['id'] for p in last.data['results']], [posts[0].id])
+        self.assertIsNone(last.data['next'])
+
+        previous = self.client.get(last.data['previous'])
+        self.assertEqual(previous.data['results'], response.data['results'])
+
+    def test_page_number_contract_is_kept(self):
+        self.make_posts(6, comments=0)
+        response = self.client.get('/posts/?page=2')
+        self.assertEqual(response.data['count'], 6)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/posts/?cursor=not-a-cursor').status_code, 404)
+
+    def test_search_cursor(self):
+        for name in ('anna', 'annabel', 'annie'):
+            make_user(name)
+        response = self.client.get('/users-search/?search=ann&pagination=cursor&page_size=2')
+        self.assertEqual([u['username'] for u in response.data['results']], ['anna', 'annabel'])
+        # a new match doesn't shift the pages already handed out
+        make_user('ann')
+        response = self.client.get(response.data['next'])
+        self.assertEqual([u['username'] for u in response.data['results']], ['annie'])
+
+    def test_search_reports_truncation(self):
+        for name in ('anna', 'annabel', 'annie'):
+            make_user(name)
+        with override_settings(USER_SEARCH_MAX_RESULTS=2):
+            response = self.client.get('/users-search/?search=ann&pagination=cursor&page_size=5')
+            self.assertEqual((len(response.data['results']), response.data['truncated']), (2, True))
+        with override_settings(USER_SEARCH_MAX_RESULTS=3):
+            response = self.client.get('/users-search/?search=ann&pagination=cursor')
+            self.assertFalse(response.data['truncated'])
+
+    @override_settings(USER_SEARCH_MAX_RESULTS=2)
+    def test_search_pages_past_the_cap(self):
+        for name in ('ann', 'anna', 'annabel', 'annie', 'annika'):
+            make_user(name)
+        response = self.client.get('/users-search/?search=ann&page=2&page_size=2')
+        self.assertEqual((response.data['count'], response.data['truncated']), (5, False))
+        names = [u['username'] for u in response.data['results']]
+        names += [u['username'] for u in self.client.get('/users-search/?search=ann&page=3&page_size=2').data['results']]
+        first = [u['username'] for u in self.client.get('/users-search/?search=ann&page_size=2').data['results']]
+        self.assertEqual(first[0], 'ann')
+        self.assertEqual(sorted(first + names), ['ann', 'anna', 'annabel', 'annie', 'annika'])
+
+
+# ----------------------------------------------------------------
+# USER SEARCH
+# ----------------------------------------------------------------
+
+class SearchIndexTests(BaseAPITestCase):
+    def search(self, term):
+        response = self.client.get('/users-search/', {'search': term})
+        return [user['username'] for user in response.data['results']]
+
+    def check_backend(self):
+        make_user('jsmith', first_name='John', last_name='Smith')
+        make_user('smithers', first_name='Waylon', last_name='Smithers')
+        make_user('mary', first_name='Mary', last_name='Jones')
+
+        # prefix of a username beats prefix of a last name
+        self.assertEqual(self.search('smi'), ['smithers', 'jsmith'])
+        self.assertEqual(self.search('john smi'), ['jsmith'])
+        self.assertEqual(self.search('ithers'), [])
+        self.assertEqual(self.search(''), [])
+
+        # the index follows saves and deletes; exact matches rank first
+        mary = User.objects.get(username='mary')
+        mary.username = 'smi'
+        mary.save()
+        self.assertEqual(self.search('smi')[0], 'smi')
+        mary.delete()
+        self.assertEqual(self.search('smi'), ['smithers', 'jsmith'])
+
+    @override_settings(USER_SEARCH_BACKEND='userapp.search.TokenSearchBackend')
+    def test_token_backend(self):
+        self.check_backend()
+
+    @override_settings(USER_SEARCH_BACKEND='userapp.search.SQLiteFTSBackend')
+    def test_sqlite_fts_backend(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        self.check_backend()
+
+
+# ----------------------------------------------------------------
+# RESPONSE CACHE
+# ----------------------------------------------------------------
+
+class ResponseCacheTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        reset_stats()
+
+    def test_post_retrieve_is_cached_and_invalidated_by_signals(self):
+        post = self.make_posts(1)[0]
+        first = self.client.get(f'/posts/{post.id}/')
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/posts/{post.id}/')
+        self.assertEqual(response.data, first.data)
+        self.assertEqual(get_stats()['post'], {'hits': 1, 'misses': 1, 'invalidations': 0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/posts/{post.id}/like/')
+        self.assertIn('reader', self.client.get(f'/posts/{post.id}/').data['likes'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=post, author=self.user, text='new')
+        self.assertEqual(len(self.client.get(f'/posts/{post.id}/').data['comments']), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.username = 'renamed'
+            self.user.save()
+        self.assertIn('renamed', self.client.get(f'/posts/{post.id}/').data['likes'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertEqual(self.client.get(f'/posts/{post.id}/').status_code, 404)
+
+    def test_post_list_only_renders_misses(self):
+        posts = self.make_posts(4)
+        self.client.get('/posts/?page_size=2')
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[-1].likes.add(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/posts/?page_size=2')
+        self.assertIn('reader', response.data['results'][0]['likes'])
+        # the second post came from the cache: only "id IN (<first post>)" was rendered
+        self.assertTrue(any(f'IN ({posts[-1].id})' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(get_stats()['post']['hits'], 1)
+
+    def test_counts_mode_is_not_cached(self):
+        post = self.make_posts(1)[0]
+        self.client.get(f'/posts/{post.id}/?reactions=counts')
+        self.assertNotIn('post', get_stats())
+
+    def test_user_cache_and_stats_endpoint(self):
+        self.client.get(f'/users/{self.user.id}/')
+        with self.assertNumQueries(0):
+            self.client.get(f'/users/{self.user.id}/')
+        self.assertEqual(self.client.get('/cache-stats/').status_code, 403)
+
+        self.user.is_staff = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertTrue(self.client.get(f'/users/{self.user.id}/').data['is_staff'])
+        self.assertEqual(self.client.get('/cache-stats/').data['user']['invalidations'], 1)
+
+    def test_user_save_only_invalidates_posts_that_show_the_change(self):
+        post = self.make_posts(1)[0]
+        post.likes.add(self.user)
+        reset_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('changed')
+            self.user.save()
+            update_last_login(None, self.user)
+        self.assertNotIn('post', get_stats())
+        self.assertEqual(get_stats()['user']['invalidations'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.username = 'renamed'
+            self.user.save()
+        self.assertEqual(get_stats()['post']['invalidations'], 1)
+
+    @override_settings(RESPONSE_CACHE_ALLOW_LOCAL=False)
+    def test_locmem_cache_is_refused_outside_debug(self):
+        post = self.make_posts(1)[0]
+        self.client.get(f'/posts/{post.id}/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'/posts/{post.id}/')
+        self.assertTrue(queries.captured_queries)
+        self.assertEqual([warning.id for warning in check_response_cache(None)], ['userapp.W001'])
+        with override_settings(RESPONSE_CACHE_ALLOW_LOCAL=True):
+            self.assertEqual(check_response_cache(None), [])
+
+
+# ----------------------------------------------------------------
+# USER LIST
+# ----------------------------------------------------------------
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class UserListTests(BaseAPITestCase):
+    def test_list_is_paginated_summary_without_posts(self):
+        self.make_posts(3)
+        response = self.client.get('/users/')
+        self.assertEqual(response.data['count'], 4)
+        user = response.data['results'][1]
+        self.assertEqual(user['username'], 'fan0')
+        self.assertEqual(user['posts_count'], 1)
+        self.assertNotIn('posts', user)
+        self.assertNotIn('email', user)
+        self.assertNotIn('posts', self.client.get(f'/users/{self.user.id}/').data)
+
+    def test_expanded_posts_are_limited_and_batched(self):
+        self.make_posts(9)
+        # count, page of ids, users + posts_count, windowed posts, likes, dislikes,
+        # comments, comment likes, comment dislikes
+        with self.assertNumQueries(9):
+            response = self.client.get('/users/?expand=posts&posts_limit=2&page_size=10')
+        fan0 = response.data['results'][1]
+        self.assertEqual(fan0['posts_count'], 3)
+        self.assertEqual([post['description'] for post in fan0['posts']], ['post 6', 'post 3'])
+        self.assertEqual(len(fan0['posts'][0]['comments']), 2)
+
+        response = self.client.get(f'/users/{fan0["id"]}/?expand=posts&posts_limit=1')
+        self.assertEqual(len(response.data['posts']), 1)
+
+
+# ----------------------------------------------------------------
+# EXPORT
+# ----------------------------------------------------------------
+
+@override_settings(EXPORT_SAFETY_LAG=0)
+class ExportTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.user.refresh_from_db()
+        self.client.force_authenticate(user=self.user)
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_export_streams_every_row(self):
+        self.make_posts(3)
+        response = self.client.get('/export/posts/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['description'] for row in rows], ['post 0', 'post 1', 'post 2'])
+        self.assertEqual(rows[0]['comments_count'], 2)
+
+        lines = self.read(self.client.get('/export/comments/?export_format=csv')).splitlines()
+        self.assertEqual(lines[0], 'id,post_id,author_id,text,likes_count,dislikes_count,updated_at')
+        self.assertEqual(len(lines), 7)
+
+    def test_incremental_export_from_watermark(self):
+        posts = self.make_posts(2, comments=0)
+        response = self.client.get('/export/posts/')
+        self.read(response)
+        until = response['X-Export-Until']
+
+        posts[0].description = 'edited'
+        posts[0].save()
+        response = self.client.get('/export/posts/', {'since': until})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['description'] for row in rows], ['edited'])
+
+    def test_watermark_leaves_recent_rows_to_the_next_export(self):
+        # a row stamped just before the export may belong to a transaction
+        # that hasn't committed yet
+        posts = self.make_posts(2, comments=0)
+        Post.objects.filter(pk=posts[0].pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        with override_settings(EXPORT_SAFETY_LAG=60):
+            response = self.client.get('/export/posts/')
+            rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [posts[0].pk])
+
+        response = self.client.get('/export/posts/', {'since': response['X-Export-Until']})
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [posts[1].pk])
+
+    def test_export_is_admin_only_and_validated(self):
+        self.assertEqual(self.client.get('/export/posts/?since=yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/export/posts/?export_format=xml').status_code, 400)
+        self.assertEqual(self.client.get('/export/passwords/').status_code, 404)
+        self.client.force_authenticate(user=make_user('visitor'))
+        self.assertEqual(self.client.get('/export/users/').status_code, 403)
+
+    def test_export_command(self):
+        self.make_posts(1, comments=0)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('export_data', 'users', stdout=stdout, stderr=stderr)
+        self.assertEqual(len(stdout.getvalue().splitlines()), 4)
+        self.assertNotIn('password', stdout.getvalue())
+        self.assertTrue(stderr.getvalue().startswith('until '))
+
+
+# ----------------------------------------------------------------
+# ASYNC VIEWS
+# ----------------------------------------------------------------
+
+class AsyncViewTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def test_async_pages_match_the_sync_views(self):
+        posts = self.make_posts(3)
+        for sync_url, async_url in [
+            ('/posts/?pagination=cursor&page_size=2', '/async/posts/?page_size=2'),
+            ('/posts/?pagination=cursor&reactions=counts', '/async/posts/?reactions=counts'),
+            ('/posts/feed/', '/async/posts/feed/'),
+        ]:
+            expected = self.client.get(sync_url).data['results']
+            response = self.client.get(async_url, **self.auth)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(json.dumps(expected)), response.json()['results'])
+
+        response = self.client.get(f'/async/posts/{posts[0].id}/', **self.auth)
+        self.assertEqual(response.json(), json.loads(json.dumps(self.client.get(f'/posts/{posts[0].id}/').data)))
+        self.assertEqual(self.client.get('/async/posts/0/', **self.auth).status_code, 404)
+
+    def test_async_cache_lookups_leave_the_event_loop(self):
+        post = self.make_posts(1)[0]
+        in_loop = []
+
+        def outside_the_loop(method):
+            def wrapped(*args, **kwargs):
+                try:
+                    asyncio.get_running_loop()
+                    in_loop.append(method.__name__)
+                except RuntimeError:
+                    pass
+                return method(*args, **kwargs)
+            return wrapped
+
+        with mock.patch.object(LocMemCache, 'get', outside_the_loop(LocMemCache.get)), \
+                mock.patch.object(LocMemCache, 'get_many', outside_the_loop(LocMemCache.get_many)), \
+                mock.patch.object(LocMemCache, 'set_many', outside_the_loop(LocMemCache.set_many)):
+            for _ in range(2):
+                response = self.client.get(f'/async/posts/{post.id}/', **self.auth)
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_stats()['post'], {'hits': 1, 'misses': 1, 'invalidations': 0})
+        self.assertEqual(in_loop, [])
+
+    def test_async_next_page(self):
+        self.make_posts(3, comments=0)
+        response = self.client.get('/async/posts/?page_size=2', **self.auth).json()
+        response = self.client.get(response['next'], **self.auth).json()
+        self.assertEqual([post['description'] for post in response['results']], ['post 0'])
+        self.assertEqual(self.client.get('/async/posts/?cursor=nope', **self.auth).status_code, 404)
+
+    def test_async_reactions(self):
+        post = self.make_posts(1)[0]
+        response = self.client.put(f'/async/posts/{post.id}/reaction/', {'reaction': 'like'},
+                                   format='json', **self.auth)
+        self.assertEqual(response.json(), {'id': post.id, 'reaction': 'like', 'likes_count': 1, 'dislikes_count': 0})
+        response = self.client.put(f'/async/posts/{post.id}/reaction/', {'reaction': 'love'},
+                                   format='json', **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+        comment = Comment.objects.filter(post=post).first()
+        self.assertEqual(self.client.post(f'/async/comments/{comment.id}/like/', **self.auth).status_code, 200)
+        self.assertTrue(comment.comment_likes.filter(pk=self.user.pk).exists())
+        self.assertEqual(self.client.post('/async/posts/0/like/', **self.auth).status_code, 404)
+
+    def test_async_search(self):
+        for name in ('anna', 'annabel', 'annie'):
+            make_user(name)
+        response = self.client.get('/async/users-search/?search=ann&page_size=2', **self.auth).json()
+        self.assertEqual([u['username'] for u in response['results']], ['anna', 'annabel'])
+
+    def test_async_views_require_a_valid_token(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/async/posts/').status_code, 401)
+        response = self.client.get('/async/posts/', HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+        self.assertEqual(self.client.post('/async/posts/', **self.auth).status_code, 405)
+
+
+# ----------------------------------------------------------------
+# REQUEST METRICS
+# ----------------------------------------------------------------
+
+class MetricsTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset_metrics()
+
+    def observed(self, histogram, view, method='GET'):
+        # -> (count, sum)
+        counts, total = histogram.series[(('view', view), ('method', method))]
+        return sum(counts), total
+
+    def test_records_queries_serializer_time_and_size_per_view(self):
+        self.make_posts(2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/posts/')
+        self.assertEqual(self.observed(metrics.DB_QUERIES, 'posts-list'), (1, len(queries)))
+        self.assertEqual(self.observed(metrics.RESPONSE_SIZE, 'posts-list'), (1, len(response.content)))
+        self.assertGreater(self.observed(metrics.SERIALIZER_TIME, 'posts-list')[1], 0)
+        self.assertGreater(self.observed(metrics.DURATION, 'posts-list')[1], 0)
+
+        self.client.get('/no-such-page/')
+        self.assertEqual(self.observed(metrics.DURATION, 'unmatched')[0], 1)
+
+    def test_counts_queries_of_async_views(self):
+        token = AccessToken.for_user(self.user)
+        self.make_posts(1)
+        self.client.get('/async/posts/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertGreater(self.observed(metrics.DB_QUERIES, 'async-post-list')[1], 0)
+
+    def test_server_timing_header(self):
+        with override_settings(METRICS_SERVER_TIMING=True):
+            header = self.client.get('/posts/')['Server-Timing']
+        self.assertRegex(header, r'^db;dur=[\d.]+;desc="\d+ queries", serializer;dur=[\d.]+, total;dur=[\d.]+$')
+        with override_settings(METRICS_SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get('/posts/'))
+
+    def test_metrics_endpoint_is_admin_only(self):
+        self.client.get('/posts/')
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        self.client.force_authenticate(user=make_user('admin', is_staff=True))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('# TYPE userapp_request_duration_seconds histogram', text)
+        self.assertIn('userapp_request_db_queries_count{view="posts-list",method="GET"} 1', text)
+        self.assertIn('userapp_request_duration_seconds_bucket{view="posts-list",method="GET",le="+Inf"} 1', text)
+
+
+# ----------------------------------------------------------------
+# BENCHMARKS
+# ----------------------------------------------------------------
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SyntheticDataTests(TestCase):
+    def test_generated_counters_and_timelines_are_consistent(self):
+        created = generate(users=40, posts_per_user=2, seed=7)
+        self.assertEqual(created['users'], User.objects.count())
+        self.assertEqual(created['posts'], 80)
+        self.assertEqual(created['follows'], Follow.objects.count())
+        self.assertGreater(created['follows'], 0)
+        self.assertEqual(created['timeline entries'], TimelineEntry.objects.count())
+
+        counters = ['likes_count', 'dislikes_count', 'comments_count']
+        posts = list(Post.objects.order_by('id').values_list(*counters))
+        comments = list(Comment.objects.order_by('id').values_list('likes_count', 'dislikes_count'))
+        followers = list(User.objects.order_by('id').values_list('followers_count', flat=True))
+        rebuild_counters(Post, Comment)
+        self.assertEqual(list(Post.objects.order_by('id').values_list(*counters)), posts)
+        self.assertEqual(list(Comment.objects.order_by('id').values_list('likes_count', 'dislikes_count')), comments)
+        self.assertEqual(followers, [
+            Follow.objects.filter(followee=user).count() for user in User.objects.order_by('id')
+        ])
+
+        # every author sees their own posts
+        post = Post.objects.order_by('id').first()
+        self.assertTrue(TimelineEntry.objects.filter(user=post.author, post=post).exists())
+
+    def test_same_seed_same_dataset(self):
+        generate(users=10, posts_per_user=1, seed=3)
+        first = list(Post.objects.order_by('id').values_list('description', 'likes_count'))
+        Post.objects.all().delete()
+        User.objects.all().delete()
+        generate(users=10, posts_per_user=1, seed=3)
+        self.assertEqual(list(Post.objects.order_by('id').values_list('description', 'likes_count')), first)
+
+
+class EndpointBenchmarkTests(TestCase):
+    def test_every_route_has_a_case(self):
+        self.assertEqual(benchmarks.uncovered_routes(), [])
+
+    def test_compare_flags_queries_status_and_latency(self):
+        baseline = {'posts-list': {'status': 200, 'queries': 3, 'p50_ms': 10.0, 'p95_ms': 12.0}}
+        same = {'posts-list': {'status': 200, 'queries': 3, 'p50_ms': 14.0, 'p95_ms': 40.0}}
+        self.assertEqual(benchmarks.compare(same, baseline), [])
+        worse = {'posts-list': {'status': 500, 'queries': 4, 'p50_ms': 30.0, 'p95_ms': 40.0}}
+        self.assertEqual(benchmarks.compare(worse, baseline), [
+            'posts-list: status 200 -> 500', 'posts-list: 3 -> 4 queries', 'posts-list: p50 10.0 -> 30.0 ms',
+        ])
+        self.assertEqual(len(benchmarks.compare(worse, baseline, tolerance=None)), 2)
+
+
+# ----------------------------------------------------------------
+# LIVE UPDATES
+# ----------------------------------------------------------------
+
+@override_settings(LIVE_UPDATES_BACKEND='userapp.live.LocalBroker')
+class LiveUpdateTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.published = []
+        broker = live.get_broker()
+        publish = broker.publish
+        broker.publish = lambda post_id, event: (self.published.append((post_id, event.data)), publish(post_id, event))
+
+    def test_reactions_and_new_comments_are_published_on_commit(self):
+        post = self.make_posts(1)[0]
+        comment = Comment.objects.filter(post=post).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f'/posts/{post.id}/reaction/', {'reaction': 'like'}, format='json')
+            self.assertEqual(self.published, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/comments/{comment.id}/dislike/')
+            # unchanged: nothing to publish
+            self.client.post(f'/comments/{comment.id}/dislike/')
+            response = self.client.post('/comments/', {'post': post.id, 'author': self.user.id, 'text': 'hi'}, format='json')
+        self.assertEqual(self.published, [
+            # make_posts' m2m adds don't move the counters
+            (post.id, {'post': post.id, 'likes_count': 1, 'dislikes_count': 0}),
+            (post.id, {'post': post.id, 'comment': comment.id, 'likes_count': 0, 'dislikes_count': 1}),
+            (post.id, {'post': post.id, 'comment': response.data['id']}),
+        ])
+
+    def test_stream_coalesces_counts_published_from_other_threads(self):
+        async def scenario():
+            events = live.stream({1, 2}, heartbeat=0.05)
+            self.assertEqual(await anext(events), 'event: subscribed\ndata: {"posts":[1,2]}\n\n')
+            self.assertEqual(await anext(events), ': keepalive\n\n')
+
+            def publish():
+                broker = live.get_broker()
+                for likes in (1, 2, 3):
+                    broker.publish(1, live.Event('post', 1, {'post': 1, 'likes_count': likes}))
+                broker.publish(2, live.Event('new-comment', 9, {'post': 2, 'comment': 9}))
+                broker.publish(3, live.Event('post', 3, {'post': 3, 'likes_count': 1}))
+            thread = threading.Thread(target=publish)
+            thread.start()
+            thread.join()
+            chunk = await anext(events)
+            await events.aclose()
+            return chunk
+
+        self.assertEqual(asyncio.run(scenario()), (
+            'event: post\ndata: {"post":1,"likes_count":3}\n\n'
+            'event: new-comment\ndata: {"post":2,"comment":9}\n\n'
+        ))
+        self.assertEqual(dict(live.get_broker().subscriptions), {})
+
+    @override_settings(LIVE_UPDATES_MAX_PENDING=2)
+    def test_slow_subscriber_is_reset(self):
+        async def scenario():
+            events = live.stream({1})
+            await anext(events)
+            for comment in range(3):
+                live.get_broker().publish(1, live.Event('new-comment', comment, {'comment': comment}))
+            return [chunk async for chunk in events]
+
+        chunks = asyncio.run(scenario())
+        self.assertEqual(chunks[-1], 'event: reset\ndata: {}\n\n')
+        self.assertNotIn('"comment":2', chunks[0])
+
+    def test_endpoint_validates_and_needs_asgi(self):
+        token = AccessToken.for_user(self.user)
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/live/posts/?ids=1').status_code, 401)
+        self.assertEqual(self.client.get(f'/live/posts/?ids=x&token={token}').status_code, 400)
+        self.assertEqual(self.client.get(f'/live/posts/?token={token}').status_code, 400)
+        # the sync test client is a WSGI request
+        self.assertEqual(self.client.get(f'/live/posts/?ids=1&token={token}').status_code, 501)
+
+    async def test_endpoint_streams_under_asgi(self):
+        token = await asyncio.to_thread(lambda: str(AccessToken.for_user(self.user)))
+        response = await self.async_client.get(f'/live/posts/?ids=5&token={token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = aiter(response.streaming_content)
+        self.assertEqual(await anext(content), b'event: subscribed\ndata: {"posts":[5]}\n\n')
+        live.get_broker().publish(5, live.Event('post', 5, {'post': 5, 'likes_count': 1}))
+        self.assertEqual(await anext(content), b'event: post\ndata: {"post":5,"likes_count":1}\n\n')
+
+
+# ----------------------------------------------------------------
+# WRITE-BEHIND REACTION COUNTS
+# ----------------------------------------------------------------
+
+class CountBufferTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.journal_dir)
+        # flushed by hand: the flush thread would need its own connection
+        settings = override_settings(
+            REACTION_COUNTS_WRITE_BEHIND=True, REACTION_JOURNAL_DIR=self.journal_dir, REACTION_FLUSH_INTERVAL=3600,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.post = Post.objects.create(description='hot', author=self.user)
+        self.fans = [make_user(f'fan{i}') for i in range(3)]
+
+    def like(self, user, reaction='like'):
+        self.client.force_authenticate(user=user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.put(f'/posts/{self.post.id}/reaction/', {'reaction': reaction}, format='json').json()
+
+    def journals(self):
+        return sorted(os.listdir(self.journal_dir))
+
+    def test_counts_are_buffered_until_flushed(self):
+        self.assertEqual([self.like(fan)['likes_count'] for fan in self.fans], [1, 2, 3])
+        self.assertEqual(self.like(self.fans[0], 'dislike')['dislikes_count'], 1)
+        # membership is written at once, the counters aren't
+        self.assertEqual(self.post.likes.count(), 2)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.dislikes_count), (0, 0))
+        instance_id = countbuffer.get_buffer().id
+        self.assertTrue(instance_id.startswith(f'{os.getpid()}-'))
+        self.assertEqual(self.journals(), [f'reactions-{instance_id}.journal', f'reactions-{instance_id}.lock'])
+
+        self.assertEqual(countbuffer.get_buffer().flush(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.dislikes_count), (2, 1))
+        self.assertEqual(self.journals(), [f'reactions-{instance_id}.lock'])
+        self.assertEqual(self.like(self.fans[1], 'none'), {
+            'id': self.post.id, 'reaction': 'none', 'likes_count': 1, 'dislikes_count': 1,
+        })
+
+    def test_failed_flush_keeps_deltas_and_journal(self):
+        self.like(self.fans[0])
+        counter_buffer = countbuffer.get_buffer()
+        with mock.patch.object(counter_buffer, 'write', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('userapp.countbuffer', 'ERROR'):
+            self.assertEqual(counter_buffer.flush(), 0)
+        self.assertEqual(counter_buffer.get_pending('post', self.post.id), {'likes_count': 1})
+        self.like(self.fans[1])
+        self.assertEqual(len(self.journals()), 3)
+
+        counter_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 2)
+        self.assertEqual(self.journals(), [f'reactions-{counter_buffer.id}.lock'])
+
+    def test_interleaved_flushes_of_two_buffers_converge(self):
+        # liked through this process's buffer, unliked through another's,
+        # and the unlike flushed first, onto a stored 0
+        other = Post.objects.create(description='other', author=self.user)
+        first, second = countbuffer.get_buffer(), countbuffer.CountBuffer(self.journal_dir)
+        self.addCleanup(second.close)
+        self.like(self.fans[0])
+        with mock.patch.object(countbuffer, '_buffer', second):
+            self.like(self.fans[0], 'none')
+        second.add('post', other.id, other.id, {'likes_count': 2})
+        self.assertEqual(second.flush(), 2)
+        other.refresh_from_db()
+        self.assertEqual(other.likes_count, 2)
+
+        first.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes.count(), 0)
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_click_committed_after_a_flush_stays_journaled(self):
+        counter_buffer = countbuffer.get_buffer()
+        self.client.force_authenticate(user=self.fans[0])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.put(f'/posts/{self.post.id}/reaction/', {'reaction': 'like'}, format='json')
+        # flushed (journal rotated and removed) while the click was still uncommitted
+        counter_buffer.flush()
+        self.assertEqual(self.journals(), [f'reactions-{counter_buffer.id}.lock'])
+        for callback in callbacks:
+            callback()
+        with open(counter_buffer.journal_path()) as journal:
+            self.assertEqual(journal.read(), f'post {self.post.id}\n')
+
+    def test_journals_of_dead_buffers_are_recounted(self):
+        self.post.likes.add(*self.fans)
+        comment = Comment.objects.create(post=self.post, author=self.user, text='hi')
+        comment.comment_dislikes.add(self.fans[0])
+
+        def write(name, text):
+            with open(os.path.join(self.journal_dir, name), 'w') as journal:
+                journal.write(text)
+
+        # a crashed buffer with this process's pid (a restarted container),
+        # and journals whose lock was already removed by an interrupted recovery
+        write(f'reactions-{os.getpid()}-0123456789ab.lock', '')
+        write(f'reactions-{os.getpid()}-0123456789ab.journal.3', f'post {self.post.id}\ncomment {comment.id}\n')
+        write('reactions-7-ba9876543210.journal', f'post {self.post.id}\n')
+        live_buffer = countbuffer.CountBuffer(self.journal_dir)
+        live_buffer.log('post', self.post.id)
+        self.addCleanup(live_buffer.owner_lock.close)
+        self.addCleanup(live_buffer.journal.close)
+
+        with self.assertLogs('userapp.countbuffer', 'WARNING'):
+            self.assertEqual(countbuffer.CountBuffer(self.journal_dir).recover(), 2)
+        self.post.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 3)
+        self.assertEqual(comment.dislikes_count, 1)
+        # the journal of a live buffer, locked, is left alone
+        self.assertEqual(self.journals(), [f'reactions-{live_buffer.id}.journal', f'reactions-{live_buffer.id}.lock'])
@@ -0,0 +1,123 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery
+
+from .models import User, Post, Follow, TimelineEntry
+
+# ----------------------------------------------------------------
+# HOME TIMELINE
+# ----------------------------------------------------------------
+# Fan-out on write: when a post is created, one TimelineEntry per follower
+# (and one for the author) is inserted, so reading a feed page is a single
+# range scan of the (user, created_at, post) index.
+#
+# Authors with TIMELINE_FANOUT_THRESHOLD followers or more are not fanned out
+# (one post would mean that many inserts); their posts are pulled from the
+# post table at read time and merged in (fan-out on read).
+#
+# Every timeline is trimmed to its newest TIMELINE_MAX_LENGTH entries.
+
+FeedItem = namedtuple('FeedItem', ['created_at', 'post_id'])
+
+
+def get_fanout_threshold():
+    return getattr(settings, 'TIMELINE_FANOUT_THRESHOLD', 5000)
+
+def get_max_length():
+    return getattr(settings, 'TIMELINE_MAX_LENGTH', 800)
+
+
+def trim(user_ids):
+    # Deletes what is older than the TIMELINE_MAX_LENGTH-th entry of each timeline
+    limit = get_max_length()
+    cutoff = (
+        TimelineEntry.objects.filter(user=OuterRef('user'))
+        .order_by('-created_at', '-post')
+        .values('created_at')[limit - 1:limit]
+    )
+    TimelineEntry.objects.filter(user_id__in=user_ids, created_at__lt=Subquery(cutoff)).delete()
+
+
+def push(post, user_ids):
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post.pk, created_at=post.created_at) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+    trim(user_ids)
+
+
+def fan_out(post, batch_size=1000):
+    # Runs in the transaction that created the post (post_save in models.py)
+    push(post, [post.author_id])
+    followers_count = User.objects.filter(pk=post.author_id).values_list('followers_count', flat=True).first()
+    if followers_count is None or followers_count >= get_fanout_threshold():
+        return
+
+    follower_ids = list(Follow.objects.filter(followee_id=post.author_id).values_list('follower_id', flat=True))
+    for offset in range(0, len(follower_ids), batch_size):
+        push(post, follower_ids[offset:offset + batch_size])
+
+
+def follow(follower, followee):
+    # -> False if already following
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                Follow.objects.create(follower=follower, followee=followee)
+        except IntegrityError:
+            return False
+        User.objects.filter(pk=followee.pk).update(followers_count=F('followers_count') + 1)
+
+        if followee.followers_count < get_fanout_threshold():
+            # start the timeline with the followee's recent posts
+            backfill = getattr(settings, 'TIMELINE_BACKFILL', 20)
+            posts = Post.objects.filter(author=followee).order_by('-created_at', '-id').values('id', 'created_at')[:backfill]
+            TimelineEntry.objects.bulk_create(
+                [TimelineEntry(user_id=follower.pk, post_id=post['id'], created_at=post['created_at']) for post in posts],
+                ignore_conflicts=True,
+            )
+            trim([follower.pk])
+    invalidate_follow(follower, followee)
+    return True
+
+
+def unfollow(follower, followee):
+    # -> False if not following
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(follower=follower, followee=followee).delete()
+        if not deleted:
+            return False
+        User.objects.filter(pk=followee.pk, followers_count__gt=0).update(followers_count=F('followers_count') - 1)
+        TimelineEntry.objects.filter(user=follower, post__author=followee).delete()
+    invalidate_follow(follower, followee)
+    return True
+
+
+def invalidate_follow(follower, followee):
+    # followers_count is part of the cached user representation
+    from .cache import user_cache
+    user_cache.invalidate_on_commit([followee.pk])
+
+
+def pulled_authors(user):
+    # followees above the fan-out threshold
+    return (
+        Follow.objects.filter(follower=user, followee__followers_count__gte=get_fanout_threshold())
+        .values_list('followee_id', flat=True)
+    )
+
+
+def feed_sources(user, pulled=None):
+    # Querysets of {'created_at', 'post_id'} rows, merged by TimelinePagination
+    sources = [TimelineEntry.objects.filter(user=user).values('created_at', 'post_id')]
+    if pulled is None:
+        pulled = list(pulled_authors(user))
+    if pulled:
+        sources.append(Post.objects.filter(author_id__in=pulled).annotate(post_id=F('id')).values('created_at', 'post_id'))
+    return sources
+
+
+async def afeed_sources(user):
+    return feed_sources(user, [pk async for pk in pulled_authors(user)])
@@ -3,6 +3,10 @@ from django.urls import path
 from .views import (
     SearchUserView,
     UserLoggedDataView,
+    CacheStatsView,
+    MetricsView,
+    ReactionStateView,
+    ExportView,
     PostLikeView,
     PostRemoveLikeView,
     PostDislikeView,
@@ -12,10 +16,15 @@ from .views import (
     CommentDislikeView,
     CommentRemoveDislikeView,
 )
+from . import async_views
 
 urlpatterns = [
     path('users-search/', SearchUserView.as_view(), name='users-search'),
     path('user-logged/', UserLoggedDataView.as_view(), name='users-logged'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('reactions/', ReactionStateView.as_view(), name='reaction-state'),
+    path('export/<str:resource>/', ExportView.as_view(), name='export'),
     # USER-POST
     path('posts/<int:postId>/like/', PostLikeView.as_view(), name='post-like'),
     path('posts/<int:postId>/remove-like/', PostRemoveLikeView.as_view(), name='post-remove-like'),
@@ -26,4 +35,15 @@ urlpatterns = [
     path('comments/<int:commentId>/remove-like/', CommentRemoveLikeView.as_view(), name='comment-remove-like'),
     path('comments/<int:commentId>/dislike/', CommentDislikeView.as_view(), name='comment-dislike'),
     path('comments/<int:commentId>/remove-dislike/', CommentRemoveDislikeView.as_view(), name='comment-remove-dislike'),
+    # ASYNC (async_views.py)
+    path('async/posts/', async_views.post_list, name='async-post-list'),
+    path('async/posts/feed/', async_views.post_feed, name='async-post-feed'),
+    path('async/posts/<int:pk>/', async_views.post_detail, name='async-post-detail'),
+    path('async/posts/<int:pk>/reaction/', async_views.post_reaction, name='async-post-reaction'),
+    path('async/posts/<int:pk>/like/', async_views.post_like, name='async-post-like'),
+    path('async/comments/<int:pk>/reaction/', async_views.comment_reaction, name='async-comment-reaction'),
+    path('async/comments/<int:pk>/like/', async_views.comment_like, name='async-comment-like'),
+    path('async/users-search/', async_views.user_search, name='async-users-search'),
+    # LIVE UPDATES (live.py)
+    path('live/posts/', async_views.live_posts, name='live-posts'),
 ]
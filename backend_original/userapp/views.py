@@ -1,27 +1,49 @@
 
 from django.shortcuts import get_object_or_404
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.contrib.auth import authenticate
-from django.db.models.query_utils import Q
+from django.contrib.auth.models import update_last_login
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import AllowAny 
+from rest_framework.permissions import AllowAny, IsAdminUser, SAFE_METHODS
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.views import APIView
 
 from .serializers import (
 UserSerializer,
+UserSummarySerializer,
+PostSerializer,
+PostCountsSerializer,
+PostCreateSerializer,
 UserCreateSerializer,
 ChangePasswordSerializer,
 CustomTokenObtainPairSerializer,
 SearchUserSerializer,
-UserLoggedSerializer
+UserLoggedSerializer,
+ReactionSerializer,
+ReactionStateSerializer,
+CommentSerializer,
+CommentCountsSerializer,
+CommentCreateSerializer,
 )
-from .pagination import CustomPagination
+from .pagination import PostCursorPagination, UserCursorPagination, UserSearchCursorPagination, TimelinePagination, CommentThreadPagination, get_paginator
+from .querysets import plan_queryset
+from . import reactions, timeline
+from .cache import post_cache, user_cache, get_stats
+from .search import rank_users, search_ids, search_matches
+from .images import get_image_options
+from . import export
+from . import dbrouters, live, metrics
 
-from .models import User
+from .models import User, Post, Comment
 
 
 def staff_required(view_func):
@@ -32,18 +54,72 @@ def staff_required(view_func):
             return Response({'message': 'Unauthorized'}, status=status.HTTP_401_UNAUTHORIZED)
     return wrapped_view
 
-class UserViewSet(viewsets.ModelViewSet):
+
+class ReplicaReadMixin:
+    # GET/HEAD read from a replica unless the user wrote recently (dbrouters.py).
+    # Set after authentication, so the user lookup itself hits the primary.
+    replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not dbrouters.is_pinned(request.user):
+            self.replica_token = dbrouters.use_replica()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self.replica_token is not None:
+            dbrouters.end_replica(self.replica_token)
+            self.replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class UserViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = UserSerializer
+    cursor_pagination_class = UserCursorPagination
+    # ?expand=posts&posts_limit=3
+    posts_limit = 5
+    max_posts_limit = 20
 
     def get_queryset(self):
         if self.queryset is None:
-            self.queryset = self.get_serializer().Meta.model.objects.filter(is_active=True)
+            self.queryset = plan_queryset(User.objects.filter(is_active=True), self.get_serializer_class(), self.request)
+            limit = self.get_posts_limit()
+            if limit is not None:
+                # latest `limit` posts of every user on the page in one windowed query
+                posts = plan_queryset(Post.objects.order_by('-id'), PostSerializer)[:limit]
+                self.queryset = self.queryset.prefetch_related(Prefetch('post_set', queryset=posts, to_attr='expanded_posts'))
             return self.queryset
         else:
             return self.queryset
     def get_object(self, pk):
         return get_object_or_404(self.serializer_class.Meta.model, pk=pk)
 
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return UserSummarySerializer
+        return self.serializer_class
+
+    def get_posts_limit(self):
+        if self.request is None or 'posts' not in self.request.query_params.get('expand', '').split(','):
+            return None
+        try:
+            limit = int(self.request.query_params.get('posts_limit', self.posts_limit))
+        except ValueError:
+            limit = self.posts_limit
+        return max(1, min(limit, self.max_posts_limit))
+
+    # {pk: payload} for the cache; inactive or missing users are left out.
+    # Rendered without the request so payloads can be shared between readers.
+    def render_users(self, ids):
+        users = list(self.get_queryset().filter(pk__in=ids))
+        context = {'expand_posts': self.get_posts_limit() is not None, **get_image_options(self.request)}
+        users_serializer = self.get_serializer_class()(users, many=True, context=context)
+        return {user.pk: data for user, data in zip(users, users_serializer.data)}
+
+    def get_cache_variant(self):
+        name = self.get_serializer_class().__name__ + image_variant(self.request)
+        limit = self.get_posts_limit()
+        return name if limit is None else f'{name}:posts{limit}'
+
     def get_permissions(self):
         if self.action == 'create':
             return [AllowAny()]
@@ -51,8 +127,11 @@ class UserViewSet(viewsets.ModelViewSet):
             return super().get_permissions()
 
     def list(self, request):
-        users_serializer = self.serializer_class(self.get_queryset(), many=True)
-        return Response(users_serializer.data, status=status.HTTP_200_OK)
+        paginator = get_paginator(request, self.cursor_pagination_class)
+        users = User.objects.filter(is_active=True).order_by('id').only('id')
+        results = paginator.paginate_queryset(users, request)
+        data = user_cache.get_or_render([user.pk for user in results], self.get_cache_variant(), self.render_users)
+        return paginator.get_paginated_response(data)
     
     def create(self, request):
         user_serializer = UserCreateSerializer(data=request.data)
@@ -72,10 +151,9 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response(user_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def retrieve(self, request, pk=None):
-        user = self.serializer_class.Meta.model.objects.filter(is_active=True, pk=pk).first()
-        if user:
-            user_serializer = self.serializer_class(user)
-            return Response(user_serializer.data, status=status.HTTP_200_OK)
+        data = user_cache.get_or_render([int(pk)], self.get_cache_variant(), self.render_users) if str(pk).isdigit() else []
+        if data:
+            return Response(data[0], status=status.HTTP_200_OK)
         else:
             return Response({'message': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -100,6 +178,23 @@ class UserViewSet(viewsets.ModelViewSet):
         else:
             return Response(password_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    # POST /users/{id}/follow/ to follow, DELETE to unfollow
+    @action(methods=['POST', 'DELETE'], detail=True)
+    def follow(self, request, pk=None):
+        user = self.get_object(pk=pk)
+        if request.method == 'DELETE':
+            if timeline.unfollow(request.user, user):
+                return Response({'message': 'User unfollowed successfully'}, status=status.HTTP_200_OK)
+            else:
+                return Response({'message': 'You are not following this user'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if user.pk == request.user.pk:
+            return Response({'message': 'You cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
+        if timeline.follow(request.user, user):
+            return Response({'message': 'User followed successfully'}, status=status.HTTP_200_OK)
+        else:
+            return Response({'message': 'You are already following this user'}, status=status.HTTP_400_BAD_REQUEST)
+
 
 
 # ==================== AUTH ====================
@@ -109,38 +204,110 @@ class LoginView(TokenObtainPairView):
     def post(self, request, *args, **kwargs):
         username = request.data.get('username', '')
         password = request.data.get('password', '')
-        user = authenticate(username=username, password=password) # validated instance
+        user = authenticate(request=request, username=username, password=password) # validated instance
 
         if user:
-            login_serializer = self.get_serializer(data=request.data)
-            if login_serializer.is_valid():
-                user_serializer = UserSerializer(user)
-                return Response({
-                'access': login_serializer.validated_data['access'],
-                'refresh': login_serializer.validated_data['refresh'],
-                'user': user_serializer.data,
-                'message': 'Login successful'
-                }, status=status.HTTP_200_OK)
-            else:
-                return Response(login_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            # tokens for the user authenticate() returned: one password hash per login
+            refresh = self.serializer_class.get_token(user)
+            if jwt_settings.UPDATE_LAST_LOGIN:
+                update_last_login(None, user)
+            user_serializer = UserSerializer(user)
+            return Response({
+            'access': str(refresh.access_token),
+            'refresh': str(refresh),
+            'user': user_serializer.data,
+            'message': 'Login successful'
+            }, status=status.HTTP_200_OK)
         else:
             return Response({'message': 'Invalid username or password'}, status=status.HTTP_400_BAD_REQUEST)
         
 
-class SearchUserView(APIView):
+class SearchUserView(ReplicaReadMixin, APIView):
+    cursor_pagination_class = UserSearchCursorPagination
+
     def get(self, request):
         search_term = request.query_params.get('search')
-        matches = User.objects.filter(
-            Q(username__icontains=search_term) |
-            Q(first_name__icontains=search_term) |
-            Q(last_name__icontains=search_term)
-        ).distinct()
-
-        paginator = CustomPagination()
-        results = paginator.paginate_queryset(matches, request)
+        # ranked prefix search over the user search index (see search.py)
+        paginator = get_paginator(request, self.cursor_pagination_class)
+        if isinstance(paginator, self.cursor_pagination_class):
+            # ordered by username, over the first USER_SEARCH_MAX_RESULTS matches
+            matches, truncated = search_matches(search_term)
+            results = paginator.paginate_queryset(matches, request)
+        else:
+            # ?page= reaches every match: the ids are paged, then only the page's users loaded
+            truncated = False
+            page = paginator.paginate_queryset(search_ids(search_term), request)
+            results = rank_users(page).order_by('search_rank')
 
         user_search_serializer = SearchUserSerializer(results, many=True)
-        return paginator.get_paginated_response(user_search_serializer.data)
+        response = paginator.get_paginated_response(user_search_serializer.data)
+        response.data['truncated'] = truncated
+        return response
+
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_stats(), status=status.HTTP_200_OK)
+
+# GET /metrics -- Prometheus text format (metrics.py)
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics.render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# GET /reactions/?posts=1,2,3&comments=7,8
+# -> {"posts": {"1": {"id": 1, "reaction": "like", "likes_count": 3, ...}}, "comments": {...}}
+class ReactionStateView(APIView):
+    max_ids = 100
+
+    def get(self, request):
+        data = {}
+        for param, target in (('posts', reactions.POST), ('comments', reactions.COMMENT)):
+            ids = self.get_ids(request, param)
+            states = reactions.get_states(target, ids, request.user) if ids else []
+            data[param] = {str(state.id): ReactionStateSerializer(state).data for state in states}
+        return Response(data, status=status.HTTP_200_OK)
+
+    def get_ids(self, request, param):
+        value = request.query_params.get(param, '')
+        try:
+            ids = {int(pk) for pk in value.split(',') if pk.strip()}
+        except ValueError:
+            raise ValidationError({param: 'Expected a comma-separated list of ids'})
+        if len(ids) > self.max_ids:
+            raise ValidationError({param: f'At most {self.max_ids} ids per request'})
+        return ids
+
+# GET /export/users/?export_format=ndjson|csv&since=2024-06-01T00:00:00Z
+# Streams every row changed since `since` (all rows without it). The
+# X-Export-Until header is the `since` of the next incremental export.
+class ExportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, resource):
+        if resource not in export.EXPORTS:
+            raise Http404
+        fmt = request.query_params.get('export_format', 'ndjson')
+        if fmt not in export.FORMATS:
+            raise ValidationError({'export_format': f"Expected one of {', '.join(export.FORMATS)}"})
+        since = self.get_since(request)
+
+        lines, until = export.export(resource, fmt, since)
+        response = StreamingHttpResponse(lines, content_type=export.FORMATS[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{resource}.{fmt}"'
+        response['X-Export-Until'] = until.isoformat()
+        return response
+
+    def get_since(self, request):
+        value = request.query_params.get('since')
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            raise ValidationError({'since': 'Expected an ISO 8601 datetime'})
+        return timezone.make_aware(since) if timezone.is_naive(since) else since
 
 class UserLoggedDataView(APIView):
     def get(self, request):
@@ -153,39 +320,108 @@ class UserLoggedDataView(APIView):
 # ----------------------------------------------------------------
 # USER-POST
 # ----------------------------------------------------------------
-from django.shortcuts import get_object_or_404
-
-from .serializers import (
-PostSerializer,
-PostCreateSerializer,
-)
-from .models import Post
-
 
 def is_owner(request, instance):
     return request.user == instance.author or request.user.is_staff # boolean value
 
 
-class PostViewSet(viewsets.ModelViewSet):
+def put_reaction(request, target, pk):
+    reaction_serializer = ReactionSerializer(data=request.data)
+    if reaction_serializer.is_valid():
+        state = reactions.set_reaction(target, pk, request.user, reaction_serializer.validated_data['reaction'])
+        return Response(ReactionStateSerializer(state).data, status=status.HTTP_200_OK)
+    else:
+        return Response(reaction_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# ?image_size=320&image_format=jpeg -> one cached representation per rendition
+def image_variant(request):
+    options = get_image_options(request)
+    return f":img{options['image_size']}{options['image_format']}" if options else ''
+
+
+# ?reactions=counts -> likes_count/dislikes_count + liked_by_me instead of username lists
+def wants_counts(request):
+    return request is not None and request.query_params.get('reactions') == 'counts'
+
+
+class PostViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = PostSerializer
+    cursor_pagination_class = PostCursorPagination
 
     def get_queryset(self):
         if self.queryset is None:
-            self.queryset = Post.objects.all()
+            self.queryset = plan_queryset(Post.objects.all(), self.get_serializer_class(), self.request)
             return self.queryset
         else:
             return self.queryset
 
+    def get_serializer_class(self):
+        if wants_counts(self.request):
+            return PostCountsSerializer
+        return self.serializer_class
+
     def get_object(self, pk=None):
-        return get_object_or_404(Post, pk=pk)
+        # only a retrieve renders the post's tree; update and destroy write one row
+        queryset = self.get_queryset() if self.action == 'retrieve' else Post.objects.all()
+        return get_object_or_404(queryset, pk=pk)
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), **get_image_options(self.request)}
+
+    def get_cache_variant(self):
+        return self.serializer_class.__name__ + image_variant(self.request)
+
+    # Shared representations are cached per post (cache.py); personalized
+    # ones (?reactions=counts has liked_by_me) are always rendered
+    def is_cacheable(self):
+        return post_cache.enabled and self.get_serializer_class() is self.serializer_class
+
+    def render_posts(self, ids):
+        posts = list(self.get_queryset().filter(pk__in=ids))
+        return {post.pk: data for post, data in zip(posts, self.get_serializer(posts, many=True).data)}
 
     def list(self, request):
-        posts = self.serializer_class.Meta.model.objects.order_by('-id').all()
-        paginator = CustomPagination()
+        paginator = get_paginator(request, self.cursor_pagination_class)
+        if not self.is_cacheable():
+            posts = self.get_queryset().order_by('-id')
+            results = paginator.paginate_queryset(posts, request)
+            posts_serializers = self.get_serializer(results, many=True)
+            return paginator.get_paginated_response(posts_serializers.data)
+
+        # page through bare rows, then fill the page from the cache
+        posts = Post.objects.order_by('-id').only('id', 'created_at')
         results = paginator.paginate_queryset(posts, request)
-
-        posts_serializers = self.get_serializer(results, many=True)
-        return paginator.get_paginated_response(posts_serializers.data)
+        data = post_cache.get_or_render([post.pk for post in results], self.get_cache_variant(), self.render_posts)
+        return paginator.get_paginated_response(data)
+
+    # GET /posts/feed/ -- posts of the user and the accounts they follow,
+    # newest first, keyset paginated (?cursor=)
+    @action(methods=['GET'], detail=False)
+    def feed(self, request):
+        paginator = TimelinePagination()
+        results = paginator.paginate_queryset(timeline.feed_sources(request.user), request)
+        ids = [item.post_id for item in results]
+        if self.is_cacheable():
+            data = post_cache.get_or_render(ids, self.get_cache_variant(), self.render_posts)
+        else:
+            rendered = self.render_posts(ids)
+            data = [rendered[pk] for pk in ids if pk in rendered]
+        return paginator.get_paginated_response(data)
+
+    # GET /posts/{id}/comments/ -- the whole thread, oldest first, keyset
+    # paginated (?cursor=); posts themselves only carry the first few
+    @action(methods=['GET'], detail=True)
+    def comments(self, request, pk=None):
+        if not str(pk).isdigit() or not Post.objects.filter(pk=pk).exists():
+            raise Http404
+        serializer_class = CommentCountsSerializer if wants_counts(request) else CommentSerializer
+        paginator = CommentThreadPagination()
+        results = paginator.paginate_queryset(
+            plan_queryset(Comment.objects.filter(post_id=pk), serializer_class, request), request,
+        )
+        comments_serializer = serializer_class(results, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(comments_serializer.data)
 
     def create(self, request):
         post_serializer = PostCreateSerializer(data=request.data)
@@ -196,9 +432,15 @@ class PostViewSet(viewsets.ModelViewSet):
             return Response(post_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def retrieve(self, request, pk=None):
-        posts = self.get_object(pk=pk)
-        post_serializer = self.serializer_class(posts)
-        return Response(post_serializer.data, status=status.HTTP_200_OK)
+        if not self.is_cacheable():
+            posts = self.get_object(pk=pk)
+            post_serializer = self.get_serializer(posts)
+            return Response(post_serializer.data, status=status.HTTP_200_OK)
+
+        data = post_cache.get_or_render([int(pk)], self.get_cache_variant(), self.render_posts) if str(pk).isdigit() else []
+        if not data:
+            raise Http404
+        return Response(data[0], status=status.HTTP_200_OK)
 
     def update(self, request, pk=None):
         post = self.get_object(pk=pk)
@@ -239,6 +481,11 @@ class PostViewSet(viewsets.ModelViewSet):
         # else:
         #     return Response(post_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    # PUT /posts/{id}/reaction/  {"reaction": "like" | "dislike" | "none"}
+    @action(methods=['PUT'], detail=True)
+    def reaction(self, request, pk=None):
+        return put_reaction(request, reactions.POST, pk)
+
     def destroy(self, request, pk=None):
         post = self.get_object(pk=pk)
         if not is_owner(request, post):
@@ -268,77 +515,66 @@ class PostViewSet(viewsets.ModelViewSet):
 
 class PostLikeView(APIView):
     def post(self, request, postId):
-        try:
-            # post.likes += 1
-            post = get_object_or_404(Post, pk=postId)
-            if request.user in post.dislikes.all():
-                post.dislikes.remove(request.user) 
-            post.likes.add(request.user)
-            return Response({'message': 'Post liked successfully'}, status=status.HTTP_200_OK)
-        except Post.DoesNotExist:
-            return Response({'message': 'Post does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        reactions.set_reaction(reactions.POST, postId, request.user, reactions.LIKE)
+        return Response({'message': 'Post liked successfully'}, status=status.HTTP_200_OK)
 
 class PostRemoveLikeView(APIView):
     def delete(self, request, postId):
-        try:
-            post = get_object_or_404(Post, pk=postId)
-            if request.user in post.likes.all():
-                post.likes.remove(request.user) 
-                return Response({'message': 'Post unliked successfully'}, status=status.HTTP_200_OK)
-            else:
-                return Response({'message': 'You have not liked this post'}, status=status.HTTP_400_BAD_REQUEST)
-        except Post.DoesNotExist:
-            return Response({'message': 'Post does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        state = reactions.set_reaction(reactions.POST, postId, request.user, reactions.NONE, only_if=reactions.LIKE)
+        if state.changed:
+            return Response({'message': 'Post unliked successfully'}, status=status.HTTP_200_OK)
+        else:
+            return Response({'message': 'You have not liked this post'}, status=status.HTTP_400_BAD_REQUEST)
         
 
 class PostDislikeView(APIView):
     def post(self, request, postId):
-        try:
-            # post.dislikes += 1
-            post = get_object_or_404(Post, pk=postId)
-            if request.user in post.likes.all():
-                post.likes.remove(request.user) 
-            post.dislikes.add(request.user)
-            return Response({'message': 'Post disliked successfully'}, status=status.HTTP_200_OK)
-        except Post.DoesNotExist:
-            return Response({'message': 'Post does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        reactions.set_reaction(reactions.POST, postId, request.user, reactions.DISLIKE)
+        return Response({'message': 'Post disliked successfully'}, status=status.HTTP_200_OK)
 
 class PostRemoveDislikeView(APIView):
     def delete(self, request, postId):
-        try:
-            post = get_object_or_404(Post, pk=postId)
-            if request.user in post.dislikes.all():
-                post.dislikes.remove(request.user) 
-                return Response({'message': 'Post undisliked successfully'}, status=status.HTTP_200_OK)
-            else:
-                return Response({'message': 'You have not disliked this post'}, status=status.HTTP_400_BAD_REQUEST)
-        except Post.DoesNotExist:
-            return Response({'message': 'Post does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        state = reactions.set_reaction(reactions.POST, postId, request.user, reactions.NONE, only_if=reactions.DISLIKE)
+        if state.changed:
+            return Response({'message': 'Post undisliked successfully'}, status=status.HTTP_200_OK)
+        else:
+            return Response({'message': 'You have not disliked this post'}, status=status.HTTP_400_BAD_REQUEST)
 
 
 # ----------------------------------------------------------------
 # USER-COMMENT
 # ----------------------------------------------------------------
-from .serializers import CommentSerializer, CommentCreateSerializer
-from .models import Comment
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = CommentSerializer
 
     def get_queryset(self):
         if self.queryset is None:
-            self.queryset = self.get_serializer().Meta.model.objects.all()
+            self.queryset = plan_queryset(Comment.objects.all(), self.get_serializer_class(), self.request)
             return self.queryset
         else:
             return self.queryset
 
+    def get_serializer_class(self):
+        if wants_counts(self.request):
+            return CommentCountsSerializer
+        return self.serializer_class
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), **get_image_options(self.request)}
+
     def create(self, request):
         comment_serializer = CommentCreateSerializer(data=request.data)
         if comment_serializer.is_valid():
-            comment_serializer.save()
+            live.publish_comment(comment_serializer.save())
             return Response(comment_serializer.data, status=status.HTTP_201_CREATED)
         else:
             return Response(comment_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # PUT /comments/{id}/reaction/  {"reaction": "like" | "dislike" | "none"}
+    @action(methods=['PUT'], detail=True)
+    def reaction(self, request, pk=None):
+        return put_reaction(request, reactions.COMMENT, pk)
         
     
     # def destroy(self, request, pk=None):
@@ -353,46 +589,26 @@ class CommentViewSet(viewsets.ModelViewSet):
 
 class CommentLikeView(APIView):
     def post(self, request, commentId):
-        try:
-            comment = get_object_or_404(Comment, pk=commentId)
-            if request.user in comment.comment_dislikes.all():
-                comment.comment_dislikes.remove(request.user)
-            comment.comment_likes.add(request.user)
-            return Response({'message': 'Comment liked successfully'}, status=status.HTTP_200_OK)
-        except Comment.DoesNotExist:
-            return Response({'message': 'Comment does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        reactions.set_reaction(reactions.COMMENT, commentId, request.user, reactions.LIKE)
+        return Response({'message': 'Comment liked successfully'}, status=status.HTTP_200_OK)
 
 class CommentRemoveLikeView(APIView):
     def delete(self, request, commentId):
-        try:
-            comment = get_object_or_404(Comment, pk=commentId)
-            if request.user in comment.comment_likes.all():
-                comment.comment_likes.remove(request.user)
-                return Response({'message': 'Comment unliked successfully'}, status=status.HTTP_200_OK)
-            else:
-                return Response({'message': 'You have not liked this comment'}, status=status.HTTP_400_BAD_REQUEST)
-        except Comment.DoesNotExist:
-            return Response({'message': 'Comment does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        state = reactions.set_reaction(reactions.COMMENT, commentId, request.user, reactions.NONE, only_if=reactions.LIKE)
+        if state.changed:
+            return Response({'message': 'Comment unliked successfully'}, status=status.HTTP_200_OK)
+        else:
+            return Response({'message': 'You have not liked this comment'}, status=status.HTTP_400_BAD_REQUEST)
 
 class CommentDislikeView(APIView):
     def post(self, request, commentId):
-        try:
-            comment = get_object_or_404(Comment, pk=commentId)
-            if request.user in comment.comment_likes.all():
-                comment.comment_likes.remove(request.user)
-            comment.comment_dislikes.add(request.user)
-            return Response({'message': 'Comment disliked successfully'}, status=status.HTTP_200_OK)
-        except Comment.DoesNotExist:
-            return Response({'message': 'Comment does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        reactions.set_reaction(reactions.COMMENT, commentId, request.user, reactions.DISLIKE)
+        return Response({'message': 'Comment disliked successfully'}, status=status.HTTP_200_OK)
 
 class CommentRemoveDislikeView(APIView):
     def delete(self, request, commentId):
-        try:
-            comment = get_object_or_404(Comment, pk=commentId)
-            if request.user in comment.comment_dislikes.all():
-                comment.comment_dislikes.remove(request.user)
-                return Response({'message': 'Comment undisliked successfully'}, status=status.HTTP_200_OK)
-            else:
-                return Response({'message': 'You have not disliked this comment'}, status=status.HTTP_400_BAD_REQUEST)
-        except Comment.DoesNotExist:
-            return Response({'message': 'Comment does not exist'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        state = reactions.set_reaction(reactions.COMMENT, commentId, request.user, reactions.NONE, only_if=reactions.DISLIKE)
+        if state.changed:
+            return Response({'message': 'Comment undisliked successfully'}, status=status.HTTP_200_OK)
+        else:
+            return Response({'message': 'You have not disliked this comment'}, status=status.HTTP_400_BAD_REQUEST)